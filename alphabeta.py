@@ -0,0 +1,429 @@
+"""
+Alpha-Beta Search Module for Nine Men's Morris
+Iterative-deepening negamax with a transposition table and a per-move time budget
+
+The search plays the moves on a BitboardNineMensMorrisEnv copy of the
+position (the same rules as NineMensMorrisEnv, checked by perft.py) with
+apply/undo. The capture after a mill is its own ply with the same player
+to move, so its score is not negated and it does not use up depth: a
+mill formed at the horizon is always followed by its best capture.
+
+Move ordering: transposition-table move, mill-forming moves (which lead
+to captures), moves that block an opponent mill, then the history
+heuristic. Captures prefer pieces of open opponent mills.
+
+Leaves are scored by a static evaluation (material, mills, open mills,
+mobility) from the side to move, optionally blended with the network's
+value head.
+"""
+
+import time
+
+from typing import Dict, List, Optional, Tuple
+
+import metrics
+
+from bitboard import (BitboardNineMensMorrisEnv, MILL_MASKS, POSITION_MILL_MASKS, NEIGHBOR_MASKS,
+                      FULL_MASK, bit_positions)
+from zobrist import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND
+
+# Scores are integers from the point of view of the side to move
+WIN_SCORE = 100_000
+# Scores beyond this are wins found by the search (WIN_SCORE minus the ply they happen at)
+WIN_THRESHOLD = WIN_SCORE - 1_000
+INFINITY = WIN_SCORE + 1
+
+# Static evaluation weights
+PIECE_VALUE = 100
+MILL_VALUE = 20
+OPEN_MILL_VALUE = 15
+MOBILITY_VALUE = 3
+BLOCKED_PIECE_VALUE = 4
+# Value-head output of 1 (a certain win) is worth this many score points
+VALUE_HEAD_SCORE = 9 * PIECE_VALUE
+
+# Ordering bonuses, above any history score
+TT_MOVE_BONUS = 1 << 30
+MILL_MOVE_BONUS = 1 << 28
+BLOCK_MOVE_BONUS = 1 << 27
+
+# Deepest iteration without max_depth, and nodes between wall-clock checks
+MAX_DEPTH = 64
+CLOCK_INTERVAL = 1024
+
+
+class SearchTimeout(Exception):
+    """Raised inside the search when the time budget runs out"""
+
+
+def _to_tt(score: int, ply: int) -> int:
+    """Win scores are stored relative to the node, so they stay valid at another ply"""
+    if score > WIN_THRESHOLD:
+        return score + ply
+    if score < -WIN_THRESHOLD:
+        return score - ply
+    return score
+
+
+def _from_tt(score: int, ply: int) -> int:
+    if score > WIN_THRESHOLD:
+        return score - ply
+    if score < -WIN_THRESHOLD:
+        return score + ply
+    return score
+
+
+def _forms_mill(own: int, to_pos: int) -> bool:
+    """Whether a piece arriving on to_pos completes a mill with the pieces in `own`"""
+    own |= 1 << to_pos
+    for mask in POSITION_MILL_MASKS[to_pos]:
+        if own & mask == mask:
+            return True
+    return False
+
+
+def _open_mill_pieces(own: int, opp: int) -> int:
+    """Pieces of `own` in mills that have two own pieces and an empty third point"""
+    pieces = 0
+    for mask in MILL_MASKS:
+        if not opp & mask and (own & mask).bit_count() == 2:
+            pieces |= own & mask
+    return pieces
+
+
+def static_evaluation(env) -> int:
+    """Score of a BitboardNineMensMorrisEnv position for the side to move"""
+    player = env.current_player
+    opponent = -player
+    own = env.bitboards[player]
+    opp = env.bitboards[opponent]
+    empty = FULL_MASK & ~(own | opp)
+
+    score = PIECE_VALUE * (env.pieces_on_board[player] + env.pieces_in_hand[player]
+                           - env.pieces_on_board[opponent] - env.pieces_in_hand[opponent])
+
+    for mask in MILL_MASKS:
+        mine = own & mask
+        theirs = opp & mask
+        if mine == mask:
+            score += MILL_VALUE
+        elif theirs == mask:
+            score -= MILL_VALUE
+        elif not theirs and mine.bit_count() == 2:
+            score += OPEN_MILL_VALUE
+        elif not mine and theirs.bit_count() == 2:
+            score -= OPEN_MILL_VALUE
+
+    # Mobility matters once pieces slide; flying pieces can always move
+    for side, pieces, sign in ((player, own, 1), (opponent, opp, -1)):
+        if env.player_phase[side] != 'movement':
+            continue
+        for pos in bit_positions(pieces):
+            moves = (NEIGHBOR_MASKS[pos] & empty).bit_count()
+            score += sign * (MOBILITY_VALUE * moves - (BLOCKED_PIECE_VALUE if moves == 0 else 0))
+    return score
+
+
+class AlphaBetaPlayer:
+    """
+    AI player that searches the game tree with alpha-beta before moving.
+
+    Args:
+        model: policy/value network, only used with use_value_head
+        device: torch device for the value head
+        time_limit: seconds per move (None for max_depth only)
+        max_depth: deepest iteration in plies, capture sub-turns not counted (None for time only)
+        use_value_head: blend the network's value into the leaf evaluation
+        value_weight: share of the value head in the blended leaf score
+        value_scale: value-head output that counts as a certain win (PPO win reward)
+        tt_size: transposition table entries (rounded to a power of two)
+    """
+
+    def __init__(self, model=None, device=None, time_limit: Optional[float] = 1.0, max_depth: Optional[int] = None,
+                 use_value_head: bool = False, value_weight: float = 0.5, value_scale: float = 1.5,
+                 tt_size: int = 1 << 20):
+        if time_limit is None and max_depth is None:
+            raise ValueError("Set time_limit, max_depth or both")
+        self.model = model
+        self.device = device
+        self.time_limit = time_limit
+        self.max_depth = max_depth
+        self.use_value_head = use_value_head
+        self.value_weight = value_weight
+        self.value_scale = value_scale
+        self.tt = TranspositionTable(tt_size, policy='depth')
+        # history[player][action index]: cutoff credit, for ordering quiet moves
+        self.history = {1: [0] * BitboardNineMensMorrisEnv.ACTION_SPACE_SIZE,
+                        -1: [0] * BitboardNineMensMorrisEnv.ACTION_SPACE_SIZE}
+        self.value_cache: Dict[int, float] = {}
+        self.last_search: Dict = {}
+        self.nodes = 0
+        self._deadline = None
+
+    # --- get_ai_move / get_ai_capture compatible entry points ---
+
+    def get_ai_move(self, model, env, device, *args, **kwargs) -> Tuple:
+        """model.get_ai_move signature; searches with the given model"""
+        self.model, self.device = model, device
+        return self.search(env)
+
+    def get_ai_capture(self, model, env, device, *args, **kwargs) -> Tuple:
+        """model.get_ai_capture signature; the pending capture is searched as its own ply"""
+        self.model, self.device = model, device
+        return self.search(env)
+
+    # --- Search ---
+
+    def reset(self):
+        """Forget the transposition table and move history (new game)"""
+        self.tt.clear()
+        for scores in self.history.values():
+            scores[:] = [0] * len(scores)
+        self.value_cache.clear()
+
+    def search(self, env) -> Tuple:
+        """Search the env's position by iterative deepening and return the chosen action tuple"""
+        started = time.perf_counter()
+        self._deadline = started + self.time_limit if self.time_limit is not None else None
+        search_env = self._search_env(env)
+        self.tt.new_search()
+        self.nodes = 0
+        # Older cutoffs say less about this position
+        for scores in self.history.values():
+            scores[:] = [score >> 1 for score in scores]
+        if len(self.value_cache) > 1 << 18:
+            self.value_cache.clear()
+
+        actions = self._legal_actions(search_env)
+        best_index = search_env.action_to_index(actions[0])
+        best_score = 0
+        depth_reached = 0
+        if len(actions) > 1:
+            for depth in range(1, (self.max_depth or MAX_DEPTH) + 1):
+                try:
+                    best_index, best_score, complete = self._search_root(search_env, depth, best_index)
+                except SearchTimeout:
+                    break
+                if complete:
+                    depth_reached = depth
+                # A forced result does not change with more depth
+                if abs(best_score) > WIN_THRESHOLD or not complete:
+                    break
+                # The next iteration would not finish in the remaining time
+                if self._deadline is not None and time.perf_counter() - started > self.time_limit / 2:
+                    break
+
+        elapsed = time.perf_counter() - started
+        self.last_search = {
+            'depth': depth_reached,
+            'nodes': self.nodes,
+            'seconds': elapsed,
+            'nodes_per_second': self.nodes / elapsed if elapsed > 0 else 0.0,
+            'score': best_score,
+            'action': best_index,
+            'pv': self.principal_variation(search_env),
+            'tt': self.tt.stats(),
+        }
+        metrics.count('alphabeta.nodes', self.nodes)
+        metrics.observe('alphabeta.search', elapsed * 1000.0)
+        return env.index_to_action(best_index)
+
+    def summary(self) -> str:
+        """One-line report of the last search"""
+        s = self.last_search
+        if not s:
+            return "Alpha-beta: no search yet"
+        if s['score'] > WIN_THRESHOLD:
+            score = f"win in {WIN_SCORE - s['score']}"
+        elif s['score'] < -WIN_THRESHOLD:
+            score = f"loss in {WIN_SCORE + s['score']}"
+        else:
+            score = f"{s['score']:+d}"
+        return (f"Alpha-beta: depth {s['depth']}, {s['nodes']:,} nodes, "
+                f"{s['nodes_per_second']:,.0f} nodes/s, score {score}")
+
+    def principal_variation(self, env, length: int = 12) -> List[int]:
+        """Action indices of the expected line, read back from the transposition table"""
+        line = []
+        played = 0
+        while len(line) < length and env.winner is None:
+            entry = self.tt.probe(env.zobrist_hash())
+            if entry is None or entry.move is None:
+                break
+            action = env.index_to_action(entry.move)
+            if action not in self._legal_actions(env):
+                break
+            line.append(entry.move)
+            env.apply(action)
+            played += 1
+        for _ in range(played):
+            env.undo()
+        return line
+
+    @staticmethod
+    def _search_env(env) -> BitboardNineMensMorrisEnv:
+        """Headless bitboard copy of the position, with its move count for the draw rule"""
+        if isinstance(env, BitboardNineMensMorrisEnv):
+            search_env = env.clone()
+        else:
+            search_env = BitboardNineMensMorrisEnv(lazy_state=True, history=None)
+            search_env.set_position(env.board, env.current_player, dict(env.pieces_in_hand),
+                                    dict(env.player_phase), env.pending_capture)
+            search_env.move_count = env.move_count
+        search_env.lazy_state = True
+        search_env.history = None
+        return search_env
+
+    @staticmethod
+    def _legal_actions(env) -> List[Tuple]:
+        if env.pending_capture:
+            return env.get_valid_capture_actions()
+        return env.get_valid_actions()
+
+    def _search_root(self, env, depth: int, previous_best: int) -> Tuple[int, int, bool]:
+        """
+        One iteration at the root. Returns (best index, score, complete); after
+        a timeout, the best of the root moves searched so far is returned with
+        complete=False (the previous best is searched first, so it is never worse).
+        """
+        player = env.current_player
+        alpha, beta = -INFINITY, INFINITY
+        best_index, best_score = None, -INFINITY
+        child_depth = depth if env.pending_capture else depth - 1
+        for index, action in self._ordered_actions(env, previous_best):
+            env.apply(action)
+            try:
+                if env.current_player == player:
+                    score = self._negamax(env, child_depth, alpha, beta, 1)
+                else:
+                    score = -self._negamax(env, child_depth, -beta, -alpha, 1)
+            except SearchTimeout:
+                if best_index is None:
+                    raise
+                return best_index, best_score, False
+            finally:
+                env.undo()
+            if score > best_score:
+                best_index, best_score = index, score
+                alpha = max(alpha, score)
+        self.tt.store(env.zobrist_hash(), _to_tt(best_score, 0), depth, EXACT, best_index)
+        return best_index, best_score, True
+
+    def _negamax(self, env, depth: int, alpha: int, beta: int, ply: int) -> int:
+        self.nodes += 1
+        if self._deadline is not None and self.nodes % CLOCK_INTERVAL == 0:
+            if time.perf_counter() >= self._deadline:
+                raise SearchTimeout()
+
+        if env.winner is not None:
+            if env.winner == 0:
+                return 0
+            return WIN_SCORE - ply if env.winner == env.current_player else -(WIN_SCORE - ply)
+        if depth <= 0 and not env.pending_capture:
+            return self._evaluate(env)
+
+        key = env.zobrist_hash()
+        original_alpha = alpha
+        tt_move = None
+        entry = self.tt.probe(key)
+        if entry is not None:
+            tt_move = entry.move
+            if entry.depth >= depth:
+                value = _from_tt(entry.value, ply)
+                if entry.flag == EXACT:
+                    return value
+                if entry.flag == LOWER_BOUND:
+                    alpha = max(alpha, value)
+                elif entry.flag == UPPER_BOUND:
+                    beta = min(beta, value)
+                if alpha >= beta:
+                    return value
+
+        player = env.current_player
+        child_depth = depth if env.pending_capture else depth - 1
+        best_index, best_score = None, -INFINITY
+        for index, action in self._ordered_actions(env, tt_move):
+            env.apply(action)
+            try:
+                if env.current_player == player:
+                    score = self._negamax(env, child_depth, alpha, beta, ply + 1)
+                else:
+                    score = -self._negamax(env, child_depth, -beta, -alpha, ply + 1)
+            finally:
+                env.undo()
+            if score > best_score:
+                best_index, best_score = index, score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        if action[0] != 'capture':
+                            self.history[player][index] += depth * depth
+                        break
+
+        if best_index is None:
+            # No legal action: step() ends such games, but be safe
+            return -(WIN_SCORE - ply)
+
+        if best_score <= original_alpha:
+            flag = UPPER_BOUND
+        elif best_score >= beta:
+            flag = LOWER_BOUND
+        else:
+            flag = EXACT
+        self.tt.store(key, _to_tt(best_score, ply), depth, flag, best_index)
+        return best_score
+
+    def _ordered_actions(self, env, tt_move: Optional[int]) -> List[Tuple[int, Tuple]]:
+        """(index, action) pairs, most promising first"""
+        player = env.current_player
+        own = env.bitboards[player]
+        opp = env.bitboards[-player]
+        to_index = env.action_to_index
+        scored = []
+
+        if env.pending_capture:
+            threats = _open_mill_pieces(opp, own)
+            for action in env.get_valid_capture_actions():
+                index = to_index(action)
+                score = TT_MOVE_BONUS if index == tt_move else 0
+                if threats >> action[1] & 1:
+                    score += MILL_MOVE_BONUS
+                scored.append((score, index, action))
+        else:
+            history = self.history[player]
+            for action in env.get_valid_actions():
+                action_type, from_pos, to_pos = action
+                index = to_index(action)
+                score = history[index]
+                if index == tt_move:
+                    score += TT_MOVE_BONUS
+                moved = own if action_type == 'place' else own & ~(1 << from_pos)
+                if _forms_mill(moved, to_pos):
+                    score += MILL_MOVE_BONUS
+                elif _forms_mill(opp, to_pos):
+                    score += BLOCK_MOVE_BONUS
+                scored.append((score, index, action))
+
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return [(index, action) for _, index, action in scored]
+
+    def _evaluate(self, env) -> int:
+        score = static_evaluation(env)
+        if self.use_value_head and self.model is not None:
+            value = self._value(env)
+            score = round((1 - self.value_weight) * score + self.value_weight * VALUE_HEAD_SCORE * value)
+        return score
+
+    def _value(self, env) -> float:
+        """Value head output for the side to move, scaled to [-1, 1] and cached by position"""
+        key = env.zobrist_hash()
+        value = self.value_cache.get(key)
+        if value is None:
+            # torch is only needed for value-head leaves
+            import torch
+            state = torch.from_numpy(env.get_state()).unsqueeze(0).to(self.device)
+            with torch.no_grad():
+                _, values = self.model(state)
+            value = max(-1.0, min(1.0, float(values[0, 0]) / self.value_scale))
+            self.value_cache[key] = value
+        return value
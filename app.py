@@ -3,20 +3,35 @@ Nine Men's Morris Streamlit Application
 Strict AI vs AI Mode (Model 1 vs Model 2)
 """
 
+import io
 import os
 import time
-import torch
-import numpy as np
 import streamlit as st
 
 from datetime import datetime
 
 # Import game modules
+import metrics
 import database as db
 
 from game import NineMensMorrisEnv
 from board import draw_board, BOARD_SIZE
-from model import NineMensMorrisNet, load_model, get_ai_move, get_ai_capture
+from startup import STARTUP
+
+# torch, the model modules and the tablebase are imported on first use
+# (load_models / execute_turn) so the page renders before they are loaded
+
+# AI player per side: 'policy' samples from the network, 'mcts' searches with it,
+# 'alphabeta' searches with a static evaluation (plus the value head with NMM_ALPHABETA_VALUE_HEAD=1)
+AI_PLAYERS = {
+    1: os.environ.get("NMM_MODEL1_PLAYER", "policy"),
+    -1: os.environ.get("NMM_MODEL2_PLAYER", "policy")
+}
+MCTS_SIMULATIONS = int(os.environ.get("NMM_MCTS_SIMULATIONS", "400"))
+ALPHABETA_SECONDS = float(os.environ.get("NMM_ALPHABETA_SECONDS", "1.0"))
+ALPHABETA_VALUE_HEAD = os.environ.get("NMM_ALPHABETA_VALUE_HEAD", "") not in ("", "0", "false")
+# Pause between auto-play turns so the board can be followed
+TURN_DELAY_SECONDS = 1.0
 
 # Page configuration
 st.set_page_config(
@@ -290,12 +305,18 @@ def init_session_state():
         st.session_state.model1 = None
     if 'model2' not in st.session_state:
         st.session_state.model2 = None
+    if 'model_paths' not in st.session_state:
+        st.session_state.model_paths = None
+    if 'search_players' not in st.session_state:
+        st.session_state.search_players = {}
     if 'device' not in st.session_state:
-        st.session_state.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+        st.session_state.device = None
     if 'last_move' not in st.session_state:
         st.session_state.last_move = None
     if 'models_loaded' not in st.session_state:
         st.session_state.models_loaded = False
+    if 'tablebase' not in st.session_state:
+        st.session_state.tablebase = None
 
 
 def load_models():
@@ -320,8 +341,25 @@ def load_models():
     
     try:
         with st.spinner("🔄 Loading AI models..."):
-            st.session_state.model1 = load_model(model1_path, st.session_state.device)
-            st.session_state.model2 = load_model(model2_path, st.session_state.device)
+            with STARTUP.phase('import torch'):
+                import torch
+            with STARTUP.phase('import model modules'):
+                from registry import get_model
+            st.session_state.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+            
+            # Shared process-wide: every session gets the same memory-mapped models,
+            # warmed up once when the registry loads them
+            with STARTUP.phase('load models'):
+                st.session_state.model1 = get_model(model1_path, st.session_state.device)
+                st.session_state.model2 = get_model(model2_path, st.session_state.device)
+            st.session_state.model_paths = (model1_path, model2_path)
+            
+            # Optional endgame tablebase (python tablebase.py build --output endgame.tb)
+            tablebase_path = os.path.join(model_dir, "endgame.tb")
+            if os.path.exists(tablebase_path):
+                with STARTUP.phase('open tablebase'):
+                    from tablebase import Tablebase
+                    st.session_state.tablebase = Tablebase(tablebase_path)
             st.session_state.models_loaded = True
         return True
     except Exception as e:
@@ -337,6 +375,7 @@ def start_game():
     st.session_state.move_count = 0
     st.session_state.auto_play = True
     st.session_state.last_move = None
+    st.session_state.search_players = make_search_players()
     
     st.session_state.game_id = db.log_game_start(
         mode="AI vs AI",
@@ -345,6 +384,43 @@ def start_game():
     )
 
 
+def make_search_players():
+    """Search-based players for the sides configured in AI_PLAYERS (fresh trees per game)"""
+    players = {}
+    for player_num, kind in AI_PLAYERS.items():
+        model = st.session_state.model1 if player_num == 1 else st.session_state.model2
+        if kind == "mcts":
+            from mcts import MCTSPlayer
+            players[player_num] = MCTSPlayer(model, st.session_state.device,
+                                             num_simulations=MCTS_SIMULATIONS)
+        elif kind == "alphabeta":
+            from alphabeta import AlphaBetaPlayer
+            players[player_num] = AlphaBetaPlayer(model, st.session_state.device,
+                                                  time_limit=ALPHABETA_SECONDS,
+                                                  use_value_head=ALPHABETA_VALUE_HEAD)
+    return players
+
+
+def choose_action(model, env, capture: bool):
+    """Action for the side to move from the tablebase, its search player, or the policy"""
+    from model import get_ai_move, get_ai_capture, EVALUATION_CACHE
+    
+    tablebase = st.session_state.tablebase
+    player = st.session_state.search_players.get(env.current_player)
+    if player is None:
+        ai_function = get_ai_capture if capture else get_ai_move
+        return ai_function(model, env, st.session_state.device, tablebase=tablebase,
+                           cache=EVALUATION_CACHE)
+    
+    action = tablebase.best_action(env) if tablebase is not None else None
+    if action is None:
+        player.model = model
+        action = player.search(env)
+        if hasattr(player, "summary"):
+            st.session_state.move_log.append(f"     {player.summary()}")
+    return action
+
+
 def log_move(player: int, action: tuple, formed_mill: bool = False):
     """Log a move"""
     env = st.session_state.env
@@ -381,13 +457,21 @@ def log_move(player: int, action: tuple, formed_mill: bool = False):
 
 def execute_turn():
     """Execute one turn (or part of turn) for the current AI"""
+    from registry import get_model
+    
     env = st.session_state.env
     
+    # Pick up retrained checkpoints (hot-swapped by the registry when the file changes)
+    model1_path, model2_path = st.session_state.model_paths
+    st.session_state.model1 = get_model(model1_path, st.session_state.device)
+    st.session_state.model2 = get_model(model2_path, st.session_state.device)
     model = st.session_state.model1 if env.current_player == 1 else st.session_state.model2
     player_num = env.current_player
     
     # 1. Get Action
-    action = get_ai_move(model, env, st.session_state.device)
+    tablebase = st.session_state.tablebase
+    with STARTUP.phase('first move'):
+        action = choose_action(model, env, capture=False)
     
     # Update last move for visualization
     if action[0] == 'move':
@@ -407,15 +491,47 @@ def execute_turn():
     
     # 3. Handle Capture if needed
     if info.get('needs_capture', False):
-        capture_action = get_ai_capture(model, env, st.session_state.device)
+        capture_action = choose_action(model, env, capture=True)
         state, reward, done, _ = env.step(capture_action)
         log_move(player_num, capture_action, False)
         # Maybe highlight capture position for a moment?
     
+    # 4. Adjudicate solved endgames instead of playing to the move limit
+    if not done and tablebase is not None:
+        winner = env.adjudicate(tablebase)
+        if winner is not None:
+            env.winner = winner
+            done = True
+            st.session_state.move_log.append("     Endgame tablebase: game adjudicated")
+    
     return done, env.winner
 
 
+def record_rerun():
+    """Auto-play cycle time (script run plus Streamlit's rerun overhead, without the turn delay)"""
+    now = time.perf_counter()
+    previous = st.session_state.get("auto_play_rerun_started")
+    if previous is not None:
+        metrics.observe("app.rerun", (now - previous - TURN_DELAY_SECONDS) * 1000.0)
+    st.session_state.auto_play_rerun_started = None
+    return now
+
+
+def metrics_panel():
+    """Collapsible live view of the hot-path metrics (NMM_METRICS=1 only)"""
+    with st.expander("📊 Metrics"):
+        st.code(metrics.REGISTRY.report())
+        col_prom, col_json = st.columns(2)
+        with col_prom:
+            st.download_button("Prometheus text", metrics.REGISTRY.to_prometheus(),
+                               file_name="nmm_metrics.prom", mime="text/plain")
+        with col_json:
+            st.download_button("JSON", metrics.REGISTRY.to_json(),
+                               file_name="nmm_metrics.json", mime="application/json")
+
+
 def main():
+    script_started = record_rerun() if metrics.ENABLED else None
     init_session_state()
     
     # --- HEADER SECTION ---
@@ -480,7 +596,10 @@ def main():
             last_move=st.session_state.last_move,
             current_player=env.current_player
         )
-        st.image(board_img, use_container_width=True)
+        with metrics.timer("board.png_encode"):
+            board_png = io.BytesIO()
+            board_img.save(board_png, format="PNG")
+        st.image(board_png.getvalue(), use_container_width=True)
         
         # Action Buttons
         col_btn1, col_btn2 = st.columns(2)
@@ -573,10 +692,22 @@ def main():
             </div>
         """, unsafe_allow_html=True)
 
+    # Startup timing
+    if STARTUP.phases:
+        with st.expander("⏱ Startup timing"):
+            st.code(STARTUP.report())
+    
+    if metrics.ENABLED:
+        metrics_panel()
+        metrics.observe("app.render", (time.perf_counter() - script_started) * 1000.0)
+
     # --- AUTO PLAY LOGIC ---
     if st.session_state.game_started and not st.session_state.game_over and st.session_state.auto_play:
-        time.sleep(1.0) 
-        done, winner = execute_turn()
+        time.sleep(TURN_DELAY_SECONDS)
+        with metrics.timer("app.turn"):
+            done, winner = execute_turn()
+        metrics.count("app.turns")
+        metrics.export()
         
         if done:
             st.session_state.game_over = True
@@ -585,8 +716,11 @@ def main():
             elif winner == -1: w_name = "Merah (Model 2)"
             else: w_name = "Seri"
             db.log_game_end(st.session_state.game_id, w_name, st.session_state.move_count)
+            metrics.count("app.games")
             st.rerun() # Rerun to show winner banner
         else:
+            if metrics.ENABLED:
+                st.session_state.auto_play_rerun_started = script_started
             st.rerun() # Rerun to show next state
 
 if __name__ == "__main__":
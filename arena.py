@@ -0,0 +1,360 @@
+"""
+Arena Module for Nine Men's Morris
+Headless model-vs-model matches across a process pool
+
+Colours alternate every game (model A is Biru / player 1 in even games) and
+every game is seeded from --seed and its index, so results do not depend
+on the worker count or scheduling. Finished games are written to the
+database in batches through database.log_games.
+
+Usage:
+    python arena.py "Model 1.pt" "Model 2.pt" --games 2000 --workers 4
+    python arena.py "Model 1.pt" "Model 2.pt" --player-a mcts --simulations 200 --games 200
+    python arena.py "Model 1.pt" "Model 2.pt" --player-a alphabeta --depth 4 --games 200
+"""
+
+import os
+import math
+import time
+import random
+import argparse
+import multiprocessing
+
+import numpy as np
+
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import database as db
+
+from game import NineMensMorrisEnv
+
+PLAYER_KINDS = ('policy', 'mcts', 'alphabeta')
+# 95% two-sided normal quantile
+Z_95 = 1.959963984540054
+
+
+class GameResult(NamedTuple):
+    index: int
+    a_colour: int          # 1 when model A played Biru (player 1)
+    winner: int            # 1, -1 or 0 (draw)
+    total_moves: int
+    adjudicated: bool
+    moves: list            # database.log_games move tuples (empty unless --log-moves)
+
+
+class PolicyPlayer:
+    """Samples from the network's policy (model.get_ai_move / get_ai_capture)"""
+
+    def __init__(self, model, device, tablebase=None):
+        self.model = model
+        self.device = device
+        self.tablebase = tablebase
+
+    def reset(self):
+        pass
+
+    def choose(self, env) -> Tuple:
+        from model import get_ai_move, get_ai_capture
+        ai_function = get_ai_capture if env.pending_capture else get_ai_move
+        return ai_function(self.model, env, self.device, tablebase=self.tablebase)
+
+
+class SearchPlayer:
+    """Wraps a search player (mcts.MCTSPlayer, alphabeta.AlphaBetaPlayer) with tablebase moves in solved endgames"""
+
+    def __init__(self, searcher, tablebase=None):
+        self.searcher = searcher
+        self.tablebase = tablebase
+
+    def reset(self):
+        self.searcher.reset()
+
+    def choose(self, env) -> Tuple:
+        action = self.tablebase.best_action(env) if self.tablebase is not None else None
+        if action is None:
+            action = self.searcher.search(env)
+        return action
+
+
+def make_player(kind: str, model, device, tablebase=None, simulations: int = 400,
+                time_limit: Optional[float] = None, depth: Optional[int] = None,
+                value_head: bool = False):
+    """Arena player of the given kind ('policy', 'mcts' or 'alphabeta')"""
+    if kind == 'policy':
+        return PolicyPlayer(model, device, tablebase)
+    if kind == 'mcts':
+        from mcts import MCTSPlayer
+        return SearchPlayer(MCTSPlayer(model, device, num_simulations=simulations,
+                                       time_limit=time_limit), tablebase)
+    if kind == 'alphabeta':
+        from alphabeta import AlphaBetaPlayer
+        # One second per move unless a budget is given; a fixed depth alone keeps games reproducible
+        if time_limit is None and depth is None:
+            time_limit = 1.0
+        return SearchPlayer(AlphaBetaPlayer(model, device, time_limit=time_limit, max_depth=depth,
+                                            use_value_head=value_head), tablebase)
+    raise ValueError(f"Unknown player kind: {kind}")
+
+
+def seed_everything(seed: int):
+    import torch
+    random.seed(seed)
+    np.random.seed(seed % 2**32)
+    torch.manual_seed(seed)
+
+
+def describe(action: Tuple) -> str:
+    """Move description in the app's log format"""
+    action_type, from_pos, to_pos = action
+    if action_type == 'place':
+        return f"placed at {to_pos}"
+    if action_type == 'move':
+        return f"moved {from_pos} → {to_pos}"
+    if action_type == 'capture':
+        return f"captured at {from_pos}"
+    return str(action)
+
+
+def play_game(player_a, player_b, a_colour: int, tablebase=None, log_moves: bool = False,
+              index: int = 0) -> GameResult:
+    """Play one game to the end; player_a moves for `a_colour`"""
+    env = NineMensMorrisEnv(history=None)
+    players = {a_colour: player_a, -a_colour: player_b}
+    player_a.reset()
+    player_b.reset()
+    moves = []
+    done = False
+    adjudicated = False
+    while not done:
+        mover = env.current_player
+        action = players[mover].choose(env)
+        _, _, done, info = env.step(action)
+        if log_moves:
+            moves.append(("Biru" if mover == 1 else "Merah", action[0], action[1], action[2],
+                          describe(action), bool(info.get('formed_mill', False))))
+        if not done and not env.pending_capture and tablebase is not None:
+            winner = env.adjudicate(tablebase)
+            if winner is not None:
+                env.winner = winner
+                done = adjudicated = True
+    return GameResult(index, a_colour, env.winner, env.move_count, adjudicated, moves)
+
+
+# --- Worker processes ---
+
+_WORKER: Dict = {}
+
+
+def _init_worker(config: Dict):
+    """Load both models once per worker process (shared through the registry)"""
+    import torch
+    from registry import get_model
+    torch.set_num_threads(config['threads'])
+    torch.set_grad_enabled(False)
+    device = torch.device('cpu')
+    tablebase = None
+    if config['tablebase']:
+        from tablebase import Tablebase
+        tablebase = Tablebase(config['tablebase'])
+    model_a = get_model(config['model_a'], device, quantized=config['quantized'])
+    model_b = get_model(config['model_b'], device, quantized=config['quantized'])
+    _WORKER.update(
+        config=config,
+        tablebase=tablebase,
+        player_a=make_player(config['player_a'], model_a, device, tablebase,
+                             config['simulations'], config['time_limit'], config['depth'],
+                             config['value_head']),
+        player_b=make_player(config['player_b'], model_b, device, tablebase,
+                             config['simulations'], config['time_limit'], config['depth'],
+                             config['value_head'])
+    )
+
+
+def _play_indexed(index: int) -> GameResult:
+    config = _WORKER['config']
+    seed_everything(config['seed'] * 1_000_003 + index)
+    a_colour = 1 if index % 2 == 0 else -1
+    return play_game(_WORKER['player_a'], _WORKER['player_b'], a_colour,
+                     _WORKER['tablebase'], config['log_moves'], index)
+
+
+# --- Statistics ---
+
+def wilson_interval(successes: int, trials: int, z: float = Z_95) -> Tuple[float, float]:
+    """Wilson score interval for a binomial rate"""
+    if trials == 0:
+        return 0.0, 1.0
+    p = successes / trials
+    denominator = 1 + z * z / trials
+    centre = (p + z * z / (2 * trials)) / denominator
+    margin = z * math.sqrt(p * (1 - p) / trials + z * z / (4 * trials * trials)) / denominator
+    # The bound at an all-or-nothing rate is exact, not off by rounding
+    low = 0.0 if successes <= 0 else max(0.0, centre - margin)
+    high = 1.0 if successes >= trials else min(1.0, centre + margin)
+    return low, high
+
+
+def score_interval(wins: int, draws: int, losses: int, z: float = Z_95) -> Tuple[float, float, float]:
+    """
+    Mean score (win 1, draw 0.5) and its Wilson interval, counting a draw as
+    half a success. Unlike a normal (Wald) interval it keeps a non-zero
+    width at 0% and 100%, so a clean sweep still bounds the Elo difference
+    on one side.
+    """
+    games = wins + draws + losses
+    if games == 0:
+        return 0.5, 0.0, 1.0
+    score = (wins + 0.5 * draws) / games
+    low, high = wilson_interval(wins + 0.5 * draws, games, z)
+    return score, low, high
+
+
+def elo_difference(score: float) -> float:
+    """Elo difference implied by an expected score (infinite at 0 and 1)"""
+    if score <= 0.0:
+        return -float('inf')
+    if score >= 1.0:
+        return float('inf')
+    return -400.0 * math.log10(1.0 / score - 1.0)
+
+
+def summarize(results: List[GameResult], seconds: float) -> Dict:
+    """Model A's results: W/D/L counts, rates with intervals, Elo, per-colour split and speed"""
+    wins = sum(1 for r in results if r.winner == r.a_colour)
+    draws = sum(1 for r in results if r.winner == 0)
+    losses = len(results) - wins - draws
+    games = len(results)
+    score, score_low, score_high = score_interval(wins, draws, losses)
+    summary = {
+        'games': games,
+        'wins': wins, 'draws': draws, 'losses': losses,
+        'win_rate': wins / games if games else 0.0,
+        'draw_rate': draws / games if games else 0.0,
+        'loss_rate': losses / games if games else 0.0,
+        'win_interval': wilson_interval(wins, games),
+        'draw_interval': wilson_interval(draws, games),
+        'loss_interval': wilson_interval(losses, games),
+        'score': score,
+        'score_interval': (score_low, score_high),
+        'elo': elo_difference(score),
+        'elo_interval': (elo_difference(score_low), elo_difference(score_high)),
+        'adjudicated': sum(1 for r in results if r.adjudicated),
+        'mean_length': float(np.mean([r.total_moves for r in results])) if results else 0.0,
+        'seconds': seconds,
+        'games_per_second': games / seconds if seconds > 0 else 0.0,
+    }
+    for colour, name in ((1, 'as_biru'), (-1, 'as_merah')):
+        side = [r for r in results if r.a_colour == colour]
+        summary[name] = (sum(1 for r in side if r.winner == colour),
+                         sum(1 for r in side if r.winner == 0),
+                         sum(1 for r in side if r.winner == -colour))
+    return summary
+
+
+def format_summary(summary: Dict, name_a: str, name_b: str) -> str:
+    def rate(key):
+        low, high = summary[f'{key}_interval']
+        return f"{summary[f'{key}_rate']:6.1%}  [{low:.1%}, {high:.1%}]"
+
+    elo_low, elo_high = summary['elo_interval']
+    lines = [
+        f"{name_a} vs {name_b}: {summary['games']} games",
+        f"  Wins:   {summary['wins']:6d}  {rate('win')}",
+        f"  Draws:  {summary['draws']:6d}  {rate('draw')}",
+        f"  Losses: {summary['losses']:6d}  {rate('loss')}",
+        f"  Score:  {summary['score']:.1%}  [{summary['score_interval'][0]:.1%}, {summary['score_interval'][1]:.1%}]",
+        f"  Elo:    {summary['elo']:+.0f}  [{elo_low:+.0f}, {elo_high:+.0f}]  (95% intervals)",
+        f"  As Biru +{summary['as_biru'][0]} ={summary['as_biru'][1]} -{summary['as_biru'][2]}, "
+        f"as Merah +{summary['as_merah'][0]} ={summary['as_merah'][1]} -{summary['as_merah'][2]}",
+        f"  Mean length {summary['mean_length']:.1f} plies, {summary['adjudicated']} adjudicated by tablebase",
+        f"  {summary['seconds']:.1f} s, {summary['games_per_second']:.2f} games/sec",
+    ]
+    return "\n".join(lines)
+
+
+def _winner_name(result: GameResult, name_a: str, name_b: str) -> str:
+    """Winner column in the app's format, with the model name of the winning side"""
+    if result.winner == 0:
+        return "Seri"
+    colour = "Biru" if result.winner == 1 else "Merah"
+    return f"{colour} ({name_a if result.winner == result.a_colour else name_b})"
+
+
+def run(config: Dict, workers: int, games: int, flush_every: int = 200, log_to_db: bool = True,
+        progress: bool = True) -> Dict:
+    """Play the match and return summarize()'s result"""
+    name_a = os.path.basename(config['model_a'])
+    name_b = os.path.basename(config['model_b'])
+    results: List[GameResult] = []
+    unlogged: List[GameResult] = []
+
+    def flush():
+        if log_to_db and unlogged:
+            db.log_games("Arena", name_a, name_b,
+                         [(_winner_name(r, name_a, name_b), r.total_moves, r.moves) for r in unlogged])
+        unlogged.clear()
+
+    started = time.perf_counter()
+    if workers <= 1:
+        _init_worker(config)
+        outcomes = map(_play_indexed, range(games))
+        pool = None
+    else:
+        # Threads per worker stay at config['threads'] (1 by default): processes give the parallelism
+        pool = multiprocessing.get_context('spawn').Pool(workers, _init_worker, (config,))
+        outcomes = pool.imap_unordered(_play_indexed, range(games), chunksize=max(1, min(8, games // (workers * 8))))
+    try:
+        for result in outcomes:
+            results.append(result)
+            unlogged.append(result)
+            if len(unlogged) >= flush_every:
+                flush()
+            if progress and len(results) % max(1, games // 20) == 0:
+                elapsed = time.perf_counter() - started
+                print(f"  {len(results)}/{games} games, {len(results) / elapsed:.2f} games/sec", flush=True)
+    finally:
+        flush()
+        if pool is not None:
+            pool.close()
+            pool.join()
+    results.sort(key=lambda r: r.index)
+    return summarize(results, time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play model-vs-model matches without the UI")
+    parser.add_argument('model_a', help='Checkpoint of model A (e.g. "Model 1.pt")')
+    parser.add_argument('model_b', help='Checkpoint of model B (e.g. "Model 2.pt")')
+    parser.add_argument('--games', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--threads', type=int, default=1, help='torch threads per worker')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--player-a', choices=PLAYER_KINDS, default='policy')
+    parser.add_argument('--player-b', choices=PLAYER_KINDS, default='policy')
+    parser.add_argument('--simulations', type=int, default=400, help='Search budget per move (mcts)')
+    parser.add_argument('--time-limit', type=float, default=None, help='Seconds per searched move')
+    parser.add_argument('--depth', type=int, default=None,
+                        help='Search depth per move (alphabeta; 1 s per move when neither this nor --time-limit is set)')
+    parser.add_argument('--value-head', action='store_true', help='Blend the value head into alphabeta leaves')
+    parser.add_argument('--quantized', action='store_true', help='Play with the INT8 networks')
+    parser.add_argument('--tablebase', default=None, help='Endgame tablebase for perfect endgames and adjudication')
+    parser.add_argument('--log-moves', action='store_true', help='Also write every move to the database')
+    parser.add_argument('--no-db', action='store_true', help='Do not write results to the database')
+    args = parser.parse_args()
+
+    config = {
+        'model_a': args.model_a, 'model_b': args.model_b,
+        'player_a': args.player_a, 'player_b': args.player_b,
+        'simulations': args.simulations, 'time_limit': args.time_limit,
+        'depth': args.depth, 'value_head': args.value_head,
+        'quantized': args.quantized, 'tablebase': args.tablebase,
+        'threads': args.threads, 'seed': args.seed, 'log_moves': args.log_moves,
+    }
+    summary = run(config, args.workers, args.games, log_to_db=not args.no_db)
+    name_a = f"{os.path.basename(args.model_a)} ({args.player_a})"
+    name_b = f"{os.path.basename(args.model_b)} ({args.player_b})"
+    print(format_summary(summary, name_a, name_b))
+
+
+if __name__ == '__main__':
+    main()
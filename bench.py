@@ -0,0 +1,365 @@
+"""
+Benchmark Module for Nine Men's Morris
+Repeatable timings of the engine, inference, rendering and logging hot paths
+
+Every benchmark runs over a fixed corpus of positions from seeded random
+games, and inference uses a NineMensMorrisNet initialised from the same
+seed, so two runs on the same machine measure the same work. Each result
+has ops/sec, p50/p99 latency and the peak Python heap (tracemalloc) of a
+separate, untimed pass.
+
+Usage:
+    python bench.py --output bench.json
+    python bench.py --baseline bench.json --max-slowdown 0.10
+    python bench.py --only env. --positions 500
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import platform
+import argparse
+import tempfile
+import tracemalloc
+
+import numpy as np
+
+from typing import Callable, Dict, List, Optional, Sequence
+
+from game import NineMensMorrisEnv
+
+INFERENCE_BATCH_SIZES = (1, 8, 32, 128)
+# Ops measured with tracemalloc for the memory column (it slows allocation-heavy code a lot)
+MEMORY_SAMPLE_OPS = 200
+
+
+def game_corpus(num_positions: int, seed: int = 0) -> List[tuple]:
+    """(position, legal action) pairs from seeded random games, captures included"""
+    rng = np.random.default_rng(seed)
+    env = NineMensMorrisEnv()
+    corpus = []
+    while len(corpus) < num_positions:
+        actions = env.get_valid_action_indices()
+        if len(actions) == 0:
+            env.reset()
+            continue
+        action = env.index_to_action(int(rng.choice(actions)))
+        corpus.append((env.clone(copy_history=True), action))
+        _, _, done, _ = env.step(action)
+        if done:
+            env.reset()
+    return corpus
+
+
+def measure(run: Callable[[int], None], count: int, rounds: int = 3, warm_up: int = 20,
+            prepare: Optional[Callable[[], None]] = None) -> Dict[str, float]:
+    """
+    Time run(i) for i in range(count), `rounds` times.
+
+    Latencies are per call. ops/sec counts calls over the summed latencies
+    of the fastest round, so setup between calls is excluded and a round
+    slowed down by other load on the machine does not count. For calls that consume their input
+    (env.step), prepare() rebuilds it before every pass.
+    """
+    prepare = prepare or (lambda: None)
+    prepare()
+    for i in range(min(warm_up, count)):
+        run(i)
+    latencies = np.empty(rounds * count, dtype=np.int64)
+    clock = time.perf_counter_ns
+    k = 0
+    for _ in range(rounds):
+        prepare()
+        for i in range(count):
+            started = clock()
+            run(i)
+            latencies[k] = clock() - started
+            k += 1
+
+    prepare()
+    tracemalloc.start()
+    for i in range(min(MEMORY_SAMPLE_OPS, count)):
+        run(i)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    fastest = latencies.reshape(rounds, count).sum(axis=1).min() if len(latencies) else 0
+    return {
+        'count': int(len(latencies)),
+        'ops_per_sec': float(count / (fastest / 1e9)) if fastest else 0.0,
+        'mean_us': float(latencies.mean() / 1e3),
+        'p50_us': float(np.percentile(latencies, 50) / 1e3),
+        'p99_us': float(np.percentile(latencies, 99) / 1e3),
+        'peak_memory_kb': peak / 1024,
+    }
+
+
+# --- Benchmarks: each returns {name: result} ---
+
+def bench_env(corpus: List[tuple], rounds: int) -> Dict[str, Dict]:
+    positions = [env for env, _ in corpus]
+    actions = [action for _, action in corpus]
+    count = len(corpus)
+    results = {}
+
+    # step mutates its env, so every call gets a fresh clone (made outside the timed call)
+    clones = []
+
+    def prepare_step():
+        clones[:] = [env.clone(copy_history=True) for env in positions]
+
+    def step(i):
+        clones[i].step(actions[i])
+
+    results['env.step'] = measure(step, count, rounds, prepare=prepare_step)
+
+    results['env.get_valid_actions'] = measure(lambda i: positions[i].get_valid_actions(), count, rounds)
+
+    # The legal mask is cached per position until the next move: time the uncached build on clones
+    def prepare_mask():
+        clones[:] = [env.clone() for env in positions]
+
+    results['env.get_valid_action_mask'] = measure(
+        lambda i: clones[i].get_valid_action_mask(), count, rounds, prepare=prepare_mask)
+
+    state = np.empty((7, NineMensMorrisEnv.BOARD_POSITIONS), dtype=np.float32)
+    results['env.get_state'] = measure(lambda i: positions[i].get_state(), count, rounds)
+    results['env.get_state(out)'] = measure(lambda i: positions[i].get_state(out=state), count, rounds)
+    results['env.clone'] = measure(lambda i: positions[i].clone(), count, rounds)
+    return results
+
+
+def bench_inference(corpus: List[tuple], rounds: int, seed: int,
+                    batch_sizes: Sequence[int] = INFERENCE_BATCH_SIZES) -> Dict[str, Dict]:
+    """get_ai_move/get_ai_capture on single positions and on batches sharing one forward pass"""
+    import torch
+    from model import (NineMensMorrisNet, get_ai_move, get_ai_capture, policy_inputs,
+                       select_move, select_capture)
+
+    torch.manual_seed(seed)
+    device = torch.device('cpu')
+    model = NineMensMorrisNet().to(device).eval()
+    positions = [env for env, _ in corpus]
+    results = {}
+
+    with torch.no_grad():
+        for batch_size in batch_sizes:
+            if batch_size == 1:
+                def run(i):
+                    env = positions[i]
+                    ai_function = get_ai_capture if env.pending_capture else get_ai_move
+                    ai_function(model, env, device)
+                count = len(positions)
+            else:
+                batches = [positions[start:start + batch_size]
+                           for start in range(0, len(positions) - batch_size + 1, batch_size)]
+
+                def run(i, batches=batches):
+                    batch = batches[i]
+                    states = torch.from_numpy(np.concatenate([policy_inputs(env) for env in batch]))
+                    policy_logits, _ = model(states.to(device))
+                    for env, logits in zip(batch, policy_logits):
+                        select = select_capture if env.pending_capture else select_move
+                        select(env, logits[None], device)
+                count = len(batches)
+            result = measure(run, count, rounds, warm_up=min(5, count))
+            result['batch_size'] = batch_size
+            result['positions_per_sec'] = result['ops_per_sec'] * batch_size
+            results[f'inference.batch{batch_size}'] = result
+    return results
+
+
+def bench_render(corpus: List[tuple], rounds: int) -> Dict[str, Dict]:
+    """board.draw_board plus the PNG encoding Streamlit does for st.image"""
+    from board import draw_board
+    positions = [env for env, _ in corpus]
+    last_moves = [(action[1], action[2]) if action[0] == 'move' else (None, action[2])
+                  for _, action in corpus]
+
+    def run(i):
+        env = positions[i]
+        image = draw_board(board_state=env.board, last_move=last_moves[i - 1],
+                           current_player=env.current_player, pending_capture=env.pending_capture)
+        image.save(io.BytesIO(), format='PNG')
+
+    return {'board.draw_board+png': measure(run, len(positions), rounds, warm_up=5)}
+
+
+def bench_database(corpus: List[tuple], rounds: int) -> Dict[str, Dict]:
+    """database.log_move per move, into a temporary database"""
+    import database as db
+    directory = tempfile.mkdtemp(prefix='nmm-bench-')
+    saved_name = db.DB_NAME
+    db.DB_NAME = os.path.join(directory, 'bench.db')
+    try:
+        game_id = db.log_game_start("Benchmark", "bench", "bench")
+        actions = [action for _, action in corpus]
+
+        def run(i):
+            action_type, from_pos, to_pos = actions[i]
+            db.log_move(game_id, i + 1, "Biru", action_type, from_pos, to_pos, str(actions[i]), False)
+
+        return {'database.log_move': measure(run, len(actions), rounds, warm_up=5)}
+    finally:
+        db.DB_NAME = saved_name
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+SUITES = ('env', 'inference', 'render', 'database')
+
+
+def run_suite(positions: int = 2000, rounds: int = 5, seed: int = 0, suites: Sequence[str] = SUITES,
+              threads: int = 1, only: Optional[str] = None) -> Dict:
+    """Run the benchmarks; returns the JSON-ready report"""
+    random.seed(seed)
+    np.random.seed(seed)
+    corpus = game_corpus(positions, seed)
+    # Slow paths get a smaller slice of the same corpus
+    small = corpus[:max(1, positions // 10)]
+
+    results: Dict[str, Dict] = {}
+    if 'env' in suites:
+        results.update(bench_env(corpus, rounds))
+    if 'inference' in suites:
+        import torch
+        torch.set_num_threads(threads)
+        torch.manual_seed(seed)
+        results.update(bench_inference(corpus[:max(max(INFERENCE_BATCH_SIZES), positions // 4)], rounds, seed))
+    if 'render' in suites:
+        results.update(bench_render(small, rounds))
+    if 'database' in suites:
+        results.update(bench_database(small, rounds))
+    if only:
+        results = {name: result for name, result in results.items() if name.startswith(only)}
+
+    return {
+        'meta': {
+            'timestamp': time.strftime("%Y-%m-%d %H:%M:%S"),
+            'python': sys.version.split()[0],
+            'numpy': np.__version__,
+            'torch': sys.modules['torch'].__version__ if 'torch' in sys.modules else None,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'threads': threads,
+            'positions': positions,
+            'rounds': rounds,
+            'seed': seed,
+        },
+        'results': results,
+        'peak_rss_kb': _peak_rss_kb(),
+    }
+
+
+def _peak_rss_kb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS, kilobytes elsewhere
+    return peak / 1024 if sys.platform == 'darwin' else float(peak)
+
+
+def compare(report: Dict, baseline: Dict, max_slowdown: float = 0.10, max_p99_increase: float = 0.25,
+            max_memory_increase: float = 0.25, overrides: Optional[Dict[str, float]] = None) -> List[str]:
+    """
+    Regressions of `report` against `baseline`, as messages (empty when none).
+
+    A benchmark regresses when its ops/sec fell by more than max_slowdown
+    (or its override), or its p99 latency or peak memory grew by more than
+    the given fractions. Benchmarks missing from either side are skipped.
+    """
+    overrides = overrides or {}
+    regressions = []
+    for name, result in report['results'].items():
+        base = baseline.get('results', {}).get(name)
+        if base is None:
+            continue
+        slowdown = overrides.get(name, max_slowdown)
+        if base['ops_per_sec'] > 0 and result['ops_per_sec'] < base['ops_per_sec'] * (1 - slowdown):
+            regressions.append(f"{name}: {result['ops_per_sec']:,.0f} ops/sec vs {base['ops_per_sec']:,.0f} "
+                               f"(-{1 - result['ops_per_sec'] / base['ops_per_sec']:.1%}, limit -{slowdown:.0%})")
+        if base['p99_us'] > 0 and result['p99_us'] > base['p99_us'] * (1 + max_p99_increase):
+            regressions.append(f"{name}: p99 {result['p99_us']:,.1f} us vs {base['p99_us']:,.1f} us "
+                               f"(+{result['p99_us'] / base['p99_us'] - 1:.1%}, limit +{max_p99_increase:.0%})")
+        base_memory = base.get('peak_memory_kb', 0)
+        if base_memory > 0 and result['peak_memory_kb'] > base_memory * (1 + max_memory_increase):
+            regressions.append(f"{name}: peak memory {result['peak_memory_kb']:,.0f} KB vs {base_memory:,.0f} KB "
+                               f"(+{result['peak_memory_kb'] / base_memory - 1:.1%}, "
+                               f"limit +{max_memory_increase:.0%})")
+    return regressions
+
+
+def format_report(report: Dict, baseline: Optional[Dict] = None) -> str:
+    base_results = (baseline or {}).get('results', {})
+    width = max([len(name) for name in report['results']] + [9])
+    lines = [f"{'benchmark':<{width}}  {'ops/sec':>12}  {'p50 us':>10}  {'p99 us':>10}  {'peak KB':>9}"
+             + ("  vs base" if baseline else "")]
+    for name, result in report['results'].items():
+        line = (f"{name:<{width}}  {result['ops_per_sec']:>12,.0f}  {result['p50_us']:>10,.1f}  "
+                f"{result['p99_us']:>10,.1f}  {result['peak_memory_kb']:>9,.1f}")
+        base = base_results.get(name)
+        if base and base['ops_per_sec'] > 0:
+            line += f"  {result['ops_per_sec'] / base['ops_per_sec'] - 1:+8.1%}"
+        lines.append(line)
+    if report.get('peak_rss_kb'):
+        lines.append(f"peak RSS {report['peak_rss_kb'] / 1024:,.1f} MB")
+    return "\n".join(lines)
+
+
+def _parse_overrides(values: Sequence[str]) -> Dict[str, float]:
+    overrides = {}
+    for value in values:
+        name, _, limit = value.rpartition('=')
+        if not name:
+            raise argparse.ArgumentTypeError(f"Expected NAME=FRACTION, got {value}")
+        overrides[name] = float(limit)
+    return overrides
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the engine, inference, rendering and logging")
+    parser.add_argument('--positions', type=int, default=2000, help='Corpus size (seeded random games)')
+    parser.add_argument('--rounds', type=int, default=5, help='Timed passes over the corpus')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--threads', type=int, default=1, help='torch threads for inference')
+    parser.add_argument('--suites', nargs='+', choices=SUITES, default=list(SUITES))
+    parser.add_argument('--only', help='Keep only benchmarks whose name starts with this prefix')
+    parser.add_argument('--output', help='Write the results as JSON')
+    parser.add_argument('--baseline', help='Baseline JSON to compare against (exit status 1 on regression)')
+    parser.add_argument('--max-slowdown', type=float, default=0.10, help='Allowed ops/sec drop (fraction)')
+    parser.add_argument('--max-p99-increase', type=float, default=0.25, help='Allowed p99 growth (fraction)')
+    parser.add_argument('--max-memory-increase', type=float, default=0.25,
+                        help='Allowed peak memory growth (fraction)')
+    parser.add_argument('--threshold', action='append', default=[], metavar='NAME=FRACTION',
+                        help='Per-benchmark ops/sec drop limit, e.g. board.draw_board+png=0.2')
+    args = parser.parse_args()
+
+    report = run_suite(args.positions, args.rounds, args.seed, args.suites, args.threads, args.only)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print(format_report(report, baseline))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if baseline is not None:
+        regressions = compare(report, baseline, args.max_slowdown, args.max_p99_increase,
+                              args.max_memory_increase, _parse_overrides(args.threshold))
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) against {args.baseline}:")
+            for message in regressions:
+                print(f"  {message}")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
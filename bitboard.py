@@ -0,0 +1,365 @@
+"""
+Bitboard Game Engine for Nine Men's Morris
+Drop-in replacement for NineMensMorrisEnv that stores each player's pieces
+as a 24-bit integer and generates moves, mills and captures with bit operations
+"""
+
+import numpy as np
+
+from typing import List, Tuple
+
+import metrics
+
+from game import NineMensMorrisEnv, ZOBRIST_PIECES
+
+FULL_MASK = (1 << NineMensMorrisEnv.BOARD_POSITIONS) - 1
+
+# Precomputed masks: one per mill, the mills through each position and the neighbours of each position
+MILL_MASKS = tuple(sum(1 << p for p in mill) for mill in NineMensMorrisEnv.MILLS)
+POSITION_MILL_MASKS = tuple(
+    tuple(mask for mask in MILL_MASKS if mask >> pos & 1)
+    for pos in range(NineMensMorrisEnv.BOARD_POSITIONS)
+)
+NEIGHBOR_MASKS = tuple(
+    sum(1 << n for n in NineMensMorrisEnv.ADJACENCY[pos])
+    for pos in range(NineMensMorrisEnv.BOARD_POSITIONS)
+)
+
+# A bitboard is expanded 12 bits at a time through these tables
+_HALF_BITS = 12
+_HALF_MASK = (1 << _HALF_BITS) - 1
+_HALF_FLAGS = np.unpackbits(
+    np.arange(1 << _HALF_BITS, dtype='<u2').view(np.uint8).reshape(-1, 2),
+    axis=1, bitorder='little'
+)[:, :_HALF_BITS]
+_HALF_FLOAT = _HALF_FLAGS.astype(np.float32)
+_HALF_INT8 = _HALF_FLAGS.astype(np.int8)
+# Channels 2-5 of get_state depend only on the phase and the pieces in hand
+_STATE_TEMPLATES = {}
+for _phase, _channel in NineMensMorrisEnv.PHASE_CHANNELS.items():
+    for _hand in range(NineMensMorrisEnv.PIECES_PER_PLAYER + 1):
+        _template = np.zeros((7, NineMensMorrisEnv.BOARD_POSITIONS), dtype=np.float32)
+        _template[_channel] = 1.0
+        _template[5] = _hand / NineMensMorrisEnv.PIECES_PER_PLAYER
+        _STATE_TEMPLATES[_phase, _hand] = _template
+_HALF_POSITIONS = tuple(
+    tuple(pos for pos in range(_HALF_BITS) if bits >> pos & 1)
+    for bits in range(1 << _HALF_BITS)
+)
+_HIGH_POSITIONS = tuple(tuple(pos + _HALF_BITS for pos in low) for low in _HALF_POSITIONS)
+
+
+def _zobrist_byte_table(keys: List[int], shift: int) -> Tuple[int, ...]:
+    """XOR of the piece keys for every value of the bitboard byte starting at `shift`"""
+    table = []
+    for byte in range(256):
+        key = 0
+        for bit in range(8):
+            if byte >> bit & 1:
+                key ^= keys[shift + bit]
+        table.append(key)
+    return tuple(table)
+
+
+_ZOBRIST_BYTES = {
+    player: tuple(_zobrist_byte_table(ZOBRIST_PIECES[player], shift) for shift in (0, 8, 16))
+    for player in (1, -1)
+}
+
+
+def bit_positions(bits: int) -> Tuple[int, ...]:
+    """Positions of the set bits of a 24-bit mask, in ascending order"""
+    return _HALF_POSITIONS[bits & _HALF_MASK] + _HIGH_POSITIONS[bits >> _HALF_BITS]
+
+
+def bits_from_board(board: np.ndarray, player: int) -> int:
+    """Bitboard of a player's pieces from a 24-element board array"""
+    flags = np.packbits(np.asarray(board) == player, bitorder='little')
+    return int.from_bytes(flags.tobytes(), 'little')
+
+
+def mill_pieces(bits: int) -> int:
+    """Union of all complete mills contained in a bitboard"""
+    in_mill = 0
+    for mask in MILL_MASKS:
+        if bits & mask == mask:
+            in_mill |= mask
+    return in_mill
+
+
+class BitboardNineMensMorrisEnv(NineMensMorrisEnv):
+    """Nine Men's Morris environment backed by per-player 24-bit bitboards"""
+
+    def reset(self):
+        self.bitboards = {1: 0, -1: 0}
+        self.global_phase = 'placement'
+        self.player_phase = {
+            1: 'placement',
+            -1: 'placement'
+        }
+        self.current_player = 1
+        self.pieces_in_hand = {1: self.PIECES_PER_PLAYER, -1: self.PIECES_PER_PLAYER}
+        self.pieces_on_board = {1: 0, -1: 0}
+        self.winner = None
+        self.move_count = 0
+        self.last_mill_formed = False
+        self.last_capture = False
+        self.pending_capture = False
+        self._reset_history()
+        self._undo_stack = []
+        self._legal_mask = None
+        return self.get_state()
+
+    @property
+    def board(self) -> np.ndarray:
+        """24-element int8 board (0=empty, 1=player1, -1=player2), built on demand"""
+        p1 = self.bitboards[1]
+        p2 = self.bitboards[-1]
+        halves = _HALF_INT8.take(
+            [p1 & _HALF_MASK, p1 >> _HALF_BITS, p2 & _HALF_MASK, p2 >> _HALF_BITS], axis=0
+        ).reshape(2, self.BOARD_POSITIONS)
+        return halves[0] - halves[1]
+
+    @board.setter
+    def board(self, board: np.ndarray):
+        self.bitboards = {1: bits_from_board(board, 1), -1: bits_from_board(board, -1)}
+
+    @property
+    def board_hash(self) -> int:
+        """Zobrist hash of the pieces on the board, from per-byte key tables"""
+        key = 0
+        for player in (1, -1):
+            bits = self.bitboards[player]
+            low, mid, high = _ZOBRIST_BYTES[player]
+            key ^= low[bits & 0xFF] ^ mid[bits >> 8 & 0xFF] ^ high[bits >> 16]
+        return key
+
+    def get_state(self, out=None):
+        player = self.current_player
+        own = self.bitboards[player]
+        opp = self.bitboards[-player]
+        empty = FULL_MASK & ~(own | opp)
+        template = _STATE_TEMPLATES[self.player_phase[player], self.pieces_in_hand[player]]
+        halves = [
+            own & _HALF_MASK, own >> _HALF_BITS,
+            opp & _HALF_MASK, opp >> _HALF_BITS,
+            empty & _HALF_MASK, empty >> _HALF_BITS
+        ]
+
+        if out is None:
+            state = template.copy()
+        else:
+            state = out
+            state[2:6] = template[2:6]
+
+        # Channels 0, 1 and 6 straight from the lookup table
+        if state.flags.c_contiguous:
+            _HALF_FLOAT.take(halves[:4], axis=0, out=state[0:2].reshape(4, _HALF_BITS), mode='clip')
+            _HALF_FLOAT.take(halves[4:], axis=0, out=state[6].reshape(2, _HALF_BITS), mode='clip')
+        else:
+            occupancy = _HALF_FLOAT.take(halves, axis=0).reshape(3, self.BOARD_POSITIONS)
+            state[0:2] = occupancy[0:2]
+            state[6] = occupancy[2]
+        return state
+
+    def _add_piece(self, pos, player):
+        self.bitboards[player] |= 1 << pos
+
+    def _remove_piece(self, pos, player):
+        self.bitboards[player] &= ~(1 << pos)
+
+    def _empty_bits(self) -> int:
+        return FULL_MASK & ~(self.bitboards[1] | self.bitboards[-1])
+
+    def _move_targets(self, player: int) -> List[Tuple[int, int]]:
+        """(from_pos, to_pos) pairs for the player's movement or flying phase"""
+        empty = self._empty_bits()
+        own = self.bitboards[player]
+        if self.player_phase[player] == 'flying':
+            targets = bit_positions(empty)
+            return [(f, t) for f in bit_positions(own) for t in targets]
+        return [
+            (f, t)
+            for f in bit_positions(own)
+            for t in bit_positions(NEIGHBOR_MASKS[f] & empty)
+        ]
+
+    def get_valid_actions(self):
+        """Returns list of valid actions with proper type annotation"""
+        player = self.current_player
+        phase = self.player_phase[player]
+
+        if phase == 'placement':
+            if self.pieces_in_hand[player] > 0:
+                return [('place', None, pos) for pos in bit_positions(self._empty_bits())]
+            return []
+
+        return [('move', f, t) for f, t in self._move_targets(player)]
+
+    def _capturable_bits(self) -> int:
+        opp = self.bitboards[-self.current_player]
+        free = opp & ~mill_pieces(opp)
+        return free if free else opp
+
+    def get_valid_capture_actions(self):
+        """Get valid capture actions when a mill is formed"""
+        return [('capture', pos, None) for pos in bit_positions(self._capturable_bits())]
+
+    def get_valid_capture_mask(self):
+        """Boolean mask over the 24 positions of opponent pieces that may be captured"""
+        capturable = self._capturable_bits()
+        return _HALF_FLAGS.take([capturable & _HALF_MASK, capturable >> _HALF_BITS], axis=0).reshape(-1) != 0
+
+    @metrics.timed('env.legal_mask')
+    def _update_legal_actions(self):
+        mask = np.zeros(self.ACTION_SPACE_SIZE, dtype=np.float32)
+        player = self.current_player
+
+        if self.pending_capture:
+            capturable = self._capturable_bits()
+            mask[self.ACTION_CAPTURE_START:] = _HALF_FLOAT.take(
+                [capturable & _HALF_MASK, capturable >> _HALF_BITS], axis=0).reshape(-1)
+        elif self.player_phase[player] == 'placement':
+            if self.pieces_in_hand[player] > 0:
+                empty = self._empty_bits()
+                mask[:self.BOARD_POSITIONS] = _HALF_FLOAT.take(
+                    [empty & _HALF_MASK, empty >> _HALF_BITS], axis=0).reshape(-1)
+        else:
+            start = self.ACTION_MOVEMENT_START
+            size = self.BOARD_POSITIONS
+            mask[[start + f * size + t for f, t in self._move_targets(player)]] = 1.0
+
+        mask.flags.writeable = False
+        self._legal_mask = mask
+        self._legal_indices = np.flatnonzero(mask)
+
+    def _has_move(self, player: int) -> bool:
+        empty = self._empty_bits()
+        phase = self.player_phase[player]
+        if phase == 'placement':
+            return bool(empty) and self.pieces_in_hand[player] > 0
+        if phase == 'flying':
+            return bool(empty)
+        for pos in bit_positions(self.bitboards[player]):
+            if NEIGHBOR_MASKS[pos] & empty:
+                return True
+        return False
+
+    @metrics.timed('env.step')
+    def step(self, action):
+        """Execute action and return (state, reward, done, info)"""
+        action_type, from_pos, to_pos = action
+        acting_player = self.current_player
+        opponent = -acting_player
+        bitboards = self.bitboards
+
+        self.last_mill_formed = False
+        self.last_capture = False
+        self.pending_capture = False
+        self._legal_mask = None
+        reward = -0.0035
+
+        if action_type == 'capture':
+            bitboards[opponent] &= ~(1 << from_pos)
+            self.pieces_on_board[opponent] -= 1
+            self.current_player = opponent
+            self.move_count += 1
+            self.last_capture = True
+            reward += 0.05
+
+        else:
+            if action_type == 'place':
+                bitboards[acting_player] |= 1 << to_pos
+                self.pieces_in_hand[acting_player] -= 1
+                self.pieces_on_board[acting_player] += 1
+            else:
+                bitboards[acting_player] ^= (1 << from_pos) | (1 << to_pos)
+            self.move_count += 1
+
+            own = bitboards[acting_player]
+            for mask in POSITION_MILL_MASKS[to_pos]:
+                if own & mask == mask:
+                    self.last_mill_formed = True
+                    reward += 0.1
+                    # Every opponent piece is capturable when all of them sit in mills,
+                    # so a capture exists exactly when the opponent has pieces on the board
+                    if bitboards[opponent]:
+                        self.pending_capture = True
+                        self._record_move(acting_player, action)
+                        return self._observation(), reward, False, self._capture_info()
+                    break
+
+            self.current_player = opponent
+
+        self._record_move(acting_player, action)
+
+        # Check placement -> movement phase transition
+        if self.global_phase == 'placement':
+            if self.pieces_in_hand[1] == 0 and self.pieces_in_hand[-1] == 0:
+                self.global_phase = 'movement'
+                self.player_phase[1] = 'movement'
+                self.player_phase[-1] = 'movement'
+
+        # Check for flying phase PER PLAYER
+        if self.global_phase == 'movement':
+            for p in (1, -1):
+                if self.pieces_on_board[p] == 3:
+                    self.player_phase[p] = 'flying'
+
+        done = False
+
+        # Win by reducing opponent to < 3 pieces
+        if self.global_phase != 'placement':
+            if self.pieces_on_board[opponent] < 3:
+                done = True
+                reward = 1.5
+                self.winner = acting_player
+
+        # Win by blocking opponent
+        if not done and not self._has_move(self.current_player):
+            done = True
+            reward = 1.5
+            self.winner = acting_player
+
+        # Draw by move limit
+        if self.move_count > 200:
+            done = True
+            reward = 0.0
+            self.winner = 0
+
+        return self._observation(), reward, done, self._step_info()
+
+    def _reset_mill_state(self):
+        # Mills are read from the bitboards directly; only the legal-move cache depends on the position
+        self._legal_mask = None
+
+    def _is_in_mill(self, pos, player):
+        own = self.bitboards[player]
+        for mask in POSITION_MILL_MASKS[pos]:
+            if own & mask == mask:
+                return True
+        return False
+
+    def _all_in_mills(self, player):
+        own = self.bitboards[player]
+        return own & ~mill_pieces(own) == 0
+
+    def clone(self, copy_history=False):
+        new_env = BitboardNineMensMorrisEnv.__new__(BitboardNineMensMorrisEnv)
+        new_env.lazy_state = self.lazy_state
+        new_env.history = self.history
+        new_env.bitboards = self.bitboards.copy()
+        new_env.global_phase = self.global_phase
+        new_env.player_phase = self.player_phase.copy()
+        new_env.current_player = self.current_player
+        new_env.pieces_in_hand = self.pieces_in_hand.copy()
+        new_env.pieces_on_board = self.pieces_on_board.copy()
+        new_env.winner = self.winner
+        new_env.move_count = self.move_count
+        new_env.last_mill_formed = self.last_mill_formed
+        new_env.last_capture = self.last_capture
+        new_env.pending_capture = self.pending_capture
+        new_env._legal_mask = None
+        self._clone_history(new_env, copy_history)
+        new_env._undo_stack = []
+        return new_env
@@ -10,6 +10,8 @@ from io import BytesIO
 from PIL import Image, ImageDraw, ImageFont
 from typing import List, Optional, Tuple, Dict
 
+import metrics
+
 # Board configuration
 BOARD_SIZE = 600
 MARGIN = 60
@@ -61,6 +63,7 @@ def get_position_coords(pos: int, board_size: int = BOARD_SIZE, margin: int = MA
     return (x, y)
 
 
+@metrics.timed('board.draw_board')
 def draw_board(board_state: np.ndarray, 
                highlights: Optional[List[int]] = None,
                selected_piece: Optional[int] = None,
@@ -7,6 +7,8 @@ import os
 import sqlite3
 import datetime
 
+import metrics
+
 DB_NAME = "ninemensmorris.db"
 
 def init_db():
@@ -66,6 +68,7 @@ def log_game_start(mode: str, model1_name: str, model2_name: str) -> int:
     
     return game_id
 
+@metrics.timed('database.log_move')
 def log_move(game_id: int, move_number: int, player: str, action_type: str, 
              from_pos: int, to_pos: int, description: str, formed_mill: bool = False):
     """Log a single move"""
@@ -103,3 +106,41 @@ def log_game_end(game_id: int, winner: str, total_moves: int):
     
     conn.commit()
     conn.close()
+
+def log_games(mode: str, model1_name: str, model2_name: str, games: list) -> list:
+    """Log finished games in one transaction (arena runs write thousands of them)
+
+    games: (winner, total_moves, moves) tuples, where moves is a list of
+    (player, action_type, from_pos, to_pos, description, formed_mill) or empty.
+    Returns the new game ids.
+    """
+    init_db()  # Ensure tables exist
+    
+    conn = sqlite3.connect(DB_NAME)
+    c = conn.cursor()
+    
+    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    game_ids = []
+    
+    for winner, total_moves, moves in games:
+        c.execute('''
+        INSERT INTO games (timestamp, mode, model1_name, model2_name, winner, total_moves)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ''', (timestamp, mode, model1_name, model2_name, winner, total_moves))
+        game_id = c.lastrowid
+        game_ids.append(game_id)
+        
+        c.executemany('''
+        INSERT INTO moves (game_id, move_number, player, action_type, from_pos, to_pos, description, formed_mill)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [(game_id, number, player, action_type,
+               from_pos if from_pos is not None else -1,
+               to_pos if to_pos is not None else -1,
+               description, formed_mill)
+              for number, (player, action_type, from_pos, to_pos, description, formed_mill)
+              in enumerate(moves, start=1)])
+    
+    conn.commit()
+    conn.close()
+    
+    return game_ids
@@ -0,0 +1,236 @@
+"""
+Model Export Module for Nine Men's Morris
+TorchScript/ONNX export of NineMensMorrisNet with a fused CPU inference graph
+
+Usage:
+    python export.py "Model 1.pt" "Model 2.pt"
+    python export.py final_ppo_model_1.pt --no-onnx --benchmark-iters 200
+"""
+
+import os
+import time
+import argparse
+import warnings
+
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+from typing import Dict, Optional
+
+from game import NineMensMorrisEnv
+from model import NineMensMorrisNet, load_model
+
+TORCHSCRIPT_SUFFIX = '.ts'
+ONNX_SUFFIX = '.onnx'
+
+BENCHMARK_BATCH_SIZES = (1, 32, 256)
+PARITY_TOLERANCE = 1e-4
+
+
+def optimized_artifact_path(checkpoint_path: str) -> str:
+    """TorchScript artifact written next to a checkpoint: 'Model 1.pt' -> 'Model 1.ts'"""
+    return os.path.splitext(checkpoint_path)[0] + TORCHSCRIPT_SUFFIX
+
+
+class FusedNineMensMorrisNet(nn.Module):
+    """
+    NineMensMorrisNet rearranged for inference; same outputs as the eager model.
+
+    The 1x1 Conv1d stack runs as Linear layers over a (batch, 24, channels)
+    layout, so every layer is one GEMM; fc_shared's columns are permuted to
+    the position-major flatten order. actor_fc and critic_fc share their
+    input and run as one 512 -> 512 Linear.
+    """
+    def __init__(self, action_size: int = 624):
+        super(FusedNineMensMorrisNet, self).__init__()
+        self.feature1 = nn.Linear(7, 64)
+        self.feature2 = nn.Linear(64, 128)
+        self.feature3 = nn.Linear(128, 256)
+        self.fc_shared = nn.Linear(256 * 24, 512)
+        self.heads_fc = nn.Linear(512, 512)
+        self.actor_out = nn.Linear(256, action_size)
+        self.critic_out = nn.Linear(256, 1)
+
+    @classmethod
+    def from_model(cls, model: NineMensMorrisNet) -> 'FusedNineMensMorrisNet':
+        fused = cls(model.actor_out.out_features)
+        with torch.no_grad():
+            for target, conv in ((fused.feature1, model.conv1), (fused.feature2, model.conv2),
+                                 (fused.feature3, model.conv3)):
+                target.weight.copy_(conv.weight.squeeze(-1))
+                target.bias.copy_(conv.bias)
+            # Eager flatten is channel-major (c * 24 + p), the fused one position-major (p * 256 + c)
+            weight = model.fc_shared.weight.view(512, 256, 24).permute(0, 2, 1).reshape(512, -1)
+            fused.fc_shared.weight.copy_(weight)
+            fused.fc_shared.bias.copy_(model.fc_shared.bias)
+            fused.heads_fc.weight.copy_(torch.cat([model.actor_fc.weight, model.critic_fc.weight]))
+            fused.heads_fc.bias.copy_(torch.cat([model.actor_fc.bias, model.critic_fc.bias]))
+            fused.actor_out.load_state_dict(model.actor_out.state_dict())
+            fused.critic_out.load_state_dict(model.critic_out.state_dict())
+        return fused.eval()
+
+    def forward(self, x):
+        # x shape: (batch_size, 7, 24)
+        x = x.transpose(1, 2)
+        x = F.relu(self.feature1(x))
+        x = F.relu(self.feature2(x))
+        x = F.relu(self.feature3(x))
+        x = F.relu(self.fc_shared(x.reshape(x.size(0), -1)))
+        heads = F.relu(self.heads_fc(x))
+        policy_logits = self.actor_out(heads[:, :256])
+        value = self.critic_out(heads[:, 256:])
+        return policy_logits, value
+
+
+def to_torchscript(model: NineMensMorrisNet) -> torch.jit.ScriptModule:
+    """Traced, frozen and inference-optimized TorchScript module of the fused network"""
+    fused = FusedNineMensMorrisNet.from_model(model.cpu().eval())
+    example = torch.zeros(1, 7, NineMensMorrisEnv.BOARD_POSITIONS)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', FutureWarning)
+        with torch.no_grad():
+            traced = torch.jit.trace(fused, example)
+        return torch.jit.optimize_for_inference(torch.jit.freeze(traced))
+
+
+def load_torchscript(path: str, device: torch.device):
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', FutureWarning)
+        return torch.jit.load(path, map_location=device)
+
+
+def export_onnx(model: NineMensMorrisNet, path: str) -> bool:
+    """Write an ONNX graph with a dynamic batch axis; False if the exporter is unavailable"""
+    try:
+        import onnx  # noqa: F401 (required by the exporter)
+    except ImportError:
+        print("  ONNX export skipped (onnx not installed)")
+        return False
+    fused = FusedNineMensMorrisNet.from_model(model.cpu().eval())
+    example = torch.zeros(1, 7, NineMensMorrisEnv.BOARD_POSITIONS)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', DeprecationWarning)
+        torch.onnx.export(
+            fused, (example,), path,
+            input_names=['state'], output_names=['policy_logits', 'value'],
+            dynamic_axes={'state': {0: 'batch'}, 'policy_logits': {0: 'batch'}, 'value': {0: 'batch'}},
+            opset_version=17, dynamo=False
+        )
+    return True
+
+
+def sample_states(num_positions: int = 256, seed: int = 0) -> torch.Tensor:
+    """Observations from random self-play, covering all phases"""
+    rng = np.random.default_rng(seed)
+    env = NineMensMorrisEnv(history=None)
+    states = []
+    while len(states) < num_positions:
+        states.append(env.get_state())
+        actions = env.get_valid_action_indices()
+        if len(actions) == 0:
+            env.reset()
+            continue
+        _, _, done, _ = env.step(env.index_to_action(int(rng.choice(actions))))
+        if done:
+            env.reset()
+    return torch.from_numpy(np.stack(states))
+
+
+def check_parity(reference: nn.Module, candidate, states: torch.Tensor) -> Dict[str, float]:
+    """Largest absolute differences between two networks' outputs on the same states"""
+    with torch.no_grad():
+        ref_logits, ref_value = reference(states)
+        logits, value = candidate(states)
+    return {
+        'policy_max_abs_diff': float((ref_logits - logits).abs().max()),
+        'value_max_abs_diff': float((ref_value - value).abs().max()),
+        'top1_agreement': float((ref_logits.argmax(dim=1) == logits.argmax(dim=1)).float().mean())
+    }
+
+
+def check_onnx_parity(reference: nn.Module, path: str, states: torch.Tensor) -> Optional[Dict[str, float]]:
+    try:
+        import onnxruntime
+    except ImportError:
+        return None
+    session = onnxruntime.InferenceSession(path, providers=['CPUExecutionProvider'])
+    logits, value = session.run(None, {'state': states.numpy()})
+    wrapped = lambda _: (torch.from_numpy(logits), torch.from_numpy(value))
+    return check_parity(reference, wrapped, states)
+
+
+def benchmark(model, states: torch.Tensor, iterations: int = 100) -> Dict[int, float]:
+    """Mean latency in milliseconds per forward pass at each benchmark batch size"""
+    results = {}
+    with torch.no_grad():
+        for batch_size in BENCHMARK_BATCH_SIZES:
+            batch = states[:batch_size]
+            if len(batch) < batch_size:
+                batch = batch.repeat((batch_size + len(batch) - 1) // len(batch), 1, 1)[:batch_size]
+            for _ in range(5):
+                model(batch)
+            started = time.perf_counter()
+            for _ in range(iterations):
+                model(batch)
+            results[batch_size] = (time.perf_counter() - started) / iterations * 1000.0
+    return results
+
+
+def export(checkpoint_path: str, onnx: bool = True, benchmark_iters: int = 100) -> bool:
+    """Export one checkpoint, check parity and print the latency comparison; True on success"""
+    device = torch.device('cpu')
+    eager = load_model(checkpoint_path, device, optimized=False)
+    states = sample_states()
+
+    script_path = optimized_artifact_path(checkpoint_path)
+    scripted = to_torchscript(eager)
+    parity = check_parity(eager, scripted, states)
+    print(f"{checkpoint_path}")
+    print(f"  TorchScript parity: policy {parity['policy_max_abs_diff']:.2e}, "
+          f"value {parity['value_max_abs_diff']:.2e}, top-1 agreement {parity['top1_agreement']:.1%}")
+    if max(parity['policy_max_abs_diff'], parity['value_max_abs_diff']) > PARITY_TOLERANCE:
+        print(f"  Parity check FAILED (tolerance {PARITY_TOLERANCE}); {script_path} not written")
+        return False
+    scripted.save(script_path)
+    print(f"  Wrote {script_path}")
+
+    if onnx:
+        onnx_path = os.path.splitext(checkpoint_path)[0] + ONNX_SUFFIX
+        if export_onnx(eager, onnx_path):
+            print(f"  Wrote {onnx_path}")
+            onnx_parity = check_onnx_parity(eager, onnx_path, states)
+            if onnx_parity is None:
+                print("  ONNX parity skipped (onnxruntime not installed)")
+            else:
+                print(f"  ONNX parity: policy {onnx_parity['policy_max_abs_diff']:.2e}, "
+                      f"value {onnx_parity['value_max_abs_diff']:.2e}")
+
+    if benchmark_iters > 0:
+        eager_ms = benchmark(eager, states, benchmark_iters)
+        script_ms = benchmark(scripted, states, benchmark_iters)
+        print(f"  {'batch':>6} {'eager ms':>10} {'script ms':>10} {'speedup':>8}")
+        for batch_size in BENCHMARK_BATCH_SIZES:
+            print(f"  {batch_size:>6} {eager_ms[batch_size]:>10.3f} {script_ms[batch_size]:>10.3f} "
+                  f"{eager_ms[batch_size] / script_ms[batch_size]:>7.2f}x")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export NineMensMorrisNet checkpoints for CPU inference")
+    parser.add_argument('checkpoints', nargs='+', help='Checkpoint files (.pt)')
+    parser.add_argument('--no-onnx', action='store_true', help='Skip the ONNX graph')
+    parser.add_argument('--benchmark-iters', type=int, default=100,
+                        help='Forward passes per batch size in the latency benchmark (0 to skip)')
+    args = parser.parse_args()
+
+    torch.set_grad_enabled(False)
+    ok = True
+    for path in args.checkpoints:
+        ok &= export(path, onnx=not args.no_onnx, benchmark_iters=args.benchmark_iters)
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
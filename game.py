@@ -1,5 +1,16 @@
 import numpy as np
 
+from types import MappingProxyType
+
+import metrics
+
+def _index_mills(mills, num_positions):
+    """Map each position to the indices of the mills that contain it"""
+    return tuple(
+        tuple(i for i, mill in enumerate(mills) if pos in mill)
+        for pos in range(num_positions)
+    )
+
 class NineMensMorrisEnv:
     """Environment untuk Nine Men's Morris"""
     
@@ -12,6 +23,9 @@ class NineMensMorrisEnv:
         [0,9,21], [3,10,18], [6,11,15], [1,4,7], [16,19,22], [8,12,17], [5,13,20], [2,14,23]
     ]
     
+    # Index mills yang melewati setiap posisi
+    POSITION_MILLS = _index_mills(MILLS, BOARD_POSITIONS)
+    
     # Adjacency list untuk pergerakan
     ADJACENCY = {
         0:[1,9], 1:[0,2,4], 2:[1,14], 3:[4,10], 4:[1,3,5,7], 5:[4,13],
@@ -27,7 +41,22 @@ class NineMensMorrisEnv:
     ACTION_CAPTURE_START = 600
     ACTION_SPACE_SIZE = 624
     
-    def __init__(self):
+    # Observation channel yang menandai phase pemain
+    PHASE_CHANNELS = {'placement': 2, 'movement': 3, 'flying': 4}
+    
+    # Mode history: 'text' (move_history strings), 'indices' (array action index) atau None
+    HISTORY_MODES = ('text', 'indices', None)
+    HISTORY_CAPACITY = 256
+    
+    def __init__(self, lazy_state=False, history='text'):
+        # With lazy_state, step() returns None instead of the observation;
+        # call get_state() (optionally with out=) when it is needed
+        self.lazy_state = lazy_state
+        # Headless modes (history='indices' or None) skip the move_history strings
+        # and return shared read-only info mappings from step()
+        if history not in self.HISTORY_MODES:
+            raise ValueError(f"Unknown history mode: {history}")
+        self.history = history
         self.reset()
     
     def reset(self):
@@ -44,35 +73,158 @@ class NineMensMorrisEnv:
         self.move_count = 0
         self.last_mill_formed = False
         self.last_capture = False
-        self.move_history = []
+        self.pending_capture = False
+        self._reset_history()
+        self._undo_stack = []
+        self._reset_mill_state()
         return self.get_state()
     
-    def get_state(self):
+    def _reset_history(self):
+        self.move_history = []
+        self.history_length = 0
+        if self.history == 'indices':
+            self.action_history = np.empty(self.HISTORY_CAPACITY, dtype=np.int16)
+        else:
+            self.action_history = None
+    
+    def _record_move(self, player, action):
+        """Append the move to the history in the configured format"""
+        if self.history == 'text':
+            action_type, from_pos, to_pos = action
+            if action_type == 'capture':
+                move_description = f"Player {player} captured piece at position {from_pos}"
+            elif action_type == 'place':
+                move_description = f"Player {player} placed piece at position {to_pos}"
+            else:
+                move_description = f"Player {player} moved piece from {from_pos} to {to_pos}"
+            if self.last_mill_formed:
+                move_description += " (Mill formed!)"
+            self.move_history.append(move_description)
+        elif self.history == 'indices':
+            if self.history_length == len(self.action_history):
+                self.action_history = np.resize(self.action_history, 2 * len(self.action_history))
+            self.action_history[self.history_length] = self.action_to_index(action)
+        else:
+            return
+        self.history_length += 1
+    
+    def get_action_history(self):
+        """Action indices played so far (history='indices' only)"""
+        if self.action_history is None:
+            return None
+        return self.action_history[:self.history_length]
+    
+    def _capture_info(self):
+        if self.history != 'text':
+            return _INFO_NEEDS_CAPTURE
+        return {'needs_capture': True, 'formed_mill': True}
+    
+    def _step_info(self):
+        if self.history != 'text':
+            return _STEP_INFOS[self.last_mill_formed, self.last_capture]
+        return {
+            'formed_mill': self.last_mill_formed,
+            'capture': self.last_capture
+        }
+    
+    def _reset_mill_state(self):
+        """Rebuild per-player mill tracking and the board hash from the current board"""
+        # Zobrist hash of the pieces on the board, kept up to date by _add_piece/_remove_piece
+        self.board_hash = 0
+        # Number of the player's pieces in each mill
+        self.mill_fill = {1: [0] * len(self.MILLS), -1: [0] * len(self.MILLS)}
+        # Number of the player's complete mills through each position
+        self.mill_membership = {1: [0] * self.BOARD_POSITIONS, -1: [0] * self.BOARD_POSITIONS}
+        # Number of the player's pieces that sit in at least one complete mill
+        self.pieces_in_mills = {1: 0, -1: 0}
+        self._legal_mask = None
+        board = self.board
+        for pos in range(self.BOARD_POSITIONS):
+            player = int(board[pos])
+            if player != 0:
+                board[pos] = 0
+                self._add_piece(pos, player)
+    
+    def _add_piece(self, pos, player):
+        """Put a piece on the board and update the player's mill tracking"""
+        self.board[pos] = player
+        self.board_hash ^= ZOBRIST_PIECES[player][pos]
+        fill = self.mill_fill[player]
+        membership = self.mill_membership[player]
+        for mill_idx in self.POSITION_MILLS[pos]:
+            fill[mill_idx] += 1
+            if fill[mill_idx] == 3:
+                for p in self.MILLS[mill_idx]:
+                    membership[p] += 1
+                    if membership[p] == 1:
+                        self.pieces_in_mills[player] += 1
+    
+    def _remove_piece(self, pos, player):
+        """Take a piece off the board and update the player's mill tracking"""
+        self.board[pos] = 0
+        self.board_hash ^= ZOBRIST_PIECES[player][pos]
+        fill = self.mill_fill[player]
+        membership = self.mill_membership[player]
+        for mill_idx in self.POSITION_MILLS[pos]:
+            if fill[mill_idx] == 3:
+                for p in self.MILLS[mill_idx]:
+                    membership[p] -= 1
+                    if membership[p] == 0:
+                        self.pieces_in_mills[player] -= 1
+            fill[mill_idx] -= 1
+    
+    def get_state(self, out=None):
+        """Observation of the current position
+        
+        When `out` is given (a float32 (7, 24) array, e.g. one row of a batch
+        tensor) the observation is written into it instead of a new array.
+        """
         # 7 channels: current pieces, opponent pieces, placement phase, movement phase, flying phase, pieces in hand, valid moves hint
-        state = np.zeros((7, self.BOARD_POSITIONS), dtype=np.float32)
+        if out is None:
+            out = np.empty((7, self.BOARD_POSITIONS), dtype=np.float32)
+        board = self.board
+        player = self.current_player
         
         # Channel 0: Current player pieces
-        state[0] = (self.board == self.current_player).astype(np.float32)
+        out[0] = board == player
         
         # Channel 1: Opponent pieces
-        state[1] = (self.board == -self.current_player).astype(np.float32)
+        out[1] = board == -player
         
         # Channels 2-4 Phase encoding 
-        phase = self.player_phase[self.current_player]
-        if phase == 'placement':
-            state[2] = np.ones(self.BOARD_POSITIONS)
-        elif phase == 'movement':
-            state[3] = np.ones(self.BOARD_POSITIONS)
-        else:  # flying
-            state[4] = np.ones(self.BOARD_POSITIONS)
+        out[2:5] = 0.0
+        out[self.PHASE_CHANNELS[self.player_phase[player]]] = 1.0
         
         # Channel 5: Pieces in hand (normalized)
-        state[5] = np.ones(self.BOARD_POSITIONS) * (self.pieces_in_hand[self.current_player] / self.PIECES_PER_PLAYER)
+        out[5] = self.pieces_in_hand[player] / self.PIECES_PER_PLAYER
         
         # Channel 6: Empty positions
-        state[6] = (self.board == 0).astype(np.float32)
+        out[6] = board == 0
+        
+        return out
+    
+    def _observation(self):
+        """Observation returned by step(), skipped in lazy_state mode"""
+        if self.lazy_state:
+            return None
+        return self.get_state()
+    
+    def zobrist_hash(self, board_hash=None):
+        """64-bit Zobrist hash of the position
         
-        return state
+        Covers board occupancy, side to move, pieces in hand, per-player phase
+        and a pending capture. The board part is maintained incrementally;
+        pass `board_hash` to combine the rest with another board hash (e.g. of
+        a symmetric board).
+        """
+        key = self.board_hash if board_hash is None else board_hash
+        key ^= ZOBRIST_HAND[1][self.pieces_in_hand[1]] ^ ZOBRIST_HAND[-1][self.pieces_in_hand[-1]]
+        key ^= ZOBRIST_PHASE[1][self.player_phase[1]] ^ ZOBRIST_PHASE[-1][self.player_phase[-1]]
+        if self.current_player == -1:
+            key ^= ZOBRIST_SIDE
+        if self.pending_capture:
+            key ^= ZOBRIST_PENDING_CAPTURE
+        return key
     
     def get_valid_actions(self):
         """Returns list of valid actions with proper type annotation"""
@@ -105,25 +257,68 @@ class NineMensMorrisEnv:
     
     def get_valid_capture_actions(self):
         """Get valid capture actions when a mill is formed"""
-        valid_captures = []
         opponent = -self.current_player
-        for pos in range(self.BOARD_POSITIONS):
-            if self.board[pos] == opponent:
-                if not self._is_in_mill(pos, opponent) or self._all_in_mills(opponent):
-                    valid_captures.append(('capture', pos, None))
-        return valid_captures
+        pieces = np.flatnonzero(self.board == opponent)
+        if self._all_in_mills(opponent):
+            return [('capture', int(pos), None) for pos in pieces]
+        membership = self.mill_membership[opponent]
+        return [('capture', int(pos), None) for pos in pieces if membership[pos] == 0]
     
-    def get_valid_action_mask(self):
-        """PPO CRITICAL: Return mask for valid actions"""
-        mask = np.zeros(self.ACTION_SPACE_SIZE, dtype=np.float32)
-        valid_actions = self.get_valid_actions()
-        for action in valid_actions:
-            idx = self.action_to_index(action)
-            mask[idx] = 1.0
+    def get_valid_capture_mask(self):
+        """Boolean mask over the 24 positions of opponent pieces that may be captured"""
+        opponent = -self.current_player
+        mask = self.board == opponent
+        if not self._all_in_mills(opponent):
+            mask &= np.asarray(self.mill_membership[opponent]) == 0
         return mask
     
+    @metrics.timed('env.legal_mask')
+    def _update_legal_actions(self):
+        """Rebuild the cached legal mask and index array for the current position"""
+        mask = np.zeros(self.ACTION_SPACE_SIZE, dtype=np.float32)
+        player = self.current_player
+        phase = self.player_phase[player]
+        
+        if self.pending_capture:
+            mask[self.ACTION_CAPTURE_START:] = self.get_valid_capture_mask()
+        elif phase == 'placement':
+            if self.pieces_in_hand[player] > 0:
+                mask[:self.ACTION_MOVEMENT_START] = self.board == 0
+        elif phase == 'movement':
+            own = self.board == player
+            empty = self.board == 0
+            mask[ADJACENT_MOVE_INDICES] = own[ADJACENT_MOVE_FROM] & empty[ADJACENT_MOVE_TO]
+        else:  # flying
+            own = self.board == player
+            empty = self.board == 0
+            mask[self.ACTION_MOVEMENT_START:self.ACTION_CAPTURE_START] = (own[:, None] & empty).ravel()
+        
+        mask.flags.writeable = False
+        self._legal_mask = mask
+        self._legal_indices = np.flatnonzero(mask)
+    
+    def get_valid_action_mask(self):
+        """PPO CRITICAL: Return mask for valid actions
+        
+        The mask is cached until the next move and must not be modified. While a
+        capture is pending it covers the capture actions instead of moves.
+        """
+        if self._legal_mask is None:
+            self._update_legal_actions()
+        return self._legal_mask
+    
+    def get_valid_action_indices(self):
+        """Sorted array of the legal action indices (same cache as get_valid_action_mask)"""
+        if self._legal_mask is None:
+            self._update_legal_actions()
+        return self._legal_indices
+    
     def action_to_index(self, action):
         """Convert action tuple to index"""
+        index = ACTION_TO_INDEX.get(action)
+        if index is not None:
+            return index
+        
         action_type, from_pos, to_pos = action
         
         if action_type == 'place':
@@ -137,20 +332,14 @@ class NineMensMorrisEnv:
     
     def index_to_action(self, index):
         """Convert index back to action tuple"""
-        if index < self.ACTION_MOVEMENT_START:
-            pos = index - self.ACTION_PLACEMENT_START
-            return ('place', None, pos)
-        elif index < self.ACTION_CAPTURE_START:
-            offset = index - self.ACTION_MOVEMENT_START
-            from_pos = offset // self.BOARD_POSITIONS
-            to_pos = offset % self.BOARD_POSITIONS
-            return ('move', from_pos, to_pos)
-        else:
-            pos = index - self.ACTION_CAPTURE_START
-            return ('capture', pos, None)
+        return INDEX_TO_ACTION[index]
     
+    @metrics.timed('env.step')
     def step(self, action):
-        """Execute action and return (state, reward, done, info)"""
+        """Execute action and return (state, reward, done, info)
+        
+        state is None when the environment was created with lazy_state=True.
+        """
         action_type, from_pos, to_pos = action
         
         # SIMPAN ACTING PLAYER SEBELUM ACTION
@@ -159,65 +348,61 @@ class NineMensMorrisEnv:
         # Reset event flags
         self.last_mill_formed = False
         self.last_capture = False
+        self.pending_capture = False
+        self._legal_mask = None
         
         reward = -0.0035  
         
-        # Track move for history
-        move_description = ""
-        
         if action_type == 'capture':
             # Execute capture
-            self.board[from_pos] = 0
+            self._remove_piece(from_pos, -self.current_player)
             self.pieces_on_board[-self.current_player] -= 1
             self.current_player = -self.current_player
             self.move_count += 1
             self.last_capture = True
             reward += 0.05
-            move_description = f"Player {acting_player} captured piece at position {from_pos}"
             
         elif action_type == 'place':
             # Place piece
-            self.board[to_pos] = self.current_player
+            self._add_piece(to_pos, self.current_player)
             self.pieces_in_hand[self.current_player] -= 1
             self.pieces_on_board[self.current_player] += 1
             self.move_count += 1
-            move_description = f"Player {acting_player} placed piece at position {to_pos}"
             
             # Check if mill formed
             if self._is_in_mill(to_pos, self.current_player):
                 self.last_mill_formed = True
                 reward += 0.1
-                move_description += " (Mill formed!)"
-                captures = self.get_valid_capture_actions()
-                if len(captures) > 0:
-                    self.move_history.append(move_description)
-                    return self.get_state(), reward, False, {'needs_capture': True, 'formed_mill': True}
+                # A capture exists whenever the opponent has pieces on the board
+                if self.pieces_on_board[-self.current_player] > 0:
+                    self.pending_capture = True
+                    self._record_move(acting_player, action)
+                    return self._observation(), reward, False, self._capture_info()
             
             # Switch player if no mill
             self.current_player = -self.current_player
                 
         elif action_type == 'move':
             # Move piece
-            self.board[from_pos] = 0
-            self.board[to_pos] = self.current_player
+            self._remove_piece(from_pos, self.current_player)
+            self._add_piece(to_pos, self.current_player)
             self.move_count += 1
-            move_description = f"Player {acting_player} moved piece from {from_pos} to {to_pos}"
             
             # Check if mill formed
             if self._is_in_mill(to_pos, self.current_player):
                 self.last_mill_formed = True
                 reward += 0.1
-                move_description += " (Mill formed!)"
-                captures = self.get_valid_capture_actions()
-                if len(captures) > 0:
-                    self.move_history.append(move_description)
-                    return self.get_state(), reward, False, {'needs_capture': True, 'formed_mill': True}
+                # A capture exists whenever the opponent has pieces on the board
+                if self.pieces_on_board[-self.current_player] > 0:
+                    self.pending_capture = True
+                    self._record_move(acting_player, action)
+                    return self._observation(), reward, False, self._capture_info()
             
             # Switch player
             self.current_player = -self.current_player
         
         # Add move to history
-        self.move_history.append(move_description)
+        self._record_move(acting_player, action)
         
         # Check placement -> movement phase transition
         if self.global_phase == 'placement':
@@ -274,29 +459,112 @@ class NineMensMorrisEnv:
             reward = 0.0
             self.winner = 0
         
-        info = {
-            'formed_mill': self.last_mill_formed,
-            'capture': self.last_capture
-        }
+        return self._observation(), reward, done, self._step_info()
+    
+    def adjudicate(self, tablebase):
+        """Winner under perfect play from an endgame tablebase (1, -1, or 0 for a draw)
         
-        return self.get_state(), reward, done, info
+        Returns None while the position is outside the tablebase (placement
+        phase or piece counts that were not solved).
+        """
+        return tablebase.adjudicate(self)
     
     def _is_in_mill(self, pos, player):
-        for mill in self.MILLS:
-            if pos in mill:
-                if all(self.board[p] == player for p in mill):
-                    return True
-        return False
+        return self.mill_membership[player][pos] > 0
     
     def _all_in_mills(self, player):
-        for pos in range(self.BOARD_POSITIONS):
-            if self.board[pos] == player:
-                if not self._is_in_mill(pos, player):
-                    return False
-        return True
+        return self.pieces_in_mills[player] == self.pieces_on_board[player]
+    
+    def apply(self, action):
+        """step() that can be reverted with undo()
+        
+        Pushes a compact undo record (acting player, counts, phases, flags)
+        instead of copying the environment. Returns the same tuple as step().
+        """
+        self._undo_stack.append((
+            action,
+            self.current_player,
+            self.pieces_in_hand[1], self.pieces_in_hand[-1],
+            self.pieces_on_board[1], self.pieces_on_board[-1],
+            self.global_phase,
+            self.player_phase[1], self.player_phase[-1],
+            self.winner,
+            self.move_count,
+            self.last_mill_formed,
+            self.last_capture,
+            self.pending_capture,
+            self.history_length
+        ))
+        return self.step(action)
+    
+    def undo(self):
+        """Revert the most recent apply()"""
+        (action, player, hand_1, hand_2, on_board_1, on_board_2, global_phase,
+         phase_1, phase_2, winner, move_count, last_mill_formed, last_capture,
+         pending_capture, history_length) = self._undo_stack.pop()
+        action_type, from_pos, to_pos = action
+        
+        # Board delta
+        if action_type == 'capture':
+            self._add_piece(from_pos, -player)
+        elif action_type == 'place':
+            self._remove_piece(to_pos, player)
+        else:
+            self._remove_piece(to_pos, player)
+            self._add_piece(from_pos, player)
+        
+        self.current_player = player
+        self.pieces_in_hand[1] = hand_1
+        self.pieces_in_hand[-1] = hand_2
+        self.pieces_on_board[1] = on_board_1
+        self.pieces_on_board[-1] = on_board_2
+        self.global_phase = global_phase
+        self.player_phase[1] = phase_1
+        self.player_phase[-1] = phase_2
+        self.winner = winner
+        self.move_count = move_count
+        self.last_mill_formed = last_mill_formed
+        self.last_capture = last_capture
+        self.pending_capture = pending_capture
+        self._legal_mask = None
+        del self.move_history[history_length:]
+        self.history_length = history_length
+    
+    def _clone_history(self, new_env, copy_history):
+        if copy_history:
+            new_env.move_history = self.move_history.copy()
+            new_env.history_length = self.history_length
+            new_env.action_history = None if self.action_history is None else self.action_history.copy()
+        else:
+            new_env._reset_history()
+    
+    def set_position(self, board, current_player, pieces_in_hand, player_phase, pending_capture=False):
+        """Set up an arbitrary position (e.g. a decoded packed record)
+        
+        pieces_in_hand and player_phase map player (1/-1) to the count and
+        phase name. Move count, history and undo stack start empty.
+        """
+        self.reset()
+        self.board = np.array(board, dtype=np.int8)
+        self.current_player = int(current_player)
+        self.pieces_in_hand = {1: int(pieces_in_hand[1]), -1: int(pieces_in_hand[-1])}
+        self.pieces_on_board = {p: int(np.count_nonzero(self.board == p)) for p in (1, -1)}
+        self.player_phase = {1: player_phase[1], -1: player_phase[-1]}
+        # Both players leave placement together (flying is per player)
+        placing = self.player_phase[1] == 'placement' and self.player_phase[-1] == 'placement'
+        self.global_phase = 'placement' if placing else 'movement'
+        self.pending_capture = bool(pending_capture)
+        self._reset_mill_state()
     
-    def clone(self):
-        new_env = NineMensMorrisEnv()
+    def clone(self, copy_history=False):
+        """Copy of the current position
+        
+        The undo stack is not carried over, and the move history only when
+        copy_history is set.
+        """
+        new_env = object.__new__(type(self))
+        new_env.lazy_state = self.lazy_state
+        new_env.history = self.history
         new_env.board = self.board.copy()
         new_env.global_phase = self.global_phase
         new_env.player_phase = self.player_phase.copy()
@@ -305,5 +573,104 @@ class NineMensMorrisEnv:
         new_env.pieces_on_board = self.pieces_on_board.copy()
         new_env.winner = self.winner
         new_env.move_count = self.move_count
-        new_env.move_history = self.move_history.copy()
+        new_env.last_mill_formed = self.last_mill_formed
+        new_env.last_capture = self.last_capture
+        new_env.pending_capture = self.pending_capture
+        self._clone_history(new_env, copy_history)
+        new_env._undo_stack = []
+        new_env.mill_fill = {p: fill.copy() for p, fill in self.mill_fill.items()}
+        new_env.mill_membership = {p: members.copy() for p, members in self.mill_membership.items()}
+        new_env.pieces_in_mills = self.pieces_in_mills.copy()
+        new_env.board_hash = self.board_hash
+        new_env._legal_mask = None
         return new_env
+
+
+def _zobrist_keys(seed=0x4E4D4D):
+    """Fixed pseudo-random 64-bit keys, identical across processes and runs"""
+    rng = np.random.default_rng(seed)
+    
+    def draw(count):
+        return rng.integers(1, 2**64, size=count, dtype=np.uint64, endpoint=False).tolist()
+    
+    positions = NineMensMorrisEnv.BOARD_POSITIONS
+    hand_counts = NineMensMorrisEnv.PIECES_PER_PLAYER + 1
+    phases = tuple(NineMensMorrisEnv.PHASE_CHANNELS)
+    pieces = {1: draw(positions), -1: draw(positions)}
+    hand = {1: draw(hand_counts), -1: draw(hand_counts)}
+    phase = {p: dict(zip(phases, draw(len(phases)))) for p in (1, -1)}
+    side, pending_capture = draw(2)
+    return pieces, hand, phase, side, pending_capture
+
+
+# Zobrist keys: per player and position, per player and pieces in hand, per player and
+# phase, side to move (XORed when player -1 is to move) and pending capture
+ZOBRIST_PIECES, ZOBRIST_HAND, ZOBRIST_PHASE, ZOBRIST_SIDE, ZOBRIST_PENDING_CAPTURE = _zobrist_keys()
+
+
+# Shared step() info mappings for the headless history modes
+_INFO_NEEDS_CAPTURE = MappingProxyType({'needs_capture': True, 'formed_mill': True})
+_STEP_INFOS = {
+    (formed_mill, capture): MappingProxyType({'formed_mill': formed_mill, 'capture': capture})
+    for formed_mill in (False, True)
+    for capture in (False, True)
+}
+
+
+# Action type codes used by the vectorized index tables
+ACTION_TYPES = ('place', 'move', 'capture')
+ACTION_TYPE_CODES = {name: code for code, name in enumerate(ACTION_TYPES)}
+
+
+def _build_action_tables():
+    env = NineMensMorrisEnv
+    actions = []
+    for pos in range(env.BOARD_POSITIONS):
+        actions.append(('place', None, pos))
+    for from_pos in range(env.BOARD_POSITIONS):
+        for to_pos in range(env.BOARD_POSITIONS):
+            actions.append(('move', from_pos, to_pos))
+    for pos in range(env.BOARD_POSITIONS):
+        actions.append(('capture', pos, None))
+    return tuple(actions)
+
+
+# Precomputed 624-entry lookup tables between action tuples and indices
+INDEX_TO_ACTION = _build_action_tables()
+ACTION_TO_INDEX = {action: index for index, action in enumerate(INDEX_TO_ACTION)}
+
+# Column form of INDEX_TO_ACTION; None positions are stored as -1
+ACTION_TYPE_TABLE = np.array([ACTION_TYPE_CODES[a[0]] for a in INDEX_TO_ACTION], dtype=np.int8)
+ACTION_FROM_TABLE = np.array([-1 if a[1] is None else a[1] for a in INDEX_TO_ACTION], dtype=np.int8)
+ACTION_TO_TABLE = np.array([-1 if a[2] is None else a[2] for a in INDEX_TO_ACTION], dtype=np.int8)
+
+# Movement actions between adjacent positions
+ADJACENT_MOVE_FROM = np.array(
+    [f for f in range(NineMensMorrisEnv.BOARD_POSITIONS) for t in NineMensMorrisEnv.ADJACENCY[f]], dtype=np.intp)
+ADJACENT_MOVE_TO = np.array(
+    [t for f in range(NineMensMorrisEnv.BOARD_POSITIONS) for t in NineMensMorrisEnv.ADJACENCY[f]], dtype=np.intp)
+ADJACENT_MOVE_INDICES = (
+    NineMensMorrisEnv.ACTION_MOVEMENT_START + ADJACENT_MOVE_FROM * NineMensMorrisEnv.BOARD_POSITIONS + ADJACENT_MOVE_TO
+)
+
+
+def indices_to_actions(indices):
+    """Vectorized index_to_action: returns (type codes, from positions, to positions) arrays"""
+    indices = np.asarray(indices, dtype=np.intp)
+    return ACTION_TYPE_TABLE[indices], ACTION_FROM_TABLE[indices], ACTION_TO_TABLE[indices]
+
+
+def actions_to_indices(type_codes, from_pos, to_pos):
+    """Vectorized action_to_index over arrays of type codes and positions (-1 for None)"""
+    type_codes = np.asarray(type_codes)
+    from_pos = np.asarray(from_pos, dtype=np.intp)
+    to_pos = np.asarray(to_pos, dtype=np.intp)
+    return np.where(
+        type_codes == ACTION_TYPE_CODES['place'],
+        NineMensMorrisEnv.ACTION_PLACEMENT_START + to_pos,
+        np.where(
+            type_codes == ACTION_TYPE_CODES['move'],
+            NineMensMorrisEnv.ACTION_MOVEMENT_START + from_pos * NineMensMorrisEnv.BOARD_POSITIONS + to_pos,
+            NineMensMorrisEnv.ACTION_CAPTURE_START + from_pos
+        )
+    )
@@ -0,0 +1,291 @@
+"""
+Batched Inference Module for Nine Men's Morris
+Micro-batching broker that serves get_ai_move/get_ai_capture requests from many threads with shared forward passes
+"""
+
+import queue
+import threading
+import time
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+
+from game import INDEX_TO_ACTION
+from metrics import Histogram
+from model import (NineMensMorrisNet, EvaluationCache, policy_inputs, combine_policy_logits,
+                   sample_move, sample_capture)
+
+# Bucket upper bounds
+LATENCY_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 1000)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+
+
+class _Request:
+    __slots__ = ('model', 'device', 'states', 'mask', 'symmetric_ensemble', 'future',
+                 'masked_logits', 'value')
+
+    def __init__(self, model, device, states, mask=None, symmetric_ensemble=False):
+        self.model = model
+        self.device = device
+        self.states = states
+        self.mask = mask
+        self.symmetric_ensemble = symmetric_ensemble
+        self.future = Future()
+        # Set by the worker for masked requests, for the evaluation cache
+        self.masked_logits = None
+        self.value = None
+
+
+def legal_action_mask(env, capture: bool) -> np.ndarray:
+    """(624,) bool mask of the legal moves, or of the legal captures"""
+    if not capture:
+        return env.get_valid_action_mask() != 0
+    mask = np.zeros(env.ACTION_SPACE_SIZE, dtype=bool)
+    mask[env.ACTION_CAPTURE_START + np.flatnonzero(env.get_valid_capture_mask())] = True
+    return mask
+
+
+def sample_masked_rows(masked_logits: torch.Tensor, masks: torch.Tensor) -> torch.Tensor:
+    """
+    One action index per row of (R, 624) logits with illegal actions at
+    -inf, sampled among the row's legal actions (uniformly when the logits
+    are not usable); -1 for rows without any legal action.
+    """
+    has_legal = masks.any(dim=1)
+    probs = F.softmax(masked_logits, dim=1)
+    unstable = ~torch.isfinite(probs).all(dim=1) | (probs.sum(dim=1) == 0)
+    probs = torch.where(unstable[:, None], masks.to(probs.dtype), probs)
+    probs[~has_legal] = 1.0
+    chosen = torch.multinomial(probs, 1).squeeze(1)
+    return torch.where(has_legal, chosen, torch.full_like(chosen, -1))
+
+
+class InferenceBroker:
+    """
+    Collects position requests from many threads or games and evaluates
+    them in shared forward passes.
+
+    The first queued request opens a batch; the worker then keeps taking
+    requests until `max_batch_size` rows are gathered or `max_wait_ms`
+    has passed. Requests for different models (or devices) in the same
+    batch get one forward pass per model. get_ai_move/get_ai_capture send
+    the legal-action mask with the position; after the forward pass the
+    worker masks and samples all of the batch's rows at once and resolves
+    each request with its action, like model.get_ai_move/get_ai_capture.
+    With cache=, positions already in the EvaluationCache are sampled from
+    the cached masked logits without a forward pass, and new evaluations
+    are stored under the same keys model.get_ai_move uses.
+
+    Usage:
+        broker = InferenceBroker(max_batch_size=64, max_wait_ms=2.0)
+        action = broker.get_ai_move(model, env, device)
+        broker.close()
+    """
+
+    def __init__(self, max_batch_size: int = 64, max_wait_ms: float = 2.0):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.latency_ms = Histogram(LATENCY_BUCKETS_MS)
+        self.batch_size = Histogram(BATCH_SIZE_BUCKETS)
+        self._queue = queue.Queue()
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name='InferenceBroker', daemon=True)
+        self._worker.start()
+
+    # --- Drop-in replacements for model.get_ai_move / get_ai_capture ---
+
+    def policy_logits_for(self, model: NineMensMorrisNet, env, device: torch.device,
+                          symmetric_ensemble: bool = False) -> torch.Tensor:
+        """(1, 624) policy logits for the current position, evaluated in a shared batch"""
+        started = time.perf_counter()
+        logits = self.submit(model, device, policy_inputs(env, symmetric_ensemble)).result()
+        self.latency_ms.observe((time.perf_counter() - started) * 1000.0)
+        return combine_policy_logits(logits, symmetric_ensemble)
+
+    def action_for(self, model: NineMensMorrisNet, env, device: torch.device,
+                   symmetric_ensemble: bool = False, capture: bool = False,
+                   cache: Optional[EvaluationCache] = None) -> Optional[Tuple]:
+        """Sampled legal move (or capture) for the current position; None when there is none"""
+        key = None
+        if cache is not None:
+            key = cache.key(model, env, 'capture' if capture else 'move', symmetric_ensemble)
+            entry = cache.get(key)
+            if entry is not None:
+                return (sample_capture if capture else sample_move)(env, entry[0])
+
+        started = time.perf_counter()
+        request = self._enqueue(model, device, policy_inputs(env, symmetric_ensemble),
+                                legal_action_mask(env, capture), symmetric_ensemble)
+        action = request.future.result()
+        self.latency_ms.observe((time.perf_counter() - started) * 1000.0)
+        if key is not None:
+            cache.put(key, request.masked_logits, request.value)
+        return action
+
+    def get_ai_move(self, model: NineMensMorrisNet, env, device: torch.device,
+                    symmetric_ensemble: bool = False, tablebase=None,
+                    cache: Optional[EvaluationCache] = None, sparse: bool = False) -> Tuple:
+        """
+        Same contract as model.get_ai_move. `sparse` is accepted for the same
+        signature: the batch always runs the dense head and masks it, which
+        samples from the same distribution as the legal-only head.
+        """
+        if tablebase is not None:
+            action = tablebase.best_action(env)
+            if action is not None:
+                return action
+        action = self.action_for(model, env, device, symmetric_ensemble, cache=cache)
+        # model.sample_move's placeholder when nothing is legal
+        return action if action is not None else ('move', 0, 0)
+
+    def get_ai_capture(self, model: NineMensMorrisNet, env, device: torch.device,
+                       symmetric_ensemble: bool = False, tablebase=None,
+                       cache: Optional[EvaluationCache] = None, sparse: bool = False) -> Tuple:
+        """Same contract as model.get_ai_capture (see get_ai_move for `sparse`)"""
+        if tablebase is not None:
+            action = tablebase.best_action(env)
+            if action is not None:
+                return action
+        return self.action_for(model, env, device, symmetric_ensemble, capture=True, cache=cache)
+
+    # --- Queue ---
+
+    def submit(self, model: NineMensMorrisNet, device: torch.device, states: np.ndarray,
+               mask: Optional[np.ndarray] = None, symmetric_ensemble: bool = False) -> Future:
+        """
+        Queue (k, 7, 24) observations for one forward pass.
+
+        Returns:
+            Future resolving to the (k, 624) policy logits of those rows, or,
+            with a (624,) legal mask, to the action sampled from their
+            combined logits (None when the mask is empty)
+        """
+        return self._enqueue(model, device, states, mask, symmetric_ensemble).future
+
+    def _enqueue(self, model, device, states, mask=None, symmetric_ensemble=False) -> _Request:
+        if self._closed:
+            raise RuntimeError("InferenceBroker is closed")
+        if mask is not None:
+            mask = np.asarray(mask, dtype=bool)
+        request = _Request(model, device, np.ascontiguousarray(states, dtype=np.float32),
+                           mask, symmetric_ensemble)
+        self._queue.put(request)
+        return request
+
+    def _collect(self, first: _Request) -> List[_Request]:
+        batch = [first]
+        rows = len(first.states)
+        deadline = time.perf_counter() + self.max_wait
+        while rows < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if request is None:
+                self._queue.put(None)
+                break
+            batch.append(request)
+            rows += len(request.states)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = self._collect(first)
+            groups: Dict[Tuple[int, str], List[_Request]] = {}
+            for request in batch:
+                groups.setdefault((id(request.model), str(request.device)), []).append(request)
+            for requests in groups.values():
+                self._evaluate(requests)
+
+    def _evaluate(self, requests: List[_Request]):
+        model, device = requests[0].model, requests[0].device
+        try:
+            states = np.concatenate([r.states for r in requests]) if len(requests) > 1 else requests[0].states
+            self.batch_size.observe(len(states))
+            with torch.no_grad():
+                policy_logits, values = model(torch.from_numpy(states).to(device))
+            start = 0
+            masked = []
+            for request in requests:
+                end = start + len(request.states)
+                if request.mask is None:
+                    request.future.set_result(policy_logits[start:end])
+                else:
+                    request.value = values[start:end].mean(dim=0, keepdim=True)
+                    masked.append((request, combine_policy_logits(policy_logits[start:end],
+                                                                  request.symmetric_ensemble)))
+                start = end
+            if masked:
+                masks = torch.from_numpy(np.stack([request.mask for request, _ in masked])).to(device)
+                masked_logits = torch.cat([logits for _, logits in masked]).masked_fill(~masks, -float('inf'))
+                with torch.no_grad():
+                    chosen = sample_masked_rows(masked_logits, masks)
+                for row, ((request, _), index) in enumerate(zip(masked, chosen.tolist())):
+                    request.masked_logits = masked_logits[row].clone()
+                    request.future.set_result(INDEX_TO_ACTION[index] if index >= 0 else None)
+        except Exception as e:
+            for request in requests:
+                if not request.future.done():
+                    request.future.set_exception(e)
+
+    # --- Lifecycle and reporting ---
+
+    def stats(self) -> Dict:
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000.0,
+            'latency_ms': self.latency_ms.snapshot(),
+            'batch_size': self.batch_size.snapshot()
+        }
+
+    def close(self):
+        """Finish the queued requests and stop the worker"""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._worker.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_default_broker: Optional[InferenceBroker] = None
+_default_lock = threading.Lock()
+
+
+def get_broker(max_batch_size: int = 64, max_wait_ms: float = 2.0) -> InferenceBroker:
+    """Process-wide broker, created on first use"""
+    global _default_broker
+    with _default_lock:
+        if _default_broker is None:
+            _default_broker = InferenceBroker(max_batch_size, max_wait_ms)
+        return _default_broker
+
+
+def get_ai_move(model: NineMensMorrisNet, env, device: torch.device,
+                symmetric_ensemble: bool = False, tablebase=None,
+                cache: Optional[EvaluationCache] = None, sparse: bool = False) -> Tuple:
+    """model.get_ai_move served by the process-wide broker"""
+    return get_broker().get_ai_move(model, env, device, symmetric_ensemble, tablebase, cache, sparse)
+
+
+def get_ai_capture(model: NineMensMorrisNet, env, device: torch.device,
+                   symmetric_ensemble: bool = False, tablebase=None,
+                   cache: Optional[EvaluationCache] = None, sparse: bool = False) -> Tuple:
+    """model.get_ai_capture served by the process-wide broker"""
+    return get_broker().get_ai_capture(model, env, device, symmetric_ensemble, tablebase, cache, sparse)
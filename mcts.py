@@ -0,0 +1,304 @@
+"""
+Monte Carlo Tree Search Module for Nine Men's Morris
+PUCT search with policy priors, value-head leaf evaluation and batched leaves
+
+Each tree node is one decision, so the capture after a mill is its own node
+(same player to move, capture actions as children). Leaves are collected
+with virtual loss and evaluated together in one forward pass.
+"""
+
+import math
+import time
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+from typing import Dict, List, Optional, Tuple
+
+from model import NineMensMorrisNet
+
+
+class Node:
+    """Search node; W accumulates values from the point of view of the player who moved into it"""
+    __slots__ = ('prior', 'network_prior', 'visits', 'value_sum', 'virtual_loss', 'player', 'key',
+                 'children', 'terminal_value')
+
+    def __init__(self, prior: float):
+        self.prior = prior
+        # Prior before root noise, so a reused root is re-noised from the network's priors
+        self.network_prior = prior
+        self.visits = 0
+        self.value_sum = 0.0
+        self.virtual_loss = 0
+        self.player = 0
+        self.key = None
+        self.children: Optional[Dict[int, 'Node']] = None
+        # Value for `player` when the game is over at this node
+        self.terminal_value = None
+
+    @property
+    def expanded(self) -> bool:
+        return self.children is not None
+
+    def q(self) -> float:
+        visits = self.visits + self.virtual_loss
+        if visits == 0:
+            return 0.0
+        return (self.value_sum - self.virtual_loss) / visits
+
+
+class MCTSPlayer:
+    """
+    AI player that searches before moving.
+
+    Args:
+        model: policy/value network (eager, TorchScript or quantized)
+        device: torch device for the forward passes
+        num_simulations: node budget per move (None for time only)
+        time_limit: seconds per move (None for nodes only)
+        batch_size: leaves evaluated per forward pass
+        c_puct: exploration constant
+        virtual_loss: visits of loss added to a path while its leaf waits for evaluation
+        value_scale: value-head output that counts as a certain win (PPO win reward)
+        temperature: 0 plays the most visited move, > 0 samples by visits ** (1 / temperature)
+        dirichlet_alpha: root noise for self-play (None to disable)
+    """
+
+    def __init__(self, model: NineMensMorrisNet, device: torch.device, num_simulations: Optional[int] = 400,
+                 time_limit: Optional[float] = None, batch_size: int = 16, c_puct: float = 1.5,
+                 virtual_loss: int = 1, value_scale: float = 1.5, temperature: float = 0.0,
+                 dirichlet_alpha: Optional[float] = None, dirichlet_weight: float = 0.25):
+        if num_simulations is None and time_limit is None:
+            raise ValueError("Set num_simulations, time_limit or both")
+        self.model = model
+        self.device = device
+        self.num_simulations = num_simulations
+        self.time_limit = time_limit
+        self.batch_size = batch_size
+        self.c_puct = c_puct
+        self.virtual_loss = virtual_loss
+        self.value_scale = value_scale
+        self.temperature = temperature
+        self.dirichlet_alpha = dirichlet_alpha
+        self.dirichlet_weight = dirichlet_weight
+        self.root: Optional[Node] = None
+        self.last_search: Dict = {}
+
+    # --- get_ai_move / get_ai_capture compatible entry points ---
+
+    def get_ai_move(self, model, env, device, *args, **kwargs) -> Tuple:
+        """model.get_ai_move signature; searches with the given model"""
+        self.model, self.device = model, device
+        return self.search(env)
+
+    def get_ai_capture(self, model, env, device, *args, **kwargs) -> Tuple:
+        """model.get_ai_capture signature; the pending capture is searched as its own node"""
+        self.model, self.device = model, device
+        return self.search(env)
+
+    # --- Search ---
+
+    def reset(self):
+        """Forget the tree (new game)"""
+        self.root = None
+
+    def search(self, env) -> Tuple:
+        """Run the search from the env's position and return the chosen action tuple"""
+        started = time.perf_counter()
+        search_env = env.clone()
+        search_env.lazy_state = True
+        search_env.history = None
+
+        root = self._find_root(env.zobrist_hash())
+        reused = root.visits if root is not None else 0
+        if root is None:
+            root = Node(1.0)
+        self.root = root
+        if not root.expanded:
+            self._evaluate([self._leaf_entry(search_env, root, [])])
+        if self.dirichlet_alpha is not None and root.children:
+            self._add_root_noise(root)
+
+        simulations = 0
+        max_depth = 0
+        evaluations = 0
+        while True:
+            if self.num_simulations is not None and simulations >= self.num_simulations:
+                break
+            if self.time_limit is not None and time.perf_counter() - started >= self.time_limit:
+                break
+            if not root.children:
+                break
+            wanted = self.batch_size
+            if self.num_simulations is not None:
+                wanted = min(wanted, self.num_simulations - simulations)
+            leaves, descents, depth = self._collect_leaves(search_env, root, wanted)
+            max_depth = max(max_depth, depth)
+            simulations += descents
+            if leaves:
+                self._evaluate(leaves)
+                evaluations += 1
+
+        elapsed = time.perf_counter() - started
+        action_index = self._choose(root)
+        self.last_search = {
+            'simulations': simulations,
+            'reused_visits': reused,
+            'forward_passes': evaluations,
+            'max_depth': max_depth,
+            'seconds': elapsed,
+            'nodes_per_second': simulations / elapsed if elapsed > 0 else 0.0,
+            'root_value': root.value_sum / root.visits if root.visits else 0.0,
+            'visits': {a: child.visits for a, child in (root.children or {}).items()},
+        }
+        # Keep the chosen subtree for the next search
+        self.root = root.children.get(action_index) if root.children else None
+        return env.index_to_action(action_index)
+
+    def summary(self) -> str:
+        """One-line report of the last search"""
+        s = self.last_search
+        if not s:
+            return "MCTS: no search yet"
+        return (f"MCTS: {s['simulations']:,} simulations ({s['reused_visits']:,} reused), "
+                f"depth {s['max_depth']}, {s['nodes_per_second']:,.0f} nodes/s, value {s['root_value']:+.2f}")
+
+    def _find_root(self, key) -> Optional[Node]:
+        """Previous subtree node for this position: the kept child or one of its descendants"""
+        if self.root is None:
+            return None
+        frontier = [self.root]
+        for _ in range(3):
+            next_frontier = []
+            for node in frontier:
+                if node.key == key:
+                    return node
+                if node.children:
+                    next_frontier.extend(node.children.values())
+            frontier = next_frontier
+        return None
+
+    def _collect_leaves(self, env, root: Node, wanted: int):
+        """
+        Descend up to `wanted` times with virtual loss.
+
+        Returns the leaves needing evaluation as (node, path, state, legal
+        actions), the number of descents that were backed up (terminal
+        ones, directly) or queued for evaluation, and the deepest path length.
+        """
+        leaves = []
+        pending = set()
+        max_depth = 0
+        descents = 0
+        for _ in range(wanted):
+            node = root
+            path = []
+            while node.expanded and node.terminal_value is None and node.children:
+                action_index, node = self._select(node)
+                env.apply(env.index_to_action(action_index))
+                path.append(node)
+            max_depth = max(max_depth, len(path))
+
+            for visited in path:
+                visited.virtual_loss += self.virtual_loss
+
+            if node.terminal_value is None and not node.expanded and env.winner is not None:
+                node.player = env.current_player
+                node.key = env.zobrist_hash()
+                node.terminal_value = self._terminal_value(env, node.player)
+
+            if node.terminal_value is not None:
+                self._backup(path, node.player, node.terminal_value)
+                self._undo(env, path)
+                descents += 1
+                continue
+            if id(node) in pending:
+                # Two descents reached the same unexpanded leaf: evaluate once, stop collecting
+                self._undo(env, path)
+                for visited in path:
+                    visited.virtual_loss -= self.virtual_loss
+                break
+            pending.add(id(node))
+            leaves.append(self._leaf_entry(env, node, path))
+            self._undo(env, path)
+            descents += 1
+        return leaves, descents, max_depth
+
+    @staticmethod
+    def _leaf_entry(env, node: Node, path: List[Node]):
+        node.player = env.current_player
+        node.key = env.zobrist_hash()
+        return node, path, env.get_state(), np.array(env.get_valid_action_indices())
+
+    def _select(self, node: Node) -> Tuple[int, Node]:
+        sqrt_visits = math.sqrt(node.visits + 1)
+        best_score = -float('inf')
+        best = None
+        for action_index, child in node.children.items():
+            score = child.q() + self.c_puct * child.prior * sqrt_visits / (1 + child.visits + child.virtual_loss)
+            if score > best_score:
+                best_score = score
+                best = (action_index, child)
+        return best
+
+    @staticmethod
+    def _undo(env, path):
+        for _ in path:
+            env.undo()
+
+    @staticmethod
+    def _terminal_value(env, player: int) -> float:
+        if env.winner == 0:
+            return 0.0
+        return 1.0 if env.winner == player else -1.0
+
+    def _backup(self, path: List[Node], leaf_player: int, value: float):
+        """Propagate a value for `leaf_player` up the path, removing its virtual loss"""
+        parent_players = [self.root.player] + [node.player for node in path[:-1]]
+        for node, mover in zip(path, parent_players):
+            node.virtual_loss -= self.virtual_loss
+            node.visits += 1
+            node.value_sum += value if mover == leaf_player else -value
+        self.root.visits += 1
+
+    def _evaluate(self, leaves):
+        """Expand the leaves with one forward pass and back their values up"""
+        states = torch.from_numpy(np.stack([leaf[2] for leaf in leaves])).to(self.device)
+        with torch.no_grad():
+            policy_logits, values = self.model(states)
+        values = (values.squeeze(1) / self.value_scale).clamp(-1.0, 1.0).cpu().numpy()
+
+        for (node, path, _, legal), logits, value in zip(leaves, policy_logits, values):
+            if len(legal) == 0:
+                node.children = {}
+                node.terminal_value = -1.0
+                value = -1.0
+            else:
+                priors = F.softmax(logits[torch.from_numpy(legal).to(logits.device)], dim=0).cpu().numpy()
+                node.children = {int(a): Node(float(p)) for a, p in zip(legal, priors)}
+            if path:
+                self._backup(path, node.player, float(value))
+            else:
+                node.visits += 1
+                node.value_sum += float(value)
+
+    def _add_root_noise(self, root: Node):
+        noise = np.random.dirichlet([self.dirichlet_alpha] * len(root.children))
+        for child, eta in zip(root.children.values(), noise):
+            child.prior = (1 - self.dirichlet_weight) * child.network_prior + self.dirichlet_weight * eta
+
+    def _choose(self, root: Node) -> int:
+        actions = list(root.children)
+        visits = np.array([root.children[a].visits for a in actions], dtype=np.float64)
+        if self.temperature == 0 or visits.sum() == 0:
+            if visits.sum() == 0:
+                priors = [root.children[a].prior for a in actions]
+                return actions[int(np.argmax(priors))]
+            return actions[int(np.argmax(visits))]
+        weights = visits ** (1.0 / self.temperature)
+        return actions[int(np.random.choice(len(actions), p=weights / weights.sum()))]
+
+    def visit_distribution(self) -> Dict[int, int]:
+        """Visit counts of the last searched root's children (for training targets)"""
+        return self.last_search.get('visits', {})
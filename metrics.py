@@ -0,0 +1,249 @@
+"""
+Metrics Module for Nine Men's Morris
+Counters and latency histograms for the hot paths, with Prometheus text and JSON export
+
+Metrics are off unless the NMM_METRICS environment variable is set (to
+anything but '', '0' or 'false') before the game modules are imported.
+When off, @timed returns the decorated function itself, so instrumented
+call sites run exactly as before; timer() and count() are shared no-ops.
+
+    NMM_METRICS=1 streamlit run app.py
+    NMM_METRICS=1 NMM_METRICS_FILE=/var/lib/node_exporter/nmm.prom streamlit run app.py
+
+With NMM_METRICS_FILE, the app rewrites the file after every turn
+(Prometheus text format, or JSON for a .json path), e.g. for the
+node_exporter textfile collector.
+"""
+
+import os
+import re
+import json
+import time
+import bisect
+import functools
+import threading
+
+from typing import Callable, Dict, Optional, Sequence
+
+ENABLED = os.environ.get('NMM_METRICS', '').strip().lower() not in ('', '0', 'false')
+METRICS_FILE = os.environ.get('NMM_METRICS_FILE') or None
+
+# Latency bucket upper bounds, milliseconds
+LATENCY_BUCKETS_MS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250,
+                      500, 1000, 2500, 5000)
+
+PROMETHEUS_PREFIX = 'nmm_'
+
+
+class Histogram:
+    """Fixed-bucket histogram; the last bucket counts values above every bound"""
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.bounds, value)] += 1
+            self.count += 1
+            self.total += value
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds + (float('inf'),), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            labels = [f"<={b:g}" for b in self.bounds] + [f">{self.bounds[-1]:g}"]
+            return {
+                'count': self.count,
+                'mean': self.mean(),
+                'p50': self.quantile(0.5),
+                'p99': self.quantile(0.99),
+                'buckets': dict(zip(labels, self.counts))
+            }
+
+
+class Counter:
+    """Monotonic counter"""
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: int = 1):
+        with self._lock:
+            self.value += amount
+
+
+class MetricsRegistry:
+    """Named counters and millisecond latency histograms, created on first use"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[str, Counter] = {}
+        self.histograms: Dict[str, Histogram] = {}
+        self.started = time.time()
+
+    def counter(self, name: str) -> Counter:
+        counter = self.counters.get(name)
+        if counter is None:
+            with self._lock:
+                counter = self.counters.setdefault(name, Counter())
+        return counter
+
+    def histogram(self, name: str, bounds: Sequence[float] = LATENCY_BUCKETS_MS) -> Histogram:
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(name, Histogram(bounds))
+        return histogram
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.started = time.time()
+
+    def snapshot(self) -> Dict:
+        """JSON-ready view: counter values and histogram summaries (latencies in ms)"""
+        return {
+            'uptime_seconds': time.time() - self.started,
+            'counters': {name: counter.value for name, counter in sorted(self.counters.items())},
+            'histograms_ms': {name: histogram.snapshot() for name, histogram in sorted(self.histograms.items())},
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        for name, counter in sorted(self.counters.items()):
+            metric = _prometheus_name(name) + '_total'
+            lines += [f"# TYPE {metric} counter", f"{metric} {counter.value}"]
+        for name, histogram in sorted(self.histograms.items()):
+            metric = _prometheus_name(name) + '_ms'
+            with histogram._lock:
+                counts, count, total = list(histogram.counts), histogram.count, histogram.total
+            lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bound, bucket in zip(histogram.bounds, counts):
+                cumulative += bucket
+                lines.append(f'{metric}_bucket{{le="{bound:g}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{le="+Inf"}} {count}')
+            lines.append(f"{metric}_sum {total:.6f}")
+            lines.append(f"{metric}_count {count}")
+        return "\n".join(lines) + "\n"
+
+    def report(self) -> str:
+        """Plain-text table for the app panel and logs"""
+        width = max([len(name) for name in self.histograms] + [len(name) for name in self.counters] + [6])
+        lines = [f"{'metric':<{width}}  {'count':>8}  {'mean ms':>9}  {'p50 ms':>8}  {'p99 ms':>8}  {'total s':>8}"]
+        for name, histogram in sorted(self.histograms.items()):
+            lines.append(f"{name:<{width}}  {histogram.count:>8}  {histogram.mean():>9.3f}  "
+                         f"{histogram.quantile(0.5):>8g}  {histogram.quantile(0.99):>8g}  "
+                         f"{histogram.total / 1000:>8.2f}")
+        for name, counter in sorted(self.counters.items()):
+            lines.append(f"{name:<{width}}  {counter.value:>8}")
+        return "\n".join(lines)
+
+    def write_file(self, path: str):
+        """Atomically write the Prometheus text (or JSON, for a .json path) to a file"""
+        text = self.to_json() if path.endswith('.json') else self.to_prometheus()
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+
+def _prometheus_name(name: str) -> str:
+    return PROMETHEUS_PREFIX + re.sub(r'[^a-zA-Z0-9_]', '_', name)
+
+
+# Process-wide registry
+REGISTRY = MetricsRegistry()
+
+
+class _Timer:
+    __slots__ = ('histogram', 'started')
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe((time.perf_counter() - self.started) * 1000.0)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def timed(name: str) -> Callable:
+    """Decorator recording each call's latency in the `name` histogram; the function itself when disabled"""
+    def decorate(function):
+        if not ENABLED:
+            return function
+        histogram = REGISTRY.histogram(name)
+        clock = time.perf_counter
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            started = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                histogram.observe((clock() - started) * 1000.0)
+        return wrapper
+    return decorate
+
+
+def timer(name: str):
+    """Context manager timing a block into the `name` histogram (a shared no-op when disabled)"""
+    if not ENABLED:
+        return _NULL_TIMER
+    return _Timer(REGISTRY.histogram(name))
+
+
+def observe(name: str, milliseconds: float):
+    if ENABLED:
+        REGISTRY.histogram(name).observe(milliseconds)
+
+
+def count(name: str, amount: int = 1):
+    if ENABLED:
+        REGISTRY.counter(name).inc(amount)
+
+
+def export(path: Optional[str] = METRICS_FILE):
+    """Write the metrics file configured by NMM_METRICS_FILE (no-op without one)"""
+    if ENABLED and path:
+        REGISTRY.write_file(path)
@@ -2,13 +2,23 @@
 Neural Network Model for Nine Men's Morris PPO Agent
 """
 
+import os
 import torch
+import warnings
+import itertools
+import weakref
+import threading
 import numpy as np
 import torch.nn as nn
 import torch.nn.functional as F
 
+from collections import OrderedDict
 from typing import Tuple, Optional
 
+import metrics
+
+from symmetry import NUM_SYMMETRIES, transform_states, untransform_action_values
+
 class NineMensMorrisNet(nn.Module):
     """
     Actor-Critic Network for Nine Men's Morris
@@ -33,14 +43,17 @@ class NineMensMorrisNet(nn.Module):
         self.critic_fc = nn.Linear(512, 256)
         self.critic_out = nn.Linear(256, 1)
         
-    def forward(self, x):
+    def shared_features(self, x):
         # x shape: (batch_size, 7, 24)
         x = F.relu(self.conv1(x))
         x = F.relu(self.conv2(x))
         x = F.relu(self.conv3(x))
         
         x = x.view(x.size(0), -1)  
-        x = F.relu(self.fc_shared(x))
+        return F.relu(self.fc_shared(x))
+        
+    def forward(self, x):
+        x = self.shared_features(x)
         
         # Actor
         policy = F.relu(self.actor_fc(x))
@@ -51,21 +64,124 @@ class NineMensMorrisNet(nn.Module):
         value = self.critic_out(value)
         
         return policy_logits, value
+    
+    def legal_policy_logits(self, x, legal_indices: torch.Tensor, offsets: torch.Tensor):
+        """Policy logits of the legal actions only, plus the values
+        
+        Only the actor_out rows of `legal_indices` are computed. The legal
+        actions of position b are legal_indices[offsets[b]:offsets[b + 1]].
+        
+        Returns:
+            (L,) logits aligned with legal_indices and (batch_size, 1) values
+        """
+        x = self.shared_features(x)
+        policy = F.relu(self.actor_fc(x))
+        value = self.critic_out(F.relu(self.critic_fc(x)))
+        
+        weight, bias = _linear_parameters(self.actor_out)
+        if x.size(0) == 1:
+            logits = F.linear(policy, weight[legal_indices], bias[legal_indices]).squeeze(0)
+        else:
+            rows = segment_ids(offsets)
+            logits = (weight[legal_indices] * policy[rows]).sum(dim=1) + bias[legal_indices]
+        return logits, value
+
+def _linear_parameters(layer: nn.Module) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Float weight and bias of a Linear layer
+    
+    Dynamic INT8 layers are unpacked and dequantized once and the float
+    copy is kept on the module (about 640 KB for actor_out), so the sparse
+    head only gathers rows per call. The copy is rebuilt when the packed
+    weights are replaced.
+    """
+    if callable(layer.weight):
+        packed = layer._packed_params._packed_params
+        cached = getattr(layer, '_dequantized', None)
+        if cached is None or cached[0] is not packed:
+            cached = (packed, layer.weight().dequantize(), layer.bias())
+            layer._dequantized = cached
+        return cached[1], cached[2]
+    return layer.weight, layer.bias
+
+def supports_legal_policy(model) -> bool:
+    """Whether the model exposes the sparse head (eager float or INT8 NineMensMorrisNet, not TorchScript)"""
+    return isinstance(model, NineMensMorrisNet)
+
+def segment_ids(offsets: torch.Tensor) -> torch.Tensor:
+    """Position of every flat entry: offsets [0, 2, 5] -> [0, 0, 1, 1, 1]"""
+    counts = offsets[1:] - offsets[:-1]
+    return torch.repeat_interleave(torch.arange(len(counts), device=offsets.device), counts)
+
+def segment_softmax(logits: torch.Tensor, offsets: torch.Tensor) -> torch.Tensor:
+    """Softmax within each segment of a flat logit vector"""
+    rows = segment_ids(offsets)
+    batch_size = len(offsets) - 1
+    maxima = torch.full((batch_size,), -float('inf'), device=logits.device, dtype=logits.dtype)
+    maxima = maxima.scatter_reduce(0, rows, logits, reduce='amax')
+    exp = torch.exp(logits - maxima[rows])
+    sums = torch.zeros(batch_size, device=logits.device, dtype=logits.dtype).index_add(0, rows, exp)
+    return exp / sums[rows]
+
+def sample_segments(logits: torch.Tensor, offsets: torch.Tensor) -> torch.Tensor:
+    """One sample per segment (Gumbel-max); returns flat indices into logits
+    
+    Empty segments get len(logits).
+    """
+    rows = segment_ids(offsets)
+    batch_size = len(offsets) - 1
+    noise = -torch.log(-torch.log(torch.rand_like(logits).clamp_(min=1e-20)))
+    perturbed = logits + noise
+    maxima = torch.full((batch_size,), -float('inf'), device=logits.device, dtype=logits.dtype)
+    maxima = maxima.scatter_reduce(0, rows, perturbed, reduce='amax')
+    winners = perturbed == maxima[rows]
+    positions = torch.arange(len(logits), device=logits.device)
+    chosen = torch.full((batch_size,), len(logits), device=logits.device, dtype=torch.long)
+    return chosen.scatter_reduce(0, rows[winners], positions[winners], reduce='amin')
 
-def load_model(path: str, device: torch.device) -> NineMensMorrisNet:
-    """Load a trained model"""
+def quantize_model(model: NineMensMorrisNet) -> nn.Module:
+    """Dynamic INT8 copy of the network: Linear weights stored as int8, activations quantized per batch
+    
+    The Linear layers hold nearly all of the parameters (fc_shared alone is
+    6144x512), so this cuts the resident weights to about a quarter. CPU only.
+    """
+    with warnings.catch_warnings():
+        # torch.ao.quantization is deprecated in favour of torchao but still ships with torch
+        warnings.simplefilter('ignore', DeprecationWarning)
+        warnings.simplefilter('ignore', UserWarning)
+        return torch.ao.quantization.quantize_dynamic(model.cpu().eval(), {nn.Linear}, dtype=torch.qint8)
+
+def load_model(path: str, device: torch.device, optimized: bool = True,
+               quantized: bool = False) -> NineMensMorrisNet:
+    """Load a trained model
+    
+    Returns a private instance; use registry.get_model to share one loaded
+    copy across sessions. On CPU, a TorchScript artifact written by
+    export.py next to the checkpoint ('Model 1.pt' -> 'Model 1.ts') is used
+    instead of the eager model when it is at least as new as the checkpoint.
+    With quantized, the checkpoint is loaded and converted by quantize_model
+    instead (CPU only). Checkpoint formats are handled by
+    registry.read_state_dict.
+    """
+    from registry import read_state_dict
+    
+    if quantized:
+        if device.type != 'cpu':
+            raise ValueError("Quantized models run on CPU only")
+        return quantize_model(load_model(path, device, optimized=False))
+    
+    if optimized and device.type == 'cpu':
+        from export import optimized_artifact_path, load_torchscript
+        script_path = optimized_artifact_path(path)
+        if (os.path.exists(script_path) and os.path.exists(path)
+                and os.path.getmtime(script_path) >= os.path.getmtime(path)):
+            try:
+                return load_torchscript(script_path, device)
+            except Exception as e:
+                print(f"Error loading optimized model {script_path}: {e}")
+    
     model = NineMensMorrisNet()
     try:
-        # Try loading as full model
-        loaded = torch.load(path, map_location=device)
-        if isinstance(loaded, NineMensMorrisNet):
-            model = loaded
-        elif isinstance(loaded, dict):
-            # Check if it's a state dict or checkpoint
-            if 'model_state_dict' in loaded:
-                model.load_state_dict(loaded['model_state_dict'])
-            else:
-                model.load_state_dict(loaded)
+        model.load_state_dict(read_state_dict(path, device))
     except Exception as e:
         print(f"Error loading model {path}: {e}")
         # Return initialized random model if fail, just to not crash
@@ -75,29 +191,247 @@ def load_model(path: str, device: torch.device) -> NineMensMorrisNet:
     model.eval()
     return model
 
-def get_ai_move(model: NineMensMorrisNet, env, device: torch.device) -> Tuple:
-    """Get the next move from the AI model"""
+def warm_up(model, device: torch.device, batch_sizes: Tuple[int, ...] = (1, 16), rounds: int = 2):
+    """Run dummy batches so allocator and kernel setup happen at boot, not on the first move"""
+    with torch.no_grad():
+        for _ in range(rounds):
+            for batch_size in batch_sizes:
+                model(torch.zeros(batch_size, 7, 24, device=device))
+
+def policy_inputs(env, symmetric_ensemble: bool = False) -> np.ndarray:
+    """Network input rows for the current position: (1, 7, 24), or (16, 7, 24) for the ensemble"""
     state = env.get_state()
-    state_tensor = torch.FloatTensor(state).unsqueeze(0).to(device)
+    if symmetric_ensemble:
+        return transform_states(
+            np.broadcast_to(state, (NUM_SYMMETRIES,) + state.shape), np.arange(NUM_SYMMETRIES)
+        )
+    return state[None]
+
+def combine_policy_logits(policy_logits: torch.Tensor, symmetric_ensemble: bool = False) -> torch.Tensor:
+    """(1, 624) logits from the network output for the rows of policy_inputs"""
+    if symmetric_ensemble:
+        policy_logits = untransform_action_values(policy_logits, np.arange(NUM_SYMMETRIES))
+        policy_logits = policy_logits.mean(dim=0, keepdim=True)
+    return policy_logits
+
+@metrics.timed('model.forward')
+def evaluate_position(model: NineMensMorrisNet, env, device: torch.device,
+                      symmetric_ensemble: bool = False) -> Tuple[torch.Tensor, torch.Tensor]:
+    """(1, 624) policy logits and (1, 1) value for the current position
+    
+    With symmetric_ensemble, the 16 symmetric variants of the position go
+    through the network as one batch and their outputs, mapped back to the
+    original board, are averaged.
+    """
+    state_tensor = torch.from_numpy(policy_inputs(env, symmetric_ensemble)).to(device)
     
     with torch.no_grad():
-        policy_logits, _ = model(state_tensor)
-        
+        policy_logits, value = model(state_tensor)
+    
+    return combine_policy_logits(policy_logits, symmetric_ensemble), value.mean(dim=0, keepdim=True)
+
+def policy_logits_for(model: NineMensMorrisNet, env, device: torch.device,
+                      symmetric_ensemble: bool = False) -> torch.Tensor:
+    """(1, 624) policy logits for the current position (see evaluate_position)"""
+    return evaluate_position(model, env, device, symmetric_ensemble)[0]
+
+_model_tokens = itertools.count(1)
+
+def model_identity(model: NineMensMorrisNet) -> Tuple[int, int]:
+    """Cache identity of a model: a per-object token plus the parameter version counters
+    
+    In-place weight updates (load_state_dict, optimizer steps) bump the
+    tensors' version counters, so entries of an older checkpoint stop
+    matching without explicit invalidation.
+    """
+    token = getattr(model, '_evaluation_token', None)
+    if token is None:
+        token = next(_model_tokens)
+        model._evaluation_token = token
+    return token, sum(p._version for p in model.parameters())
+
+class EvaluationCache:
+    """
+    Bounded, thread-safe LRU cache of network evaluations.
+    
+    Keys are (model identity, kind, ensemble flag, Zobrist hash of the
+    position); values are the policy (masked 624-wide logits, or the legal
+    logits of the sparse head) and the value estimate.
+    Only the forward pass and masking are reused: every call still samples.
+    Entries of models that have been garbage collected (e.g. replaced by a
+    registry hot swap) are dropped when the next new model shows up.
+    """
+    def __init__(self, capacity: int = 20000):
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._identity = {}
+        # token -> model, without keeping the model alive
+        self._models = weakref.WeakValueDictionary()
+    
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+    
+    def put(self, key, masked_logits: torch.Tensor, value: torch.Tensor):
+        with self._lock:
+            self._entries[key] = (masked_logits, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+    
+    def key(self, model: NineMensMorrisNet, env, kind: str, symmetric_ensemble: bool = False):
+        identity = model_identity(model)
+        token = identity[0]
+        with self._lock:
+            if token not in self._identity:
+                # A new model: forget the models that no longer exist
+                stale = {t for t in self._identity if t not in self._models}
+                if stale:
+                    self._drop_tokens(stale)
+                self._models[token] = model
+            # Drop the entries of a model whose weights changed
+            elif self._identity[token] != identity:
+                self._drop_tokens({token})
+            self._identity[token] = identity
+        return identity, kind, symmetric_ensemble, env.zobrist_hash()
+    
+    def _drop_tokens(self, tokens):
+        """Remove the entries of the given model tokens (lock held)"""
+        for key in [k for k in self._entries if k[0][0] in tokens]:
+            del self._entries[key]
+        for token in tokens:
+            self._identity.pop(token, None)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._identity.clear()
+            self._models.clear()
+            self.hits = 0
+            self.misses = 0
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+    
+    def stats(self) -> dict:
+        return {
+            'entries': len(self._entries),
+            'capacity': self.capacity,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hit_rate
+        }
+
+# Shared cache for callers that pass cache=EVALUATION_CACHE
+EVALUATION_CACHE = EvaluationCache()
+
+def _cached_policy(cache: Optional[EvaluationCache], kind: str, symmetric_ensemble: bool,
+                   model, env, evaluate):
+    """Policy from evaluate() -> (policy, value), reused from the cache when one is given"""
+    if cache is None:
+        return evaluate()[0]
+    key = cache.key(model, env, kind, symmetric_ensemble)
+    entry = cache.get(key)
+    if entry is not None:
+        return entry[0]
+    policy, value = evaluate()
+    cache.put(key, policy, value)
+    return policy
+
+def _masked_evaluation(mask_logits, model, env, device, symmetric_ensemble):
+    def evaluate():
+        policy_logits, value = evaluate_position(model, env, device, symmetric_ensemble)
+        return mask_logits(env, policy_logits, device), value
+    return evaluate
+
+def _legal_evaluation(model, env, device, legal_indices: np.ndarray):
+    @metrics.timed('model.forward')
+    def evaluate():
+        state_tensor = torch.from_numpy(env.get_state()).unsqueeze(0).to(device)
+        indices = torch.from_numpy(legal_indices.astype(np.int64)).to(device)
+        offsets = torch.tensor([0, len(indices)], device=device)
+        with torch.no_grad():
+            return model.legal_policy_logits(state_tensor, indices, offsets)
+    return evaluate
+
+def sample_legal(env, legal_indices: np.ndarray, legal_logits: torch.Tensor) -> Optional[Tuple]:
+    """Sample from logits over the legal actions only"""
+    if len(legal_indices) == 0:
+        return None
+    probs = F.softmax(legal_logits, dim=0)
+    if torch.isnan(probs).any() or probs.sum() == 0:
+        choice = torch.randint(0, len(legal_indices), (1,)).item()
+    else:
+        choice = torch.multinomial(probs, 1).item()
+    return env.index_to_action(int(legal_indices[choice]))
+
+def get_ai_move(model: NineMensMorrisNet, env, device: torch.device,
+                symmetric_ensemble: bool = False, tablebase=None,
+                cache: Optional[EvaluationCache] = None, sparse: bool = False) -> Tuple:
+    """Get the next move from the AI model
+    
+    With a tablebase (tablebase.Tablebase), endgame positions it covers are
+    played perfectly from the table instead of the network. With a cache,
+    repeated positions reuse the masked logits of an earlier call. With
+    sparse, only the legal rows of actor_out are evaluated (not combined
+    with symmetric_ensemble; TorchScript models use the dense head).
+    """
+    if tablebase is not None:
+        action = tablebase.best_action(env)
+        if action is not None:
+            return action
+    
+    if sparse and not symmetric_ensemble and supports_legal_policy(model):
+        legal_indices = env.get_valid_action_indices()
+        if len(legal_indices) > 0:
+            legal_logits = _cached_policy(cache, 'move-legal', False, model, env,
+                                          _legal_evaluation(model, env, device, legal_indices))
+            return sample_legal(env, legal_indices, legal_logits)
+    
+    masked_logits = _cached_policy(cache, 'move', symmetric_ensemble, model, env,
+                                   _masked_evaluation(mask_move_logits, model, env, device,
+                                                      symmetric_ensemble))
+    return sample_move(env, masked_logits)
+
+def select_move(env, policy_logits: torch.Tensor, device: torch.device) -> Tuple:
+    """Sample a legal move from (1, 624) policy logits"""
+    return sample_move(env, mask_move_logits(env, policy_logits, device))
+
+@metrics.timed('model.mask')
+def mask_move_logits(env, policy_logits: torch.Tensor, device: torch.device) -> torch.Tensor:
+    """(624,) logits with illegal actions set to -inf"""
     # Mask invalid actions
-    valid_mask = torch.FloatTensor(env.get_valid_action_mask()).to(device)
+    valid_mask = torch.tensor(env.get_valid_action_mask(), device=device)
     
     # Apply mask (set invalid logits to -inf)
     policy_logits = policy_logits.squeeze(0)
     masked_logits = policy_logits.clone()
     masked_logits[valid_mask == 0] = -float('inf')
-    
+    return masked_logits
+
+def sample_move(env, masked_logits: torch.Tensor) -> Tuple:
+    """Sample a move from masked logits"""
     # Softmax to get probabilities
     probs = F.softmax(masked_logits, dim=0)
     
     # Handle numerical instability
     if torch.isnan(probs).any() or torch.isinf(probs).any() or probs.sum() == 0:
         # Fallback: choose random valid action
-        valid_indices = torch.nonzero(valid_mask).squeeze()
+        valid_indices = torch.nonzero(masked_logits > -float('inf')).squeeze()
         if valid_indices.numel() > 0:
             if valid_indices.numel() == 1:
                 action_idx = valid_indices.item()
@@ -113,27 +447,47 @@ def get_ai_move(model: NineMensMorrisNet, env, device: torch.device) -> Tuple:
     
     return env.index_to_action(action_idx)
 
-def get_ai_capture(model: NineMensMorrisNet, env, device: torch.device) -> Tuple:
+def get_ai_capture(model: NineMensMorrisNet, env, device: torch.device,
+                   symmetric_ensemble: bool = False, tablebase=None,
+                   cache: Optional[EvaluationCache] = None, sparse: bool = False) -> Tuple:
     """Get capture action from AI"""
-    # Simply use the same valid action masking logic but restricted to captures
-    state = env.get_state()
-    state_tensor = torch.FloatTensor(state).unsqueeze(0).to(device)
+    if tablebase is not None:
+        action = tablebase.best_action(env)
+        if action is not None:
+            return action
     
-    with torch.no_grad():
-        policy_logits, _ = model(state_tensor)
+    if sparse and not symmetric_ensemble and supports_legal_policy(model):
+        legal_indices = env.ACTION_CAPTURE_START + np.flatnonzero(env.get_valid_capture_mask())
+        if len(legal_indices) > 0:
+            legal_logits = _cached_policy(cache, 'capture-legal', False, model, env,
+                                          _legal_evaluation(model, env, device, legal_indices))
+            return sample_legal(env, legal_indices, legal_logits)
     
-    # Manual mask for capture actions only
-    valid_captures = env.get_valid_capture_actions()
-    mask = torch.zeros(624).to(device)
-    
-    for action in valid_captures:
-        idx = env.action_to_index(action)
-        mask[idx] = 1.0
+    # Simply use the same valid action masking logic but restricted to captures
+    masked_logits = _cached_policy(cache, 'capture', symmetric_ensemble, model, env,
+                                   _masked_evaluation(mask_capture_logits, model, env, device,
+                                                      symmetric_ensemble))
+    return sample_capture(env, masked_logits)
+
+def select_capture(env, policy_logits: torch.Tensor, device: torch.device) -> Tuple:
+    """Sample a legal capture from (1, 624) policy logits"""
+    return sample_capture(env, mask_capture_logits(env, policy_logits, device))
+
+@metrics.timed('model.mask')
+def mask_capture_logits(env, policy_logits: torch.Tensor, device: torch.device) -> torch.Tensor:
+    """(624,) logits with everything but the legal captures set to -inf"""
+    # Capture mask straight from the environment
+    capture_positions = np.flatnonzero(env.get_valid_capture_mask())
+    mask = torch.zeros(env.ACTION_SPACE_SIZE, dtype=torch.bool, device=device)
+    mask[env.ACTION_CAPTURE_START + torch.from_numpy(capture_positions).to(device)] = True
         
     policy_logits = policy_logits.squeeze(0)
     masked_logits = policy_logits.clone()
-    masked_logits[mask == 0] = -float('inf')
-    
+    masked_logits[~mask] = -float('inf')
+    return masked_logits
+
+def sample_capture(env, masked_logits: torch.Tensor) -> Tuple:
+    """Sample a capture from masked logits"""
     probs = F.softmax(masked_logits, dim=0)
     
     try:
@@ -141,4 +495,7 @@ def get_ai_capture(model: NineMensMorrisNet, env, device: torch.device) -> Tuple
         return env.index_to_action(action_idx)
     except:
         # Fallback if something goes wrong shouldn't if mask is correct        
-        return valid_captures[0] if valid_captures else None
+        capture_positions = np.flatnonzero(env.get_valid_capture_mask())
+        if len(capture_positions) == 0:
+            return None
+        return env.index_to_action(env.ACTION_CAPTURE_START + int(capture_positions[0]))
@@ -0,0 +1,222 @@
+"""
+Packed Position Module for Nine Men's Morris
+One uint64 per position, decoded in batches to the exact get_state layout
+
+Record layout (bit 0 = least significant):
+    0-23    player 1 (Biru) pieces, one bit per board position
+    24-47   player -1 (Merah) pieces
+    48-51   pieces in hand, player 1
+    52-55   pieces in hand, player -1
+    56-57   phase code of player 1 (vec_env PHASE_* codes)
+    58-59   phase code of player -1
+    60      side to move is player -1
+    61      a capture is pending (the mill sub-turn)
+
+A get_state observation is 672 bytes of float32; a record is 8. The legal
+action mask (624 more bytes) is not stored either: legal_masks() rebuilds
+it from the records with VecNineMensMorrisEnv.
+"""
+
+import numpy as np
+
+from typing import Dict, Optional, Tuple
+
+from game import NineMensMorrisEnv
+from vec_env import (VecNineMensMorrisEnv, BOARD_POSITIONS, PIECES_PER_PLAYER,
+                     PHASE_PLACEMENT, PHASE_MOVEMENT, PHASE_FLYING)
+
+BLACK_SHIFT = 24
+HAND_SHIFT = 48
+PHASE_SHIFT = 56
+SIDE_BIT = 60
+CAPTURE_BIT = 61
+
+PHASE_CODES = {'placement': PHASE_PLACEMENT, 'movement': PHASE_MOVEMENT, 'flying': PHASE_FLYING}
+PHASE_NAMES = {code: name for name, code in PHASE_CODES.items()}
+
+_POSITION_WEIGHTS = np.uint64(1) << np.arange(BOARD_POSITIONS, dtype=np.uint64)
+
+
+def _field(records: np.ndarray, shift: int, bits: int) -> np.ndarray:
+    return ((records >> np.uint64(shift)) & np.uint64((1 << bits) - 1)).astype(np.int8)
+
+
+def pack_env(env) -> int:
+    """Record of a NineMensMorrisEnv (or BitboardNineMensMorrisEnv) position"""
+    white = black = 0
+    for pos in np.flatnonzero(env.board == 1):
+        white |= 1 << int(pos)
+    for pos in np.flatnonzero(env.board == -1):
+        black |= 1 << int(pos)
+    return (white
+            | black << BLACK_SHIFT
+            | env.pieces_in_hand[1] << HAND_SHIFT
+            | env.pieces_in_hand[-1] << HAND_SHIFT + 4
+            | PHASE_CODES[env.player_phase[1]] << PHASE_SHIFT
+            | PHASE_CODES[env.player_phase[-1]] << PHASE_SHIFT + 2
+            | int(env.current_player == -1) << SIDE_BIT
+            | int(env.pending_capture) << CAPTURE_BIT)
+
+
+def pack_fields(board: np.ndarray, current_player: np.ndarray, pieces_in_hand: np.ndarray,
+                player_phase: np.ndarray, needs_capture: np.ndarray) -> np.ndarray:
+    """
+    (N,) uint64 records from struct-of-arrays positions (the VecNineMensMorrisEnv
+    layout: (N, 24) board, per-player columns 0 = player 1, 1 = player -1).
+    """
+    white = (board == 1).astype(np.uint64) @ _POSITION_WEIGHTS
+    black = (board == -1).astype(np.uint64) @ _POSITION_WEIGHTS
+    hands = pieces_in_hand.astype(np.uint64)
+    phases = player_phase.astype(np.uint64)
+    return (white
+            | black << np.uint64(BLACK_SHIFT)
+            | hands[:, 0] << np.uint64(HAND_SHIFT)
+            | hands[:, 1] << np.uint64(HAND_SHIFT + 4)
+            | phases[:, 0] << np.uint64(PHASE_SHIFT)
+            | phases[:, 1] << np.uint64(PHASE_SHIFT + 2)
+            | (current_player == -1).astype(np.uint64) << np.uint64(SIDE_BIT)
+            | needs_capture.astype(np.uint64) << np.uint64(CAPTURE_BIT))
+
+
+def pack_vec(env: VecNineMensMorrisEnv) -> np.ndarray:
+    """(N,) records of every game in a VecNineMensMorrisEnv"""
+    return pack_fields(env.board, env.current_player, env.pieces_in_hand, env.player_phase,
+                       env.needs_capture)
+
+
+def _bits(records: np.ndarray) -> np.ndarray:
+    """(N, 64) uint8 bits of the records, least significant first"""
+    little = np.ascontiguousarray(records, dtype='<u8')
+    return np.unpackbits(little.view(np.uint8).reshape(len(little), 8), axis=1, bitorder='little')
+
+
+def unpack_states(records: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """(N, 7, 24) float32 observations, identical to NineMensMorrisEnv.get_state"""
+    records = np.asarray(records, dtype=np.uint64).reshape(-1)
+    n = len(records)
+    if out is None:
+        out = np.empty((n, 7, BOARD_POSITIONS), dtype=np.float32)
+    bits = _bits(records)
+    side = bits[:, SIDE_BIT].astype(bool)
+    white = bits[:, :BOARD_POSITIONS]
+    black = bits[:, BLACK_SHIFT:BLACK_SHIFT + BOARD_POSITIONS]
+    us = np.where(side[:, None], black, white)
+    them = np.where(side[:, None], white, black)
+
+    hand = np.where(side, _field(records, HAND_SHIFT + 4, 4), _field(records, HAND_SHIFT, 4))
+    phase = np.where(side, _field(records, PHASE_SHIFT + 2, 2), _field(records, PHASE_SHIFT, 2))
+
+    out[:, 0] = us
+    out[:, 1] = them
+    out[:, 2] = (phase == PHASE_PLACEMENT)[:, None]
+    out[:, 3] = (phase == PHASE_MOVEMENT)[:, None]
+    out[:, 4] = (phase == PHASE_FLYING)[:, None]
+    out[:, 5] = (hand / PIECES_PER_PLAYER)[:, None]
+    out[:, 6] = 1 - (us | them)
+    return out
+
+
+def unpack_fields(records: np.ndarray) -> Dict[str, np.ndarray]:
+    """Struct-of-arrays positions in the VecNineMensMorrisEnv layout"""
+    records = np.asarray(records, dtype=np.uint64).reshape(-1)
+    bits = _bits(records)
+    board = (bits[:, :BOARD_POSITIONS].astype(np.int8)
+             - bits[:, BLACK_SHIFT:BLACK_SHIFT + BOARD_POSITIONS].astype(np.int8))
+    return {
+        'board': board,
+        'current_player': np.where(bits[:, SIDE_BIT], -1, 1).astype(np.int8),
+        'pieces_in_hand': np.stack([_field(records, HAND_SHIFT, 4), _field(records, HAND_SHIFT + 4, 4)], axis=1),
+        'pieces_on_board': np.stack([(board == 1).sum(axis=1), (board == -1).sum(axis=1)], axis=1).astype(np.int8),
+        'player_phase': np.stack([_field(records, PHASE_SHIFT, 2), _field(records, PHASE_SHIFT + 2, 2)], axis=1),
+        'needs_capture': bits[:, CAPTURE_BIT].astype(bool),
+    }
+
+
+def env_from_record(record: int, env_class=NineMensMorrisEnv, **kwargs):
+    """NineMensMorrisEnv (or subclass) set up at a recorded position; kwargs go to the constructor"""
+    fields = unpack_fields(np.array([record], dtype=np.uint64))
+    hands = fields['pieces_in_hand'][0]
+    phases = fields['player_phase'][0]
+    env = env_class(**kwargs)
+    env.set_position(fields['board'][0], fields['current_player'][0],
+                     {1: hands[0], -1: hands[1]},
+                     {1: PHASE_NAMES[phases[0]], -1: PHASE_NAMES[phases[1]]},
+                     fields['needs_capture'][0])
+    return env
+
+
+def vec_env_from_records(records: np.ndarray) -> VecNineMensMorrisEnv:
+    """VecNineMensMorrisEnv holding the recorded positions (move counts start at 0)"""
+    fields = unpack_fields(records)
+    env = VecNineMensMorrisEnv(len(fields['board']))
+    for name, values in fields.items():
+        setattr(env, name, values)
+    env.movement_started = (fields['player_phase'] != PHASE_PLACEMENT).any(axis=1)
+    return env
+
+
+def legal_masks(records: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """(N, 624) float32 legal-action masks, identical to get_valid_action_mask"""
+    return vec_env_from_records(records).get_valid_action_mask(out)
+
+
+class PackedReplayBuffer:
+    """
+    Ring buffer of packed positions with optional per-position columns
+    (actions, returns, policy targets...). About 8 bytes per position plus
+    the columns, instead of 1296 for a float observation and its mask.
+
+    Example:
+        buffer = PackedReplayBuffer(10_000_000, {'action': np.int16, 'return': np.float32})
+        buffer.add(pack_vec(env), action=actions, **{'return': returns})
+        states, masks, columns = buffer.sample(256, rng)
+    """
+
+    def __init__(self, capacity: int, columns: Optional[Dict[str, np.dtype]] = None):
+        self.capacity = capacity
+        self.records = np.zeros(capacity, dtype=np.uint64)
+        self.columns = {name: np.zeros(capacity, dtype=dtype) for name, dtype in (columns or {}).items()}
+        self.size = 0
+        self._next = 0
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def nbytes(self) -> int:
+        return self.records.nbytes + sum(column.nbytes for column in self.columns.values())
+
+    def add(self, records: np.ndarray, **columns: np.ndarray):
+        """Append a batch, overwriting the oldest positions once full"""
+        records = np.asarray(records, dtype=np.uint64).reshape(-1)
+        slots = (self._next + np.arange(len(records))) % self.capacity
+        self.records[slots] = records
+        for name, column in self.columns.items():
+            column[slots] = columns[name]
+        self._next = int((self._next + len(records)) % self.capacity)
+        self.size = min(self.capacity, self.size + len(records))
+
+    def get(self, indices: np.ndarray) -> Tuple[np.ndarray, np.ndarray, Dict[str, np.ndarray]]:
+        """Decoded observations, legal masks and column values of the given slots"""
+        records = self.records[indices]
+        return (unpack_states(records), legal_masks(records),
+                {name: column[indices] for name, column in self.columns.items()})
+
+    def sample(self, batch_size: int, rng: Optional[np.random.Generator] = None):
+        rng = rng or np.random.default_rng()
+        return self.get(rng.integers(0, self.size, size=batch_size))
+
+    def save(self, path: str):
+        """Write the stored positions (oldest first) as an .npz file"""
+        order = (self._next - self.size + np.arange(self.size)) % self.capacity
+        np.savez(path, records=self.records[order],
+                 **{f'column_{name}': column[order] for name, column in self.columns.items()})
+
+    @classmethod
+    def load(cls, path: str, capacity: Optional[int] = None) -> 'PackedReplayBuffer':
+        with np.load(path) as data:
+            records = data['records']
+            columns = {name[len('column_'):]: data[name] for name in data.files if name.startswith('column_')}
+        buffer = cls(capacity or len(records), {name: values.dtype for name, values in columns.items()})
+        buffer.add(records[-buffer.capacity:], **{name: values[-buffer.capacity:] for name, values in columns.items()})
+        return buffer
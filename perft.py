@@ -0,0 +1,263 @@
+"""
+Perft Module for Nine Men's Morris
+Leaf-node counts of the game tree, as a move-generator oracle and engine benchmark
+
+The capture after a mill is its own ply, exactly as step() plays it with
+needs_capture: a mill-forming move leads to a node where the same player
+chooses a capture. Finished games are leaves before the full depth and
+count as no nodes (as checkmates do in chess perft).
+
+A generator pairs an environment class, used to play the moves with
+apply/undo, with a legal-move function:
+    reference   NineMensMorrisEnv, get_valid_actions / get_valid_capture_actions
+    mask        NineMensMorrisEnv, the cached get_valid_action_indices
+    bitboard    BitboardNineMensMorrisEnv, get_valid_action_indices
+    vec         NineMensMorrisEnv playing the moves, VecNineMensMorrisEnv's legal mask
+
+Usage:
+    python perft.py --depth 5
+    python perft.py --depth 4 --generator bitboard --divide
+    python perft.py --depth 5 --diff reference bitboard
+    python perft.py --depth 3 --moves 0,1,9,2,21
+"""
+
+import time
+import argparse
+
+import numpy as np
+
+from collections import Counter
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from game import NineMensMorrisEnv
+from bitboard import BitboardNineMensMorrisEnv
+
+
+def reference_actions(env) -> List[Tuple]:
+    """Legal actions from the rule-by-rule reference generators"""
+    if env.pending_capture:
+        return env.get_valid_capture_actions()
+    return env.get_valid_actions()
+
+
+def mask_actions(env) -> List[Tuple]:
+    """Legal actions from the environment's cached legal-index array"""
+    return [env.index_to_action(int(index)) for index in env.get_valid_action_indices()]
+
+
+def vec_actions(env) -> List[Tuple]:
+    """Legal actions from VecNineMensMorrisEnv's vectorized mask for the same position"""
+    from packed import pack_env, legal_masks
+    mask = legal_masks(np.array([pack_env(env)], dtype=np.uint64))[0]
+    return [env.index_to_action(int(index)) for index in np.flatnonzero(mask)]
+
+
+class Generator(NamedTuple):
+    env_class: type
+    legal_actions: Callable
+
+
+GENERATORS: Dict[str, Generator] = {
+    'reference': Generator(NineMensMorrisEnv, reference_actions),
+    'mask': Generator(NineMensMorrisEnv, mask_actions),
+    'bitboard': Generator(BitboardNineMensMorrisEnv, mask_actions),
+    'vec': Generator(NineMensMorrisEnv, vec_actions),
+}
+
+
+def make_env(generator: str, record: Optional[int] = None, moves: Sequence[int] = ()):
+    """Headless environment of the generator's class at the start, a packed record, or after moves"""
+    env_class = GENERATORS[generator].env_class
+    if record is None:
+        env = env_class(lazy_state=True, history=None)
+    else:
+        from packed import env_from_record
+        env = env_from_record(record, env_class, lazy_state=True, history=None)
+    for index in moves:
+        if index not in env.get_valid_action_indices():
+            raise ValueError(f"Action {index} is not legal in the given position")
+        env.step(env.index_to_action(index))
+    return env
+
+
+def perft(env, depth: int, legal_actions: Callable = reference_actions,
+          stats: Optional[Counter] = None) -> int:
+    """
+    Number of leaf nodes `depth` plies below the env's position.
+
+    Leaf moves are played too, so `stats` (when given) counts them by type
+    ('place', 'move', 'capture') and by effect ('mill' for moves that leave
+    a capture pending, 'win' and 'draw' for game-ending ones). Every move
+    played, internal ones included, is counted under 'nodes'.
+    """
+    if depth == 0:
+        return 1
+    if env.winner is not None:
+        return 0
+    stats = stats if stats is not None else Counter()
+    leaves = 0
+    for action in legal_actions(env):
+        env.apply(action)
+        stats['nodes'] += 1
+        if depth == 1:
+            leaves += 1
+            stats[action[0]] += 1
+            if env.pending_capture:
+                stats['mill'] += 1
+            if env.winner is not None:
+                stats['draw' if env.winner == 0 else 'win'] += 1
+        else:
+            leaves += perft(env, depth - 1, legal_actions, stats)
+        env.undo()
+    return leaves
+
+
+def divide(env, depth: int, legal_actions: Callable = reference_actions) -> Dict[int, int]:
+    """Leaf count below each root action (by action index), for locating a mismatch"""
+    counts = {}
+    for action in legal_actions(env):
+        env.apply(action)
+        counts[env.action_to_index(action)] = perft(env, depth - 1, legal_actions) if depth > 1 else 1
+        env.undo()
+    return counts
+
+
+def run_perft(env, depth: int, legal_actions: Callable = reference_actions) -> Dict:
+    """Leaf counts for every depth up to `depth`, with the breakdown and throughput of each"""
+    rows = []
+    for d in range(1, depth + 1):
+        stats = Counter()
+        started = time.perf_counter()
+        leaves = perft(env, d, legal_actions, stats)
+        seconds = time.perf_counter() - started
+        rows.append({
+            'depth': d,
+            'leaves': leaves,
+            'place': stats['place'], 'move': stats['move'], 'capture': stats['capture'],
+            'mill': stats['mill'], 'win': stats['win'], 'draw': stats['draw'],
+            'nodes': stats['nodes'],
+            'seconds': seconds,
+            'nodes_per_second': stats['nodes'] / seconds if seconds > 0 else 0.0,
+        })
+    return {'rows': rows}
+
+
+class Mismatch(NamedTuple):
+    path: Tuple[int, ...]      # action indices from the root
+    kind: str                  # 'legal' or 'position'
+    only_a: Tuple[int, ...]
+    only_b: Tuple[int, ...]
+
+
+def _position_key(env) -> Tuple:
+    return (env.zobrist_hash(), env.winner, env.pending_capture, bytes(np.asarray(env.board, dtype=np.int8)))
+
+
+def diff_generators(env_a, env_b, depth: int, legal_a: Callable, legal_b: Callable,
+                    max_mismatches: int = 10) -> Tuple[List[Mismatch], int]:
+    """
+    Walk both generators' trees in lockstep and compare them position by position.
+
+    At every node the legal action sets are compared; after every common
+    action the resulting positions (hash, board, winner, pending capture)
+    must agree too. The walk continues through the common actions.
+    Returns the first `max_mismatches` differences and the number of
+    positions compared.
+    """
+    mismatches: List[Mismatch] = []
+    compared = 0
+    path: List[int] = []
+
+    def walk(remaining: int):
+        nonlocal compared
+        if len(mismatches) >= max_mismatches or remaining == 0 or env_a.winner is not None:
+            return
+        compared += 1
+        actions_a = {env_a.action_to_index(a): a for a in legal_a(env_a)}
+        actions_b = {env_b.action_to_index(a): a for a in legal_b(env_b)}
+        if actions_a.keys() != actions_b.keys():
+            mismatches.append(Mismatch(tuple(path), 'legal',
+                                       tuple(sorted(actions_a.keys() - actions_b.keys())),
+                                       tuple(sorted(actions_b.keys() - actions_a.keys()))))
+        for index in sorted(actions_a.keys() & actions_b.keys()):
+            env_a.apply(actions_a[index])
+            env_b.apply(actions_b[index])
+            path.append(index)
+            if _position_key(env_a) != _position_key(env_b):
+                mismatches.append(Mismatch(tuple(path), 'position', (), ()))
+            else:
+                walk(remaining - 1)
+            path.pop()
+            env_a.undo()
+            env_b.undo()
+            if len(mismatches) >= max_mismatches:
+                return
+
+    walk(depth)
+    return mismatches, compared
+
+
+def format_perft(result: Dict, generator: str) -> str:
+    lines = [f"perft ({generator})",
+             f"{'depth':>5}  {'leaves':>12}  {'place':>10}  {'move':>10}  {'capture':>9}  "
+             f"{'mill':>8}  {'win':>7}  {'draw':>5}  {'nodes/sec':>11}  {'seconds':>8}"]
+    for row in result['rows']:
+        lines.append(f"{row['depth']:>5}  {row['leaves']:>12,}  {row['place']:>10,}  {row['move']:>10,}  "
+                     f"{row['capture']:>9,}  {row['mill']:>8,}  {row['win']:>7,}  {row['draw']:>5,}  "
+                     f"{row['nodes_per_second']:>11,.0f}  {row['seconds']:>8.2f}")
+    return "\n".join(lines)
+
+
+def _parse_moves(text: Optional[str]) -> List[int]:
+    return [int(index) for index in text.split(',') if index.strip()] if text else []
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count game-tree leaves and cross-check move generators")
+    parser.add_argument('--depth', type=int, default=4)
+    parser.add_argument('--generator', choices=sorted(GENERATORS), default='reference')
+    parser.add_argument('--record', type=lambda text: int(text, 0), default=None,
+                        help='Start from a packed position record (packed.py), e.g. 0x1000000000001')
+    parser.add_argument('--moves', default=None, help='Comma-separated action indices played first')
+    parser.add_argument('--divide', action='store_true', help='Leaf count per root action')
+    parser.add_argument('--diff', nargs=2, metavar=('A', 'B'), choices=sorted(GENERATORS),
+                        help='Compare two generators position by position instead of counting')
+    parser.add_argument('--max-mismatches', type=int, default=10)
+    args = parser.parse_args()
+    moves = _parse_moves(args.moves)
+
+    if args.diff:
+        name_a, name_b = args.diff
+        env_a = make_env(name_a, args.record, moves)
+        env_b = make_env(name_b, args.record, moves)
+        started = time.perf_counter()
+        mismatches, compared = diff_generators(env_a, env_b, args.depth, GENERATORS[name_a].legal_actions,
+                                               GENERATORS[name_b].legal_actions, args.max_mismatches)
+        seconds = time.perf_counter() - started
+        print(f"{name_a} vs {name_b}, depth {args.depth}: {compared:,} positions compared in {seconds:.1f} s")
+        for mismatch in mismatches:
+            where = ','.join(map(str, mismatch.path)) or '(root)'
+            if mismatch.kind == 'legal':
+                print(f"  legal moves differ after {where}: only {name_a} {list(mismatch.only_a)}, "
+                      f"only {name_b} {list(mismatch.only_b)}")
+            else:
+                print(f"  positions differ after {where}")
+        if mismatches:
+            raise SystemExit(1)
+        print("  no differences")
+        return
+
+    env = make_env(args.generator, args.record, moves)
+    legal_actions = GENERATORS[args.generator].legal_actions
+    if args.divide:
+        started = time.perf_counter()
+        counts = divide(env, args.depth, legal_actions)
+        for index, count in sorted(counts.items()):
+            print(f"{index:>4} {env.index_to_action(index)}: {count:,}")
+        print(f"total {sum(counts.values()):,} in {time.perf_counter() - started:.2f} s")
+        return
+    print(format_perft(run_perft(env, args.depth, legal_actions), args.generator))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""
+Quantization Report Module for Nine Men's Morris
+Agreement of the dynamic INT8 network with the float model
+
+Usage:
+    python quantize.py "Model 1.pt" --positions 2000 --games 100
+"""
+
+import io
+import time
+import argparse
+
+import numpy as np
+import torch
+
+from typing import Dict, Tuple
+
+from game import NineMensMorrisEnv
+from model import load_model, get_ai_move, get_ai_capture
+
+
+def sample_positions(num_positions: int, seed: int = 0) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Observations and legal-action masks from random self-play"""
+    rng = np.random.default_rng(seed)
+    env = NineMensMorrisEnv(history=None)
+    states, masks = [], []
+    while len(states) < num_positions:
+        actions = env.get_valid_action_indices()
+        if len(actions) == 0:
+            env.reset()
+            continue
+        states.append(env.get_state())
+        masks.append(env.get_valid_action_mask() > 0)
+        _, _, done, _ = env.step(env.index_to_action(int(rng.choice(actions))))
+        if done:
+            env.reset()
+    return torch.from_numpy(np.stack(states)), torch.from_numpy(np.stack(masks))
+
+
+def agreement(reference, candidate, states: torch.Tensor, masks: torch.Tensor) -> Dict[str, float]:
+    """Top-1 legal-move agreement and value error of `candidate` against `reference`"""
+    with torch.no_grad():
+        ref_logits, ref_value = reference(states)
+        logits, value = candidate(states)
+    ref_logits = ref_logits.masked_fill(~masks, -float('inf'))
+    logits = logits.masked_fill(~masks, -float('inf'))
+    ref_probs = torch.softmax(ref_logits, dim=1)
+    probs = torch.softmax(logits, dim=1)
+    return {
+        'top1_agreement': float((ref_logits.argmax(dim=1) == logits.argmax(dim=1)).float().mean()),
+        'policy_total_variation': float(0.5 * (ref_probs - probs).abs().sum(dim=1).mean()),
+        'value_mae': float((ref_value - value).abs().mean())
+    }
+
+
+def play_game(model_a, model_b, device: torch.device) -> int:
+    """One game with model_a as player 1; returns the winner (1, -1 or 0)"""
+    env = NineMensMorrisEnv(history=None)
+    done = False
+    while not done:
+        model = model_a if env.current_player == 1 else model_b
+        _, _, done, info = env.step(get_ai_move(model, env, device))
+        if info.get('needs_capture', False):
+            _, _, done, _ = env.step(get_ai_capture(model, env, device))
+    return env.winner
+
+
+def head_to_head(candidate, reference, games: int, device: torch.device, seed: int = 0) -> Dict[str, float]:
+    """Score of `candidate` against `reference`, alternating colours"""
+    torch.manual_seed(seed)
+    wins = draws = losses = 0
+    for game in range(games):
+        colour = 1 if game % 2 == 0 else -1
+        first, second = (candidate, reference) if colour == 1 else (reference, candidate)
+        winner = play_game(first, second, device)
+        if winner == 0:
+            draws += 1
+        elif winner == colour:
+            wins += 1
+        else:
+            losses += 1
+    return {
+        'wins': wins, 'draws': draws, 'losses': losses,
+        'score': (wins + 0.5 * draws) / games if games else 0.0
+    }
+
+
+def weight_bytes(model) -> int:
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return len(buffer.getvalue())
+
+
+def latency_ms(model, state: torch.Tensor, iterations: int = 300) -> float:
+    with torch.no_grad():
+        for _ in range(10):
+            model(state)
+        started = time.perf_counter()
+        for _ in range(iterations):
+            model(state)
+    return (time.perf_counter() - started) / iterations * 1000.0
+
+
+def report(path: str, positions: int, games: int, seed: int = 0):
+    device = torch.device('cpu')
+    reference = load_model(path, device, optimized=False)
+    quantized = load_model(path, device, quantized=True)
+
+    states, masks = sample_positions(positions, seed)
+    stats = agreement(reference, quantized, states, masks)
+    print(f"{path}")
+    print(f"  Positions:            {positions}")
+    print(f"  Top-1 legal agreement: {stats['top1_agreement']:.1%}")
+    print(f"  Policy TV distance:   {stats['policy_total_variation']:.4f}")
+    print(f"  Value MAE:            {stats['value_mae']:.5f}")
+    print(f"  Weights:              {weight_bytes(reference) / 2**20:.1f} MB float -> "
+          f"{weight_bytes(quantized) / 2**20:.1f} MB int8")
+    print(f"  Latency (batch 1):    {latency_ms(reference, states[:1]):.3f} ms float -> "
+          f"{latency_ms(quantized, states[:1]):.3f} ms int8")
+    if games > 0:
+        score = head_to_head(quantized, reference, games, device, seed)
+        print(f"  Head-to-head (int8 vs float, {games} games): "
+              f"+{score['wins']} ={score['draws']} -{score['losses']}, score {score['score']:.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Agreement report for the INT8 quantized network")
+    parser.add_argument('checkpoints', nargs='+', help='Checkpoint files (.pt)')
+    parser.add_argument('--positions', type=int, default=2000, help='Sampled positions for agreement')
+    parser.add_argument('--games', type=int, default=100, help='Head-to-head games (0 to skip)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    torch.set_grad_enabled(False)
+    for path in args.checkpoints:
+        report(path, args.positions, args.games, args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,243 @@
+"""
+Model Registry Module for Nine Men's Morris
+Process-wide cache of loaded networks with memory-mapped weights and content-hash identity
+"""
+
+import os
+import hashlib
+import threading
+
+import torch
+
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from model import NineMensMorrisNet, quantize_model, warm_up
+from weights import flat_weights_path, is_flat_weights, load_flat_weights
+
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def checkpoint_hash(path: str) -> str:
+    """SHA-256 of the checkpoint file contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _torch_load(path: str, device: torch.device, weights_only: bool):
+    # mmap needs the zipfile checkpoint format (torch >= 1.6 default); older files load normally
+    try:
+        return torch.load(path, map_location=device, weights_only=weights_only, mmap=True)
+    except RuntimeError:
+        return torch.load(path, map_location=device, weights_only=weights_only)
+
+
+def read_state_dict(path: str, device: torch.device, prefer_flat: bool = True) -> Dict[str, torch.Tensor]:
+    """
+    State dict of a checkpoint in any of the supported formats:
+    a {'model_state_dict': ...} training checkpoint, a bare state dict,
+    a pickled NineMensMorrisNet, or flat weights (weights.py). Tensors stay
+    memory-mapped on CPU. With prefer_flat, flat weights converted next to
+    the checkpoint are read instead when they are at least as new.
+    """
+    if is_flat_weights(path):
+        return _to_device(load_flat_weights(path), device)
+    flat_path = flat_weights_path(path)
+    if prefer_flat and os.path.exists(flat_path) and os.path.getmtime(flat_path) >= os.path.getmtime(path):
+        return _to_device(load_flat_weights(flat_path), device)
+
+    try:
+        loaded = _torch_load(path, device, weights_only=True)
+    except Exception:
+        # Pickled full models need the unrestricted unpickler (trusted local files only)
+        loaded = _torch_load(path, device, weights_only=False)
+
+    if isinstance(loaded, NineMensMorrisNet):
+        return loaded.state_dict()
+    if isinstance(loaded, dict):
+        # Check if it's a state dict or checkpoint
+        if 'model_state_dict' in loaded:
+            return loaded['model_state_dict']
+        return loaded
+    raise ValueError(f"Unrecognized checkpoint format in {path}: {type(loaded).__name__}")
+
+
+def _to_device(state_dict: Dict[str, torch.Tensor], device: torch.device) -> Dict[str, torch.Tensor]:
+    if device.type == 'cpu':
+        return state_dict
+    return {name: tensor.to(device) for name, tensor in state_dict.items()}
+
+
+def build_model(state_dict: Dict[str, torch.Tensor], device: torch.device) -> NineMensMorrisNet:
+    """Network whose parameters are the state dict's tensors (no copy, so mmap pages stay shared)"""
+    with torch.device('meta'):
+        model = NineMensMorrisNet()
+    model.load_state_dict(state_dict, assign=True)
+    model.to(device)
+    model.eval()
+    model.requires_grad_(False)
+    return model
+
+
+def _sidecar_paths(path: str, script: bool) -> Tuple[str, ...]:
+    """Files next to a checkpoint that _load may read instead: flat weights, and the TorchScript artifact"""
+    from export import optimized_artifact_path
+    paths = (flat_weights_path(path), optimized_artifact_path(path)) if script else (flat_weights_path(path),)
+    return tuple(p for p in paths if os.path.realpath(p) != os.path.realpath(path))
+
+
+def _artifact_stamp(path: str, script: bool) -> Tuple:
+    """
+    (mtime_ns, size) of the checkpoint and of each sidecar file (None when
+    it does not exist); `script` includes the TorchScript artifact
+    """
+    stat = os.stat(path)
+    stamp = [(stat.st_mtime_ns, stat.st_size)]
+    for sidecar in _sidecar_paths(path, script):
+        if os.path.exists(sidecar):
+            sidecar_stat = os.stat(sidecar)
+            stamp.append((sidecar_stat.st_mtime_ns, sidecar_stat.st_size))
+        else:
+            stamp.append(None)
+    return tuple(stamp)
+
+
+def _artifact_hash(path: str, script: bool) -> str:
+    """Checkpoint hash, combined with the hashes of the sidecar files that exist"""
+    hashes = [checkpoint_hash(path)]
+    hashes += [checkpoint_hash(p) for p in _sidecar_paths(path, script) if os.path.exists(p)]
+    return '+'.join(hashes)
+
+
+class _Entry(NamedTuple):
+    content_hash: str
+    stamp: Tuple
+    model: torch.nn.Module
+
+
+class ModelRegistry:
+    """
+    Loads each checkpoint once per process and hands the same read-only
+    model to every caller (Streamlit sessions, worker threads).
+
+    Models are identified by the SHA-256 of the checkpoint (and of the flat
+    weights and TorchScript artifact next to it), so identical files share
+    one model. get() re-checks the size and mtime of those files; when one
+    changed, the new model is built first and then swapped in under the
+    lock, so callers see either the old or the new model, never a partially
+    loaded one. Newly loaded models are warmed up (model.warm_up) once,
+    before they are handed out, unless get() is called with warm=False.
+    Forked workers inherit the mapped weights.
+
+    Weights are mapped from the checkpoint file, so replace checkpoints
+    atomically (write a temporary file, then os.replace) rather than
+    rewriting them in place.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._entries: Dict[Tuple[str, str, bool, bool], _Entry] = {}
+        self._by_hash: Dict[Tuple[str, str, bool, bool], torch.nn.Module] = {}
+
+    def get(self, path: str, device: torch.device, optimized: bool = True,
+            quantized: bool = False, warm: bool = True) -> torch.nn.Module:
+        """
+        Shared model for a checkpoint, reloaded if the file changed since the
+        last call. If the file disappears, the model already loaded for it is
+        returned (FileNotFoundError only when there is none).
+        """
+        key = (os.path.realpath(path), str(device), optimized, quantized)
+        # The TorchScript artifact is only read by the optimized CPU path
+        script = optimized and not quantized and device.type == 'cpu'
+        entry = self._entries.get(key)
+        try:
+            stamp = _artifact_stamp(path, script)
+        except OSError:
+            if entry is None:
+                raise
+            # Renamed or removed mid-session: keep serving the loaded model
+            return entry.model
+        if entry is not None and entry.stamp == stamp:
+            return entry.model
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.stamp == stamp:
+                return entry.model
+            try:
+                content_hash = _artifact_hash(path, script)
+            except OSError:
+                if entry is None:
+                    raise
+                return entry.model
+            hash_key = (content_hash,) + key[1:]
+            model = self._by_hash.get(hash_key)
+            if model is None:
+                try:
+                    model = self._load(path, device, optimized, quantized)
+                except Exception:
+                    if entry is None:
+                        raise
+                    # Half-written file: keep serving the old model and retry on the next call
+                    return entry.model
+                if warm:
+                    warm_up(model, device)
+                self._by_hash[hash_key] = model
+            self._entries[key] = _Entry(content_hash, stamp, model)
+            self._drop_unreferenced()
+            return model
+
+    def _drop_unreferenced(self):
+        live = {(entry.content_hash,) + key[1:] for key, entry in self._entries.items()}
+        for hash_key in [k for k in self._by_hash if k not in live]:
+            del self._by_hash[hash_key]
+
+    def _load(self, path: str, device: torch.device, optimized: bool, quantized: bool) -> torch.nn.Module:
+        if quantized:
+            if device.type != 'cpu':
+                raise ValueError("Quantized models run on CPU only")
+            return quantize_model(build_model(read_state_dict(path, device), device))
+        if optimized and device.type == 'cpu':
+            from export import optimized_artifact_path, load_torchscript
+            script_path = optimized_artifact_path(path)
+            if os.path.exists(script_path) and os.path.getmtime(script_path) >= os.path.getmtime(path):
+                try:
+                    return load_torchscript(script_path, device)
+                except Exception as e:
+                    # e.g. exported by another torch version: fall back to the eager model, as load_model does
+                    print(f"Error loading optimized model {script_path}: {e}")
+        return build_model(read_state_dict(path, device), device)
+
+    def content_hash(self, path: str) -> Optional[str]:
+        """Hash of the currently loaded version of a checkpoint, if any"""
+        realpath = os.path.realpath(path)
+        for key, entry in self._entries.items():
+            if key[0] == realpath:
+                return entry.content_hash
+        return None
+
+    def refresh(self):
+        """Reload every registered checkpoint whose file changed"""
+        for path, device, optimized, quantized in list(self._entries):
+            if os.path.exists(path):
+                self.get(path, torch.device(device), optimized, quantized)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_hash.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Shared by every session and thread in the process
+REGISTRY = ModelRegistry()
+
+
+def get_model(path: str, device: torch.device, optimized: bool = True,
+              quantized: bool = False, warm: bool = True) -> torch.nn.Module:
+    """REGISTRY.get: the process-wide shared model for a checkpoint"""
+    return REGISTRY.get(path, device, optimized, quantized, warm)
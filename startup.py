@@ -0,0 +1,85 @@
+"""
+Startup Timing Module for Nine Men's Morris
+Records where cold-start time goes: imports, model loading, warm-up and the first move
+
+Usage:
+    python startup.py "Model 1.pt" "Model 2.pt"
+"""
+
+import time
+import argparse
+import contextlib
+
+from typing import List, Tuple
+
+
+class StartupTimer:
+    """Named, ordered durations of the cold-start phases"""
+
+    def __init__(self):
+        self.phases: List[Tuple[str, float]] = []
+        self._recorded = set()
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        """Time a block; each name is recorded once (later reruns are not startup)"""
+        began = time.perf_counter()
+        try:
+            yield
+        finally:
+            if name not in self._recorded:
+                self._recorded.add(name)
+                self.phases.append((name, time.perf_counter() - began))
+
+    def total(self) -> float:
+        return sum(seconds for _, seconds in self.phases)
+
+    def report(self) -> str:
+        width = max([len(name) for name, _ in self.phases] + [5])
+        total = self.total()
+        lines = [f"{'phase':<{width}}  {'ms':>9}  {'share':>6}"]
+        for name, seconds in self.phases:
+            share = seconds / total if total else 0.0
+            lines.append(f"{name:<{width}}  {seconds * 1000:>9.1f}  {share:>6.1%}")
+        lines.append(f"{'total':<{width}}  {total * 1000:>9.1f}")
+        return "\n".join(lines)
+
+
+# Process-wide timer, shared by the app and the CLI
+STARTUP = StartupTimer()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the cold start of the AI players")
+    parser.add_argument('checkpoints', nargs='+', help='Checkpoints (.pt or flat .nmw weights)')
+    parser.add_argument('--no-warm-up', action='store_true')
+    args = parser.parse_args()
+
+    with STARTUP.phase('import numpy'):
+        import numpy  # noqa: F401
+    with STARTUP.phase('import torch'):
+        import torch
+    with STARTUP.phase('import PIL'):
+        import PIL.Image  # noqa: F401
+    with STARTUP.phase('import game modules'):
+        from game import NineMensMorrisEnv
+        from model import get_ai_move, warm_up
+        from registry import get_model
+
+    device = torch.device('cpu')
+    models = []
+    for path in args.checkpoints:
+        with STARTUP.phase(f'load {path}'):
+            # Warm-up is timed as its own phase below
+            models.append(get_model(path, device, warm=False))
+    if not args.no_warm_up:
+        with STARTUP.phase('warm-up'):
+            for model in models:
+                warm_up(model, device)
+    with STARTUP.phase('first move'):
+        get_ai_move(models[0], NineMensMorrisEnv(), device)
+    print(STARTUP.report())
+
+
+if __name__ == '__main__':
+    main()
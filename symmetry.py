@@ -0,0 +1,184 @@
+"""
+Board Symmetries for Nine Men's Morris
+The 16 automorphisms of the 24 board points: the D4 rotations and reflections
+of the square, each optionally combined with swapping the inner and outer squares
+"""
+
+import numpy as np
+
+from game import NineMensMorrisEnv
+
+# Position mapping on the 7x7 grid (same layout as board.get_position_coords)
+POSITION_GRID = {
+    0: (0, 0), 1: (3, 0), 2: (6, 0),
+    3: (1, 1), 4: (3, 1), 5: (5, 1),
+    6: (2, 2), 7: (3, 2), 8: (4, 2),
+    9: (0, 3), 10: (1, 3), 11: (2, 3),
+    12: (4, 3), 13: (5, 3), 14: (6, 3),
+    15: (2, 4), 16: (3, 4), 17: (4, 4),
+    18: (1, 5), 19: (3, 5), 20: (5, 5),
+    21: (0, 6), 22: (3, 6), 23: (6, 6)
+}
+
+NUM_SYMMETRIES = 16
+
+# D4 acting on grid coordinates centred on (3, 3)
+_D4 = (
+    lambda a, b: (a, b),
+    lambda a, b: (-b, a),
+    lambda a, b: (-a, -b),
+    lambda a, b: (b, -a),
+    lambda a, b: (-a, b),
+    lambda a, b: (a, -b),
+    lambda a, b: (b, a),
+    lambda a, b: (-b, -a),
+)
+
+
+def _swap_rings(a: int, b: int):
+    """Exchange the outer (ring 3) and inner (ring 1) squares, keeping the middle one"""
+    ring = max(abs(a), abs(b))
+    if ring == 3:
+        return a // 3, b // 3
+    if ring == 1:
+        return a * 3, b * 3
+    return a, b
+
+
+def _build_symmetries() -> np.ndarray:
+    coords_to_pos = {coords: pos for pos, coords in POSITION_GRID.items()}
+    perms = []
+    for swap in (False, True):
+        for transform in _D4:
+            perm = []
+            for pos in range(NineMensMorrisEnv.BOARD_POSITIONS):
+                x, y = POSITION_GRID[pos]
+                a, b = x - 3, y - 3
+                if swap:
+                    a, b = _swap_rings(a, b)
+                a, b = transform(a, b)
+                perm.append(coords_to_pos[(a + 3, b + 3)])
+            perms.append(perm)
+    return np.array(perms, dtype=np.intp)
+
+
+# SYMMETRIES[s, pos] is the image of `pos` under symmetry s (s=0 is the identity)
+SYMMETRIES = _build_symmetries()
+INVERSE_SYMMETRIES = np.argsort(SYMMETRIES, axis=1)
+
+
+def _check_automorphisms():
+    mills = {frozenset(mill) for mill in NineMensMorrisEnv.MILLS}
+    edges = {
+        frozenset((a, b))
+        for a, neighbors in NineMensMorrisEnv.ADJACENCY.items()
+        for b in neighbors
+    }
+    for perm in SYMMETRIES:
+        if {frozenset(perm[p] for p in mill) for mill in mills} != mills:
+            raise AssertionError(f"Symmetry {perm.tolist()} does not preserve MILLS")
+        if {frozenset(perm[p] for p in edge) for edge in edges} != edges:
+            raise AssertionError(f"Symmetry {perm.tolist()} does not preserve ADJACENCY")
+
+
+_check_automorphisms()
+
+
+def transform_board(board: np.ndarray, symmetry: int) -> np.ndarray:
+    """Board array (..., 24) seen through a symmetry: out[..., image(p)] = board[..., p]"""
+    return np.asarray(board)[..., INVERSE_SYMMETRIES[symmetry]]
+
+
+def _build_action_symmetries() -> np.ndarray:
+    env = NineMensMorrisEnv
+    size = env.BOARD_POSITIONS
+    tables = np.empty((NUM_SYMMETRIES, env.ACTION_SPACE_SIZE), dtype=np.intp)
+    for s, perm in enumerate(SYMMETRIES):
+        tables[s, env.ACTION_PLACEMENT_START:env.ACTION_MOVEMENT_START] = env.ACTION_PLACEMENT_START + perm
+        tables[s, env.ACTION_MOVEMENT_START:env.ACTION_CAPTURE_START] = (
+            env.ACTION_MOVEMENT_START + (perm[:, None] * size + perm[None, :]).ravel()
+        )
+        tables[s, env.ACTION_CAPTURE_START:] = env.ACTION_CAPTURE_START + perm
+    return tables
+
+
+# ACTION_SYMMETRIES[s, a] is the image of action index `a` under symmetry s
+ACTION_SYMMETRIES = _build_action_symmetries()
+INVERSE_ACTION_SYMMETRIES = np.argsort(ACTION_SYMMETRIES, axis=1)
+
+
+def _symmetry_ids(symmetries, batch_size: int) -> np.ndarray:
+    ids = np.asarray(symmetries, dtype=np.intp)
+    return np.broadcast_to(ids, (batch_size,))
+
+
+def _gather_last(values, index: np.ndarray):
+    """values[..., index] along the last axis with a per-row index, for NumPy arrays or torch tensors"""
+    if isinstance(values, np.ndarray):
+        return np.take_along_axis(values, np.broadcast_to(index, values.shape), axis=-1)
+    import torch
+    index = torch.from_numpy(np.ascontiguousarray(index)).to(values.device)
+    return values.gather(-1, index.expand(values.shape))
+
+
+def transform_states(states, symmetries):
+    """
+    Apply symmetries to a batch of observations in one gather.
+
+    Args:
+        states: (N, 7, 24) NumPy array or torch tensor in the get_state layout
+        symmetries: symmetry index, or (N,) indices, one per observation
+
+    Returns:
+        (N, 7, 24) transformed observations of the same type
+    """
+    ids = _symmetry_ids(symmetries, states.shape[0])
+    return _gather_last(states, INVERSE_SYMMETRIES[ids][:, None, :])
+
+
+def transform_action_values(values, symmetries):
+    """
+    Apply symmetries to per-action values (masks, logits or policies).
+
+    Args:
+        values: (N, 624) NumPy array or torch tensor
+        symmetries: symmetry index, or (N,) indices, one per row
+
+    Returns:
+        (N, 624) values where out[n, ACTION_SYMMETRIES[s_n, a]] = values[n, a]
+    """
+    ids = _symmetry_ids(symmetries, values.shape[0])
+    return _gather_last(values, INVERSE_ACTION_SYMMETRIES[ids])
+
+
+def untransform_action_values(values, symmetries):
+    """Inverse of transform_action_values: bring per-action values back to the original board"""
+    ids = _symmetry_ids(symmetries, values.shape[0])
+    return _gather_last(values, ACTION_SYMMETRIES[ids])
+
+
+def transform_action_indices(indices, symmetries) -> np.ndarray:
+    """Map action indices through symmetries (broadcasting indices against symmetries)"""
+    return ACTION_SYMMETRIES[np.asarray(symmetries, dtype=np.intp), np.asarray(indices, dtype=np.intp)]
+
+
+def augment(states, action_values):
+    """
+    All 16 symmetric variants of a batch, for training-data augmentation.
+
+    Args:
+        states: (N, 7, 24) observations
+        action_values: (N, 624) masks or policy targets
+
+    Returns:
+        (16 * N, 7, 24) states and (16 * N, 624) values, grouped by symmetry
+    """
+    n = states.shape[0]
+    ids = np.repeat(np.arange(NUM_SYMMETRIES), n)
+    if isinstance(states, np.ndarray):
+        tiled_states = np.tile(states, (NUM_SYMMETRIES, 1, 1))
+        tiled_values = np.tile(action_values, (NUM_SYMMETRIES, 1))
+    else:
+        tiled_states = states.repeat(NUM_SYMMETRIES, 1, 1)
+        tiled_values = action_values.repeat(NUM_SYMMETRIES, 1)
+    return transform_states(tiled_states, ids), transform_action_values(tiled_values, ids)
@@ -0,0 +1,596 @@
+"""
+Endgame Tablebase for Nine Men's Morris
+Retrograde analysis of the movement and flying phases, stored in a memory-mapped file
+
+Positions are taken from the point of view of the side to move ("us") and
+indexed by piece counts (us, them). The "us" piece set is reduced by the 16
+board symmetries, the "them" set is ranked among the remaining points.
+A move that forms a mill is combined with its capture into one turn, and
+distances are counted in turns. The 200-move draw of NineMensMorrisEnv is
+not part of the analysis.
+
+Build:
+    python tablebase.py build --max-pieces 4 --workers 8 --output endgame.tb
+"""
+
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import itertools
+import multiprocessing
+
+import numpy as np
+
+from math import comb
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from game import NineMensMorrisEnv
+from symmetry import NUM_SYMMETRIES, SYMMETRIES
+from bitboard import (FULL_MASK, MILL_MASKS, NEIGHBOR_MASKS, POSITION_MILL_MASKS,
+                      bit_positions, bits_from_board, mill_pieces)
+
+BOARD_POSITIONS = NineMensMorrisEnv.BOARD_POSITIONS
+MIN_PIECES = 3
+
+# Result codes (side to move's point of view)
+WIN = 1
+DRAW = 0
+LOSS = -1
+
+# Stored entry: 0 = draw, 1..0x7FFF = win in that many turns, 0x8000 | d = loss in d turns
+_LOSS_FLAG = 0x8000
+_DTE_MASK = 0x7FFF
+_UNREACHED = np.iinfo(np.int32).max
+
+_MAGIC = b'NMMTB001'
+_ALIGNMENT = 64
+
+# _SYMMETRY_BYTES[s, i, v]: image under symmetry s of byte value v at byte i of a mask
+_SYMMETRY_BYTES = np.zeros((NUM_SYMMETRIES, 3, 256), dtype=np.int64)
+for _s in range(NUM_SYMMETRIES):
+    for _i in range(3):
+        for _bit in range(8):
+            _values = np.arange(256)[(np.arange(256) >> _bit) & 1 == 1]
+            _SYMMETRY_BYTES[_s, _i, _values] |= 1 << int(SYMMETRIES[_s, 8 * _i + _bit])
+_SYMMETRY_BYTE_LISTS = _SYMMETRY_BYTES.tolist()
+
+_MILL_MASK_ARRAY = np.array(MILL_MASKS, dtype=np.int64)
+
+
+def _segment_size(us: int, them: int) -> int:
+    return len(canonical_sets(us)) * comb(BOARD_POSITIONS - us, them)
+
+
+# --- Vectorized mask helpers (build) ---
+
+def _apply_symmetry(masks: np.ndarray, symmetries) -> np.ndarray:
+    b0, b1, b2 = masks & 0xFF, (masks >> 8) & 0xFF, masks >> 16
+    return (_SYMMETRY_BYTES[symmetries, 0, b0] | _SYMMETRY_BYTES[symmetries, 1, b1]
+            | _SYMMETRY_BYTES[symmetries, 2, b2])
+
+
+def _canonicalize(masks: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(symmetry, canonical mask) for each mask; the canonical form is the smallest image"""
+    b0, b1, b2 = masks & 0xFF, (masks >> 8) & 0xFF, masks >> 16
+    images = _SYMMETRY_BYTES[:, 0, b0] | _SYMMETRY_BYTES[:, 1, b1] | _SYMMETRY_BYTES[:, 2, b2]
+    symmetry = images.argmin(axis=0)
+    return symmetry, images[symmetry, np.arange(len(masks))]
+
+
+@lru_cache(maxsize=None)
+def _binomials() -> np.ndarray:
+    table = np.zeros((BOARD_POSITIONS + 1, BOARD_POSITIONS + 1), dtype=np.int64)
+    for n in range(BOARD_POSITIONS + 1):
+        for k in range(n + 1):
+            table[n, k] = comb(n, k)
+    return table
+
+
+def _compressed_rank(masks: np.ndarray, removed: np.ndarray) -> np.ndarray:
+    """Colex rank of each mask among the points not in `removed`"""
+    binomials = _binomials()
+    rank = np.zeros(len(masks), dtype=np.int64)
+    below = np.zeros(len(masks), dtype=np.int64)
+    count = np.zeros(len(masks), dtype=np.int64)
+    for pos in range(BOARD_POSITIONS):
+        bit = (masks >> pos) & 1 == 1
+        count += bit
+        rank += np.where(bit, binomials[pos - below, count], 0)
+        below += (removed >> pos) & 1
+    return rank
+
+
+@lru_cache(maxsize=None)
+def canonical_sets(count: int) -> np.ndarray:
+    """Sorted canonical masks of all `count`-piece sets"""
+    masks = np.array(
+        [sum(1 << p for p in combo) for combo in itertools.combinations(range(BOARD_POSITIONS), count)],
+        dtype=np.int64
+    )
+    _, canonical = _canonicalize(masks)
+    return np.unique(canonical)
+
+
+@lru_cache(maxsize=None)
+def _subset_masks(points: int, count: int) -> np.ndarray:
+    """All `count`-subsets of `points` points as masks, in colex (ascending) order"""
+    masks = np.array(
+        [sum(1 << p for p in combo) for combo in itertools.combinations(range(points), count)],
+        dtype=np.int64
+    )
+    return np.sort(masks)
+
+
+def _position_index(us: np.ndarray, them: np.ndarray, us_count: int, them_count: int) -> np.ndarray:
+    """Index of (us, them) positions within segment (us_count, them_count)"""
+    symmetry, rep = _canonicalize(us)
+    rep_index = np.searchsorted(canonical_sets(us_count), rep)
+    them_rank = _compressed_rank(_apply_symmetry(them, symmetry), rep)
+    return rep_index * comb(BOARD_POSITIONS - us_count, them_count) + them_rank
+
+
+def _segment_positions(us_count: int, them_count: int, rep_start: int, rep_end: int):
+    """(us, them) masks of the positions of a segment for a range of canonical sets, in index order"""
+    subsets = _subset_masks(BOARD_POSITIONS - us_count, them_count)
+    reps = canonical_sets(us_count)[rep_start:rep_end]
+    us = np.repeat(reps, len(subsets))
+    them = np.zeros(len(us), dtype=np.int64)
+    for r, rep in enumerate(reps.tolist()):
+        free = [p for p in range(BOARD_POSITIONS) if not rep >> p & 1]
+        block = np.zeros(len(subsets), dtype=np.int64)
+        for i, pos in enumerate(free):
+            block |= ((subsets >> i) & 1) << pos
+        them[r * len(subsets):(r + 1) * len(subsets)] = block
+    return us, them
+
+
+def _mill_pieces_array(masks: np.ndarray) -> np.ndarray:
+    complete = (masks[:, None] & _MILL_MASK_ARRAY) == _MILL_MASK_ARRAY
+    return np.bitwise_or.reduce(np.where(complete, _MILL_MASK_ARRAY, 0), axis=1)
+
+
+def _decode(codes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    codes = codes.astype(np.int64)
+    result = np.where(codes == 0, DRAW, np.where(codes & _LOSS_FLAG, LOSS, WIN))
+    return result, codes & _DTE_MASK
+
+
+# --- Build ---
+
+def _expand_chunk(task):
+    """
+    Successors of the positions of one segment for a range of canonical sets.
+
+    Non-capturing moves stay inside the group being solved and are returned as
+    edges. Captures lead to already-solved smaller segments (or win outright)
+    and are folded into per-position fixed bounds.
+    """
+    us_count, them_count, rep_start, rep_end, lower_dir = task
+    us, them = _segment_positions(us_count, them_count, rep_start, rep_end)
+    first_row = rep_start * comb(BOARD_POSITIONS - us_count, them_count)
+    n = len(us)
+    rows = np.arange(n)
+
+    empty = FULL_MASK & ~(us | them)
+    capturable = them & ~_mill_pieces_array(them)
+    capturable = np.where(capturable == 0, them, capturable)
+    flying = us_count == MIN_PIECES
+
+    lower = None
+    if them_count - 1 >= MIN_PIECES:
+        lower = np.load(os.path.join(lower_dir, f'{them_count - 1}_{us_count}.npy'), mmap_mode='r')
+
+    fixed_win = np.full(n, _UNREACHED, dtype=np.int32)
+    fixed_loss = np.zeros(n, dtype=np.int32)
+    fixed_draw = np.zeros(n, dtype=bool)
+    num_moves = np.zeros(n, dtype=np.int32)
+    edge_rows, edge_succ = [], []
+
+    for from_pos in range(BOARD_POSITIONS):
+        has_piece = (us >> from_pos) & 1 == 1
+        if not has_piece.any():
+            continue
+        targets = range(BOARD_POSITIONS) if flying else bit_positions(NEIGHBOR_MASKS[from_pos])
+        for to_pos in targets:
+            sel = rows[has_piece & ((empty >> to_pos) & 1 == 1)]
+            if len(sel) == 0:
+                continue
+            num_moves[sel] += 1
+            new_us = us[sel] ^ ((1 << from_pos) | (1 << to_pos))
+            formed = np.zeros(len(sel), dtype=bool)
+            for mask in POSITION_MILL_MASKS[to_pos]:
+                formed |= (new_us & mask) == mask
+
+            plain = ~formed
+            if plain.any():
+                edge_rows.append(sel[plain])
+                edge_succ.append(_position_index(them[sel[plain]], new_us[plain], them_count, us_count))
+
+            if not formed.any():
+                continue
+            mill_rows = sel[formed]
+            if lower is None:
+                # Any capture leaves the opponent with fewer than three pieces
+                fixed_win[mill_rows] = 1
+                continue
+            mill_us = new_us[formed]
+            for cap_pos in range(BOARD_POSITIONS):
+                can = (capturable[mill_rows] >> cap_pos) & 1 == 1
+                if not can.any():
+                    continue
+                cap_rows = mill_rows[can]
+                succ = _position_index(them[cap_rows] ^ (1 << cap_pos), mill_us[can],
+                                       them_count - 1, us_count)
+                result, dte = _decode(np.asarray(lower[succ]))
+                wins = result == LOSS
+                np.minimum.at(fixed_win, cap_rows[wins], (dte[wins] + 1).astype(np.int32))
+                losses = result == WIN
+                np.maximum.at(fixed_loss, cap_rows[losses], (dte[losses] + 1).astype(np.int32))
+                fixed_draw[cap_rows[result == DRAW]] = True
+
+    if edge_rows:
+        edge_rows = np.concatenate(edge_rows).astype(np.int32) + first_row
+        edge_succ = np.concatenate(edge_succ).astype(np.int32)
+    else:
+        edge_rows = np.zeros(0, dtype=np.int64)
+        edge_succ = np.zeros(0, dtype=np.int64)
+    return first_row, edge_rows, edge_succ, fixed_win, fixed_loss, fixed_draw, num_moves
+
+
+def _solve_group(segments: List[Tuple[int, int]], lower_dir: str, pool, chunk_reps: int,
+                 log) -> Dict[Tuple[int, int], np.ndarray]:
+    """Solve segments that reach each other by non-capturing moves: (w, b) and (b, w)"""
+    offsets = {}
+    total = 0
+    for seg in segments:
+        offsets[seg] = total
+        total += _segment_size(*seg)
+
+    fixed_win = np.full(total, _UNREACHED, dtype=np.int32)
+    fixed_loss = np.zeros(total, dtype=np.int32)
+    fixed_draw = np.zeros(total, dtype=bool)
+    num_moves = np.zeros(total, dtype=np.int32)
+    edge_rows, edge_succ = [], []
+
+    tasks = []
+    for us_count, them_count in segments:
+        num_reps = len(canonical_sets(us_count))
+        for start in range(0, num_reps, chunk_reps):
+            tasks.append((us_count, them_count, start, min(start + chunk_reps, num_reps), lower_dir))
+
+    started = time.perf_counter()
+    for task, chunk in zip(tasks, pool.imap(_expand_chunk, tasks)):
+        us_count, them_count = task[:2]
+        base = offsets[us_count, them_count]
+        first_row, rows, succ, c_win, c_loss, c_draw, c_moves = chunk
+        span = slice(base + first_row, base + first_row + len(c_win))
+        fixed_win[span] = c_win
+        fixed_loss[span] = c_loss
+        fixed_draw[span] = c_draw
+        num_moves[span] = c_moves
+        edge_rows.append(rows + base)
+        edge_succ.append(succ + offsets[them_count, us_count])
+    rows = np.concatenate(edge_rows).astype(np.int32)
+    succ = np.concatenate(edge_succ).astype(np.int32)
+    log(f"  {segments}: {total} positions, {len(rows)} edges, "
+        f"expanded in {time.perf_counter() - started:.1f}s")
+
+    # result: 0 unresolved, 1 win, -1 loss; dte in turns
+    result = np.zeros(total, dtype=np.int8)
+    dte = np.zeros(total, dtype=np.int32)
+    blocked = num_moves == 0
+    result[blocked] = LOSS
+
+    last_fixed = int(fixed_win[fixed_win < _UNREACHED].max(initial=0))
+    last_fixed = max(last_fixed, int(fixed_loss.max(initial=0)))
+    # Successors that are not yet wins for the opponent, per position
+    open_moves = np.bincount(rows, minlength=total).astype(np.int64)
+
+    started = time.perf_counter()
+    turns = 1
+    while True:
+        succ_result = result[succ]
+        new_loss_succ = (succ_result == LOSS) & (dte[succ] == turns - 1)
+        unresolved = result == 0
+
+        win = np.zeros(total, dtype=bool)
+        win[rows[new_loss_succ]] = True
+        win |= fixed_win == turns
+        win &= unresolved
+
+        new_win_succ = (succ_result == WIN) & (dte[succ] == turns - 1)
+        open_moves -= np.bincount(rows[new_win_succ], minlength=total)
+        loss = unresolved & ~win & (open_moves == 0) & ~fixed_draw & (fixed_win == _UNREACHED)
+        loss &= fixed_loss <= turns
+        loss &= ~blocked
+
+        result[win] = WIN
+        result[loss] = LOSS
+        dte[win | loss] = turns
+
+        if not (win.any() or loss.any()) and turns > last_fixed:
+            break
+
+        # Drop the edges of resolved positions once in a while
+        if turns % 4 == 0:
+            keep = result[rows] == 0
+            rows = rows[keep]
+            succ = succ[keep]
+        turns += 1
+
+    log(f"  solved in {turns} turns ({time.perf_counter() - started:.1f}s): "
+        f"{int((result == WIN).sum())} wins, {int((result == LOSS).sum())} losses, "
+        f"{int((result == 0).sum())} draws")
+
+    codes = np.where(result == WIN, dte, np.where(result == LOSS, _LOSS_FLAG | dte, 0)).astype('<u2')
+    return {seg: codes[offsets[seg]:offsets[seg] + _segment_size(*seg)] for seg in segments}
+
+
+def build(output: str, max_pieces: int = 4, workers: Optional[int] = None, chunk_reps: int = 16,
+          verbose: bool = True):
+    """Solve every segment with 3..max_pieces pieces per side and write the tablebase file"""
+    log = print if verbose else (lambda *args: None)
+    workers = workers or os.cpu_count() or 1
+    counts = range(MIN_PIECES, max_pieces + 1)
+    groups = sorted(
+        {tuple(sorted({(w, b), (b, w)})) for w in counts for b in counts},
+        key=lambda group: (sum(group[0]), group)
+    )
+
+    tmp_dir = tempfile.mkdtemp(prefix='nmm_tablebase_')
+    started = time.perf_counter()
+    try:
+        context = multiprocessing.get_context('fork' if os.name == 'posix' else 'spawn')
+        with context.Pool(workers) as pool:
+            for group in groups:
+                for seg, codes in _solve_group(list(group), tmp_dir, pool, chunk_reps, log).items():
+                    np.save(os.path.join(tmp_dir, f'{seg[0]}_{seg[1]}.npy'), codes)
+        _write_file(output, tmp_dir, counts)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    log(f"Tablebase written to {output} in {time.perf_counter() - started:.1f}s")
+
+
+def _write_file(output: str, tmp_dir: str, counts):
+    header = {'version': 1, 'max_pieces': max(counts), 'sets': {}, 'segments': {}}
+    sections = []
+    offset = 0
+    for count in counts:
+        reps = canonical_sets(count).astype('<u4')
+        header['sets'][str(count)] = [offset, len(reps)]
+        sections.append(reps.tobytes())
+        offset += reps.nbytes
+    offset = -(-offset // 2) * 2
+    for w in counts:
+        for b in counts:
+            codes = np.load(os.path.join(tmp_dir, f'{w}_{b}.npy'))
+            header['segments'][f'{w},{b}'] = [offset, len(codes)]
+            sections.append(codes.tobytes())
+            offset += codes.nbytes
+
+    header_bytes = json.dumps(header).encode('utf-8')
+    data_start = -(-(len(_MAGIC) + 8 + len(header_bytes)) // _ALIGNMENT) * _ALIGNMENT
+    tmp_output = output + '.tmp'
+    with open(tmp_output, 'wb') as f:
+        f.write(_MAGIC)
+        f.write(len(header_bytes).to_bytes(8, 'little'))
+        f.write(header_bytes)
+        f.write(b'\0' * (data_start - f.tell()))
+        position = 0
+        for section, (start, _) in zip(sections, _section_layout(header)):
+            f.write(b'\0' * (start - position))
+            f.write(section)
+            position = start + len(section)
+    os.replace(tmp_output, output)
+
+
+def _section_layout(header):
+    layout = [tuple(v) for v in header['sets'].values()]
+    layout += [tuple(v) for v in header['segments'].values()]
+    return layout
+
+
+# --- Lookup ---
+
+class Tablebase:
+    """Read-only, memory-mapped tablebase; lookups touch only the entries they need"""
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            if f.read(len(_MAGIC)) != _MAGIC:
+                raise ValueError(f"{path} is not a Nine Men's Morris tablebase")
+            header_length = int.from_bytes(f.read(8), 'little')
+            header = json.loads(f.read(header_length).decode('utf-8'))
+        data_start = -(-(len(_MAGIC) + 8 + header_length) // _ALIGNMENT) * _ALIGNMENT
+        self.path = path
+        self.max_pieces = header['max_pieces']
+        self._raw = np.memmap(path, dtype=np.uint8, mode='r', offset=data_start)
+        self._sets = {
+            int(count): self._raw[start:start + 4 * length].view('<u4')
+            for count, (start, length) in header['sets'].items()
+        }
+        self._segments = {}
+        for key, (start, length) in header['segments'].items():
+            w, b = (int(v) for v in key.split(','))
+            self._segments[w, b] = self._raw[start:start + 2 * length].view('<u2')
+
+    def covers(self, env) -> bool:
+        """Whether the position is past placement and within the solved piece counts"""
+        if env.winner is not None or env.global_phase == 'placement':
+            return False
+        if env.pieces_in_hand[1] or env.pieces_in_hand[-1]:
+            return False
+        player = env.current_player
+        return (env.pieces_on_board[player], env.pieces_on_board[-player]) in self._segments
+
+    def probe_masks(self, us: int, them: int) -> Optional[Tuple[int, int]]:
+        """(result, turns) for bitboards of the side to move and the opponent"""
+        us_count = bin(us).count('1')
+        them_count = bin(them).count('1')
+        segment = self._segments.get((us_count, them_count))
+        if segment is None:
+            return None
+        images = [
+            table[0][us & 0xFF] | table[1][us >> 8 & 0xFF] | table[2][us >> 16]
+            for table in _SYMMETRY_BYTE_LISTS
+        ]
+        rep = min(images)
+        symmetry = images.index(rep)
+        table = _SYMMETRY_BYTE_LISTS[symmetry]
+        them = table[0][them & 0xFF] | table[1][them >> 8 & 0xFF] | table[2][them >> 16]
+
+        rep_index = int(np.searchsorted(self._sets[us_count], rep))
+        rank = 0
+        count = 0
+        below = 0
+        for pos in range(BOARD_POSITIONS):
+            if rep >> pos & 1:
+                below += 1
+            elif them >> pos & 1:
+                count += 1
+                rank += comb(pos - below, count)
+        code = int(segment[rep_index * comb(BOARD_POSITIONS - us_count, them_count) + rank])
+        if code == 0:
+            return DRAW, 0
+        if code & _LOSS_FLAG:
+            return LOSS, code & _DTE_MASK
+        return WIN, code
+
+    def _successors(self, us: int, them: int, flying: bool):
+        """(move, us after, them after) for every turn of the side to move, one per capture after a mill"""
+        empty = FULL_MASK & ~(us | them)
+        for from_pos in bit_positions(us):
+            targets = empty if flying else NEIGHBOR_MASKS[from_pos] & empty
+            for to_pos in bit_positions(targets):
+                new_us = us ^ (1 << from_pos) ^ (1 << to_pos)
+                action = ('move', from_pos, to_pos)
+                if any(new_us & mask == mask for mask in POSITION_MILL_MASKS[to_pos]):
+                    for cap_pos in bit_positions(_capturable(them)):
+                        yield action, new_us, them ^ (1 << cap_pos)
+                else:
+                    yield action, new_us, them
+
+    def _env_masks(self, env) -> Tuple[int, int]:
+        board = env.board
+        player = env.current_player
+        return bits_from_board(board, player), bits_from_board(board, -player)
+
+    def probe(self, env) -> Optional[Tuple[int, int]]:
+        """
+        (result, turns) for the side to move: result is WIN, DRAW or LOSS and
+        turns the distance to the end with best play. None if not covered.
+        A pending capture is resolved with the best capture.
+        """
+        if not self.covers(env):
+            return None
+        us, them = self._env_masks(env)
+        if not env.pending_capture:
+            return self.probe_masks(us, them)
+        best = None
+        for cap_pos in bit_positions(_capturable(them)):
+            outcome = self._after_turn(us, them ^ (1 << cap_pos))
+            if outcome is not None and (best is None or _better(outcome, best)):
+                best = outcome
+        return best
+
+    def _after_turn(self, us: int, them: int) -> Optional[Tuple[int, int]]:
+        """Outcome for the mover once their turn has produced (us, them)"""
+        if bin(them).count('1') < MIN_PIECES:
+            return WIN, 1
+        reply = self.probe_masks(them, us)
+        if reply is None:
+            return None
+        result, turns = reply
+        return -result, (turns + 1 if result != DRAW else 0)
+
+    def best_action(self, env) -> Optional[Tuple]:
+        """Best move (or capture, when one is pending) for the side to move; None if not covered"""
+        if not self.covers(env):
+            return None
+        us, them = self._env_masks(env)
+        if env.pending_capture:
+            choices = ((('capture', c, None), self._after_turn(us, them ^ (1 << c)))
+                       for c in bit_positions(_capturable(them)))
+        else:
+            flying = env.player_phase[env.current_player] == 'flying'
+            choices = ((action, self._after_turn(new_us, new_them))
+                       for action, new_us, new_them in self._successors(us, them, flying))
+        best_action, best = None, None
+        for action, outcome in choices:
+            if outcome is None:
+                return None
+            if best is None or _better(outcome, best):
+                best_action, best = action, outcome
+        return best_action
+
+    def adjudicate(self, env) -> Optional[int]:
+        """Winner under perfect play (1, -1, or 0 for a draw); None if not covered"""
+        outcome = self.probe(env)
+        if outcome is None:
+            return None
+        result = outcome[0]
+        return 0 if result == DRAW else result * env.current_player
+
+
+def _capturable(them: int) -> int:
+    free = them & ~mill_pieces(them)
+    return free if free else them
+
+
+def _better(a: Tuple[int, int], b: Tuple[int, int]) -> bool:
+    """Whether outcome a is preferable to b: win fastest, lose slowest"""
+    if a[0] != b[0]:
+        return a[0] > b[0]
+    if a[0] == WIN:
+        return a[1] < b[1]
+    if a[0] == LOSS:
+        return a[1] > b[1]
+    return False
+
+
+def get_tablebase_move(tablebase: Tablebase, env) -> Optional[Tuple]:
+    """Perfect-play move from the tablebase, same shape as model.get_ai_move; None if not covered"""
+    if env.pending_capture:
+        return None
+    return tablebase.best_action(env)
+
+
+def get_tablebase_capture(tablebase: Tablebase, env) -> Optional[Tuple]:
+    """Perfect-play capture from the tablebase, same shape as model.get_ai_capture"""
+    if not env.pending_capture:
+        return None
+    return tablebase.best_action(env)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Nine Men's Morris endgame tablebase")
+    sub = parser.add_subparsers(dest='command', required=True)
+    build_parser = sub.add_parser('build', help='Run the retrograde analysis and write the tablebase')
+    build_parser.add_argument('--output', default='endgame.tb')
+    build_parser.add_argument('--max-pieces', type=int, default=4,
+                              help='Largest number of pieces per side to solve (3-9)')
+    build_parser.add_argument('--workers', type=int, default=None)
+    build_parser.add_argument('--chunk-reps', type=int, default=16,
+                              help='Canonical piece sets per worker task')
+    info_parser = sub.add_parser('info', help='Print the segments of a tablebase')
+    info_parser.add_argument('path')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        if not MIN_PIECES <= args.max_pieces <= NineMensMorrisEnv.PIECES_PER_PLAYER:
+            parser.error('--max-pieces must be between 3 and 9')
+        build(args.output, args.max_pieces, args.workers, args.chunk_reps)
+    else:
+        tablebase = Tablebase(args.path)
+        for (w, b), codes in sorted(tablebase._segments.items()):
+            result, _ = _decode(np.asarray(codes))
+            print(f"{w} vs {b}: {len(codes)} positions, {int((result == WIN).sum())} wins, "
+                  f"{int((result == LOSS).sum())} losses, {int((result == DRAW).sum())} draws")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,367 @@
+"""
+PPO Training Module for Nine Men's Morris
+Self-play PPO on VecNineMensMorrisEnv with a preallocated rollout buffer
+
+One network plays both sides. Every step is stored from the point of view
+of the player who acted, and the value head predicts the return of the
+player to move. GAE therefore negates the bootstrap whenever the turn
+passes to the opponent and keeps it across the capture sub-turn, where the
+same player moves again. Losses use the 624-action legal masks, so illegal
+actions get no probability mass.
+
+Checkpoints are written as {'model_state_dict': ...} (what load_model and
+the registry read) through a temporary file and os.replace, so a running
+app or arena picks them up without seeing a half-written file.
+
+Usage:
+    python train.py --output "Model 1.pt" --num-envs 256 --threads 8 --updates 2000
+    python train.py --init "Model 1.pt" --output "Model 1.pt" --updates 500
+"""
+
+import os
+import time
+import argparse
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+from typing import Dict, Optional
+
+from model import NineMensMorrisNet
+from packed import pack_vec, unpack_states, legal_masks
+from vec_env import VecNineMensMorrisEnv, ACTION_SPACE_SIZE, BOARD_POSITIONS
+
+
+class RolloutBuffer:
+    """
+    (steps, num_envs) rollout storage allocated once and overwritten every update.
+
+    same_player[t] is True when the player to move after step t is the one
+    who acted (a mill was formed and the capture is pending).
+
+    With packed, positions are kept as 8-byte packed.py records instead of
+    float observations and boolean masks (1296 bytes), and decoded per
+    minibatch.
+    """
+
+    def __init__(self, steps: int, num_envs: int, device: torch.device, packed: bool = False):
+        self.steps = steps
+        self.num_envs = num_envs
+        self.device = device
+        self.packed = packed
+        shape = (steps, num_envs)
+        if packed:
+            self.records = np.zeros(shape, dtype=np.uint64)
+        else:
+            self.states = torch.zeros(shape + (7, BOARD_POSITIONS), dtype=torch.float32, device=device)
+            self.masks = torch.zeros(shape + (ACTION_SPACE_SIZE,), dtype=torch.bool, device=device)
+        self.actions = torch.zeros(shape, dtype=torch.long, device=device)
+        self.log_probs = torch.zeros(shape, dtype=torch.float32, device=device)
+        self.values = torch.zeros(shape, dtype=torch.float32, device=device)
+        self.rewards = torch.zeros(shape, dtype=torch.float32, device=device)
+        self.dones = torch.zeros(shape, dtype=torch.bool, device=device)
+        self.same_player = torch.zeros(shape, dtype=torch.bool, device=device)
+        self.advantages = torch.zeros(shape, dtype=torch.float32, device=device)
+        self.returns = torch.zeros(shape, dtype=torch.float32, device=device)
+
+    def compute_gae(self, last_value: torch.Tensor, gamma: float, gae_lambda: float):
+        """
+        Generalized advantage estimation for alternating turns.
+
+        Vectorized over environments; the recursion runs backwards over
+        time. A finished game cuts the bootstrap. Otherwise the next value
+        and advantage count positively when the same player moves again
+        and negatively when the opponent moves.
+        """
+        sign = torch.where(self.same_player, 1.0, -1.0) * (~self.dones).float()
+        next_value = last_value
+        next_advantage = torch.zeros_like(last_value)
+        for t in reversed(range(self.steps)):
+            delta = self.rewards[t] + gamma * sign[t] * next_value - self.values[t]
+            next_advantage = delta + gamma * gae_lambda * sign[t] * next_advantage
+            self.advantages[t] = next_advantage
+            next_value = self.values[t]
+        torch.add(self.advantages, self.values, out=self.returns)
+
+    def store_positions(self, t: int, env: VecNineMensMorrisEnv, states: torch.Tensor, masks: torch.Tensor):
+        """Record the positions the step-t actions are taken from"""
+        if self.packed:
+            self.records[t] = pack_vec(env)
+        else:
+            self.states[t].copy_(states)
+            self.masks[t].copy_(masks)
+
+    def minibatch(self, index: torch.Tensor) -> Dict[str, torch.Tensor]:
+        """Training tensors of the flat sample indices"""
+        n = self.steps * self.num_envs
+        batch = {
+            'actions': self.actions.view(n),
+            'log_probs': self.log_probs.view(n),
+            'values': self.values.view(n),
+            'advantages': self.advantages.view(n),
+            'returns': self.returns.view(n),
+        }
+        batch = {name: tensor[index] for name, tensor in batch.items()}
+        if self.packed:
+            records = self.records.reshape(n)[index.cpu().numpy()]
+            batch['states'] = torch.from_numpy(unpack_states(records)).to(self.device)
+            batch['masks'] = torch.from_numpy(legal_masks(records) > 0).to(self.device)
+        else:
+            batch['states'] = self.states.view(n, 7, BOARD_POSITIONS)[index]
+            batch['masks'] = self.masks.view(n, ACTION_SPACE_SIZE)[index]
+        return batch
+
+
+def masked_log_softmax(logits: torch.Tensor, masks: torch.Tensor) -> torch.Tensor:
+    """Log-probabilities over legal actions; illegal ones get the lowest finite log-probability"""
+    logits = logits.masked_fill(~masks, torch.finfo(logits.dtype).min)
+    return F.log_softmax(logits, dim=1)
+
+
+def ppo_loss(model: NineMensMorrisNet, batch: Dict[str, torch.Tensor], clip_range: float,
+             value_coef: float, entropy_coef: float) -> Dict[str, torch.Tensor]:
+    """Clipped PPO objective with masked policy, clipped value loss and entropy bonus"""
+    logits, values = model(batch['states'])
+    values = values.squeeze(1)
+    log_probs_all = masked_log_softmax(logits, batch['masks'])
+    log_probs = log_probs_all.gather(1, batch['actions'][:, None]).squeeze(1)
+    probs = log_probs_all.exp()
+    entropy = -(probs * log_probs_all).sum(dim=1).mean()
+
+    advantages = batch['advantages']
+    advantages = (advantages - advantages.mean()) / (advantages.std() + 1e-8)
+    ratio = torch.exp(log_probs - batch['log_probs'])
+    policy_loss = -torch.min(ratio * advantages,
+                             ratio.clamp(1 - clip_range, 1 + clip_range) * advantages).mean()
+
+    clipped_values = batch['values'] + (values - batch['values']).clamp(-clip_range, clip_range)
+    value_loss = 0.5 * torch.max((values - batch['returns']) ** 2,
+                                 (clipped_values - batch['returns']) ** 2).mean()
+
+    loss = policy_loss + value_coef * value_loss - entropy_coef * entropy
+    with torch.no_grad():
+        approx_kl = ((ratio - 1) - torch.log(ratio)).mean()
+        clip_fraction = ((ratio - 1).abs() > clip_range).float().mean()
+    return {
+        'loss': loss, 'policy_loss': policy_loss, 'value_loss': value_loss,
+        'entropy': entropy, 'approx_kl': approx_kl, 'clip_fraction': clip_fraction
+    }
+
+
+def save_checkpoint(path: str, model: NineMensMorrisNet, optimizer: torch.optim.Optimizer,
+                    update: int, samples: int, config: Dict):
+    """Write a load_model-compatible checkpoint atomically (temporary file, then os.replace)"""
+    tmp_path = path + '.tmp'
+    torch.save({
+        'model_state_dict': model.state_dict(),
+        'optimizer_state_dict': optimizer.state_dict(),
+        'update': update,
+        'samples': samples,
+        'config': config,
+    }, tmp_path)
+    os.replace(tmp_path, path)
+
+
+class PPOTrainer:
+    """
+    Self-play PPO trainer.
+
+    Args:
+        num_envs: games stepped together (one batched forward pass per step)
+        steps: rollout length per environment and update
+        epochs / minibatches: optimisation passes over each rollout
+        packed: store the rollout positions as packed records (for very large rollouts)
+    """
+
+    def __init__(self, model: NineMensMorrisNet, device: torch.device, num_envs: int = 64,
+                 steps: int = 128, lr: float = 2.5e-4, gamma: float = 0.99, gae_lambda: float = 0.95,
+                 clip_range: float = 0.2, value_coef: float = 0.5, entropy_coef: float = 0.01,
+                 epochs: int = 4, minibatches: int = 4, max_grad_norm: float = 0.5, seed: int = 0,
+                 packed: bool = False):
+        self.model = model.to(device)
+        self.device = device
+        self.num_envs = num_envs
+        self.steps = steps
+        self.gamma = gamma
+        self.gae_lambda = gae_lambda
+        self.clip_range = clip_range
+        self.value_coef = value_coef
+        self.entropy_coef = entropy_coef
+        self.epochs = epochs
+        self.minibatches = minibatches
+        self.max_grad_norm = max_grad_norm
+        self.optimizer = torch.optim.Adam(model.parameters(), lr=lr, eps=1e-5)
+        self.generator = torch.Generator(device='cpu').manual_seed(seed)
+
+        self.env = VecNineMensMorrisEnv(num_envs)
+        self.buffer = RolloutBuffer(steps, num_envs, device, packed)
+        states, masks = self.env.reset()
+        self._states = torch.from_numpy(states).to(device)
+        self._masks = torch.from_numpy(masks > 0).to(device)
+        self._episode_lengths = np.zeros(num_envs, dtype=np.int64)
+        self.update = 0
+        self.samples = 0
+
+    def collect(self) -> Dict[str, float]:
+        """Fill the rollout buffer with `steps` batched self-play steps"""
+        buffer = self.buffer
+        finished_lengths = []
+        results = {1: 0, -1: 0, 0: 0}
+        self.model.eval()
+        with torch.no_grad():
+            for t in range(self.steps):
+                buffer.store_positions(t, self.env, self._states, self._masks)
+                logits, values = self.model(self._states)
+                log_probs = masked_log_softmax(logits, self._masks)
+                actions = torch.multinomial(log_probs.exp().cpu(), 1, generator=self.generator).squeeze(1)
+                buffer.actions[t].copy_(actions)
+                buffer.log_probs[t].copy_(log_probs.gather(1, actions.to(self.device)[:, None]).squeeze(1))
+                buffer.values[t].copy_(values.squeeze(1))
+
+                acting = self.env.current_player.copy()
+                states, masks, rewards, dones, _ = self.env.step(actions.numpy())
+                buffer.rewards[t].copy_(torch.from_numpy(rewards))
+                buffer.dones[t].copy_(torch.from_numpy(dones))
+                buffer.same_player[t].copy_(torch.from_numpy(self.env.current_player == acting))
+                self._states = torch.from_numpy(states).to(self.device)
+                self._masks = torch.from_numpy(masks > 0).to(self.device)
+
+                self._episode_lengths += 1
+                if dones.any():
+                    finished_lengths.extend(self._episode_lengths[dones].tolist())
+                    for winner in self.env.final_winner[dones]:
+                        results[int(winner)] += 1
+                    self._episode_lengths[dones] = 0
+
+            _, last_value = self.model(self._states)
+        buffer.compute_gae(last_value.squeeze(1), self.gamma, self.gae_lambda)
+        games = len(finished_lengths)
+        return {
+            'games': games,
+            'mean_length': float(np.mean(finished_lengths)) if games else 0.0,
+            'first_player_win_rate': results[1] / games if games else 0.0,
+            'draw_rate': results[0] / games if games else 0.0,
+        }
+
+    def optimize(self) -> Dict[str, float]:
+        """PPO epochs over the buffer in shuffled minibatches"""
+        n = self.steps * self.num_envs
+        minibatch_size = n // self.minibatches
+        totals: Dict[str, float] = {}
+        count = 0
+        self.model.train()
+        for _ in range(self.epochs):
+            order = torch.randperm(n, generator=self.generator).to(self.device)
+            for start in range(0, minibatch_size * self.minibatches, minibatch_size):
+                index = order[start:start + minibatch_size]
+                batch = self.buffer.minibatch(index)
+                losses = ppo_loss(self.model, batch, self.clip_range, self.value_coef, self.entropy_coef)
+                self.optimizer.zero_grad(set_to_none=True)
+                losses['loss'].backward()
+                torch.nn.utils.clip_grad_norm_(self.model.parameters(), self.max_grad_norm)
+                self.optimizer.step()
+                for name, value in losses.items():
+                    totals[name] = totals.get(name, 0.0) + value.detach().item()
+                count += 1
+        self.model.eval()
+        return {name: total / count for name, total in totals.items()}
+
+    def train_step(self) -> Dict[str, float]:
+        """One rollout and one optimisation phase, with throughput timings"""
+        started = time.perf_counter()
+        stats = self.collect()
+        collected = time.perf_counter()
+        stats.update(self.optimize())
+        finished = time.perf_counter()
+
+        samples = self.steps * self.num_envs
+        self.update += 1
+        self.samples += samples
+        stats.update(
+            update=self.update,
+            samples=self.samples,
+            rollout_seconds=collected - started,
+            update_seconds=finished - collected,
+            rollout_samples_per_second=samples / (collected - started),
+            samples_per_second=samples / (finished - started),
+        )
+        return stats
+
+
+def format_stats(stats: Dict[str, float]) -> str:
+    return (f"update {stats['update']:5d} | samples {stats['samples']:>10,} | "
+            f"{stats['samples_per_second']:7.0f} samples/s "
+            f"(rollout {stats['rollout_seconds']:5.2f}s {stats['rollout_samples_per_second']:7.0f}/s, "
+            f"update {stats['update_seconds']:5.2f}s) | "
+            f"pi {stats['policy_loss']:+.4f} v {stats['value_loss']:.4f} H {stats['entropy']:.3f} "
+            f"kl {stats['approx_kl']:.4f} clip {stats['clip_fraction']:.2f} | "
+            f"games {stats['games']:4d} len {stats['mean_length']:5.1f} "
+            f"p1 {stats['first_player_win_rate']:.1%} draw {stats['draw_rate']:.1%}")
+
+
+def initial_model(path: Optional[str], device: torch.device):
+    """Fresh network, or one loaded from any checkpoint format plus its training state (if it has one)"""
+    model = NineMensMorrisNet()
+    if path is None:
+        return model.to(device), {}
+    from registry import read_state_dict
+    model.load_state_dict(read_state_dict(path, torch.device('cpu'), prefer_flat=False))
+    try:
+        checkpoint = torch.load(path, map_location='cpu', weights_only=True)
+    except Exception:
+        # Flat weights or a pickled model: weights only
+        checkpoint = None
+    if not isinstance(checkpoint, dict) or 'optimizer_state_dict' not in checkpoint:
+        return model.to(device), {}
+    return model.to(device), checkpoint
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Self-play PPO training for the Nine Men's Morris network")
+    parser.add_argument('--output', default='ppo_model.pt', help='Checkpoint to write')
+    parser.add_argument('--init', default=None, help='Checkpoint to continue from')
+    parser.add_argument('--updates', type=int, default=1000)
+    parser.add_argument('--num-envs', type=int, default=64)
+    parser.add_argument('--steps', type=int, default=128, help='Rollout steps per environment')
+    parser.add_argument('--threads', type=int, default=os.cpu_count() or 1, help='torch intra-op threads')
+    parser.add_argument('--lr', type=float, default=2.5e-4)
+    parser.add_argument('--gamma', type=float, default=0.99)
+    parser.add_argument('--gae-lambda', type=float, default=0.95)
+    parser.add_argument('--clip-range', type=float, default=0.2)
+    parser.add_argument('--value-coef', type=float, default=0.5)
+    parser.add_argument('--entropy-coef', type=float, default=0.01)
+    parser.add_argument('--epochs', type=int, default=4)
+    parser.add_argument('--minibatches', type=int, default=4)
+    parser.add_argument('--save-every', type=int, default=10, help='Updates between checkpoints')
+    parser.add_argument('--packed', action='store_true', help='Keep rollout positions bit-packed (8 bytes each)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--device', default='cpu')
+    args = parser.parse_args()
+
+    torch.set_num_threads(args.threads)
+    torch.manual_seed(args.seed)
+    device = torch.device(args.device)
+
+    model, checkpoint = initial_model(args.init, device)
+    trainer = PPOTrainer(model, device, num_envs=args.num_envs, steps=args.steps, lr=args.lr,
+                         gamma=args.gamma, gae_lambda=args.gae_lambda, clip_range=args.clip_range,
+                         value_coef=args.value_coef, entropy_coef=args.entropy_coef, epochs=args.epochs,
+                         minibatches=args.minibatches, seed=args.seed, packed=args.packed)
+    if checkpoint:
+        trainer.optimizer.load_state_dict(checkpoint['optimizer_state_dict'])
+        trainer.update = checkpoint.get('update', 0)
+        trainer.samples = checkpoint.get('samples', 0)
+    config = {name: value for name, value in vars(args).items() if name not in ('output', 'init')}
+
+    print(f"PPO: {args.num_envs} envs x {args.steps} steps, {args.threads} threads, "
+          f"{sum(p.numel() for p in model.parameters()):,} parameters")
+    for step in range(1, args.updates + 1):
+        stats = trainer.train_step()
+        print(format_stats(stats), flush=True)
+        if step % args.save_every == 0 or step == args.updates:
+            save_checkpoint(args.output, trainer.model, trainer.optimizer, trainer.update, trainer.samples, config)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,248 @@
+"""
+Vectorized Environment for Nine Men's Morris
+Holds N games in struct-of-arrays NumPy form and steps all of them at once
+"""
+
+import numpy as np
+
+from typing import Optional, Tuple
+
+from game import NineMensMorrisEnv
+
+BOARD_POSITIONS = NineMensMorrisEnv.BOARD_POSITIONS
+PIECES_PER_PLAYER = NineMensMorrisEnv.PIECES_PER_PLAYER
+ACTION_SPACE_SIZE = NineMensMorrisEnv.ACTION_SPACE_SIZE
+ACTION_MOVEMENT_START = NineMensMorrisEnv.ACTION_MOVEMENT_START
+ACTION_CAPTURE_START = NineMensMorrisEnv.ACTION_CAPTURE_START
+
+# Phase codes, per player
+PHASE_PLACEMENT = 0
+PHASE_MOVEMENT = 1
+PHASE_FLYING = 2
+
+MOVE_LIMIT = 200
+
+MILLS = np.array(NineMensMorrisEnv.MILLS, dtype=np.intp)
+
+# (24, 24) boolean adjacency matrix
+ADJACENCY_MATRIX = np.zeros((BOARD_POSITIONS, BOARD_POSITIONS), dtype=bool)
+for _pos, _neighbors in NineMensMorrisEnv.ADJACENCY.items():
+    ADJACENCY_MATRIX[_pos, _neighbors] = True
+
+# (24, 2, 3): the two mills through each position
+POSITION_MILLS = np.array([
+    [mill for mill in NineMensMorrisEnv.MILLS if pos in mill]
+    for pos in range(BOARD_POSITIONS)
+], dtype=np.intp)
+
+# (16, 24) mill membership
+MILL_MEMBERSHIP = np.zeros((len(MILLS), BOARD_POSITIONS), dtype=bool)
+MILL_MEMBERSHIP[np.arange(len(MILLS))[:, None], MILLS] = True
+
+
+def player_index(players: np.ndarray) -> np.ndarray:
+    """Column index into per-player arrays: 0 for player 1, 1 for player -1"""
+    return (players < 0).astype(np.intp)
+
+
+class VecNineMensMorrisEnv:
+    """
+    N independent Nine Men's Morris games stepped together.
+
+    Follows the rules of NineMensMorrisEnv.step exactly, including the
+    mill/capture sub-turn, per-player flying, the blocked-opponent win and
+    the move-limit draw. Actions are flat indices into the 624-action space;
+    while `needs_capture` is set for a game, its action must be a capture.
+    Finished games are reset automatically.
+    """
+
+    def __init__(self, num_envs: int):
+        self.num_envs = num_envs
+        n = num_envs
+        self.board = np.zeros((n, BOARD_POSITIONS), dtype=np.int8)
+        self.current_player = np.ones(n, dtype=np.int8)
+        # Per-player columns: 0 = player 1, 1 = player -1
+        self.pieces_in_hand = np.zeros((n, 2), dtype=np.int8)
+        self.pieces_on_board = np.zeros((n, 2), dtype=np.int8)
+        self.player_phase = np.zeros((n, 2), dtype=np.int8)
+        self.movement_started = np.zeros(n, dtype=bool)
+        self.move_count = np.zeros(n, dtype=np.int32)
+        self.needs_capture = np.zeros(n, dtype=bool)
+        # Winner of the game that ended in the latest step (1, -1, or 0 for a draw);
+        # 0 for games that did not end in it
+        self.final_winner = np.zeros(n, dtype=np.int8)
+        self._rows = np.arange(n)
+        self.reset()
+
+    def reset(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Reset every game; returns (observations, action_masks)"""
+        self._reset_games(np.ones(self.num_envs, dtype=bool))
+        self.final_winner[:] = 0
+        return self.get_state(), self.get_valid_action_mask()
+
+    def _reset_games(self, games: np.ndarray):
+        self.board[games] = 0
+        self.current_player[games] = 1
+        self.pieces_in_hand[games] = PIECES_PER_PLAYER
+        self.pieces_on_board[games] = 0
+        self.player_phase[games] = PHASE_PLACEMENT
+        self.movement_started[games] = False
+        self.move_count[games] = 0
+        self.needs_capture[games] = False
+
+    def get_state(self, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """(N, 7, 24) observations in the NineMensMorrisEnv.get_state layout"""
+        if out is None:
+            out = np.empty((self.num_envs, 7, BOARD_POSITIONS), dtype=np.float32)
+        player = self.current_player[:, None]
+        idx = player_index(self.current_player)
+        phase = self.player_phase[self._rows, idx]
+
+        out[:, 0] = self.board == player
+        out[:, 1] = self.board == -player
+        out[:, 2] = (phase == PHASE_PLACEMENT)[:, None]
+        out[:, 3] = (phase == PHASE_MOVEMENT)[:, None]
+        out[:, 4] = (phase == PHASE_FLYING)[:, None]
+        out[:, 5] = (self.pieces_in_hand[self._rows, idx] / PIECES_PER_PLAYER)[:, None]
+        out[:, 6] = self.board == 0
+        return out
+
+    def _mill_pieces(self, player: np.ndarray) -> np.ndarray:
+        """(N, 24) positions of each game's `player` pieces that sit in a complete mill"""
+        complete = (self.board[:, MILLS] == player[:, None, None]).all(axis=2)
+        return complete @ MILL_MEMBERSHIP
+
+    def get_valid_capture_mask(self) -> np.ndarray:
+        """(N, 24) opponent pieces that may be captured by the current player"""
+        opponent = -self.current_player
+        pieces = self.board == opponent[:, None]
+        free = pieces & ~self._mill_pieces(opponent)
+        all_in_mills = ~free.any(axis=1)
+        free[all_in_mills] = pieces[all_in_mills]
+        return free
+
+    def _move_mask(self) -> np.ndarray:
+        """(N, 24, 24) legal (from, to) pairs for movement and flying"""
+        own = self.board == self.current_player[:, None]
+        empty = self.board == 0
+        phase = self.player_phase[self._rows, player_index(self.current_player)]
+        reach = np.where((phase == PHASE_FLYING)[:, None, None], True, ADJACENCY_MATRIX)
+        return own[:, :, None] & reach & empty[:, None, :]
+
+    def get_valid_action_mask(self, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """(N, 624) float mask of legal actions; capture actions for games awaiting a capture"""
+        if out is None:
+            out = np.empty((self.num_envs, ACTION_SPACE_SIZE), dtype=np.float32)
+        idx = player_index(self.current_player)
+        phase = self.player_phase[self._rows, idx]
+        placing = (phase == PHASE_PLACEMENT) & (self.pieces_in_hand[self._rows, idx] > 0)
+        moving = phase != PHASE_PLACEMENT
+        capturing = self.needs_capture
+
+        out[:, :ACTION_MOVEMENT_START] = (self.board == 0) & (placing & ~capturing)[:, None]
+        out[:, ACTION_MOVEMENT_START:ACTION_CAPTURE_START] = (
+            self._move_mask().reshape(self.num_envs, -1) & (moving & ~capturing)[:, None]
+        )
+        out[:, ACTION_CAPTURE_START:] = self.get_valid_capture_mask() & capturing[:, None]
+        return out
+
+    def _has_move(self, games: np.ndarray) -> np.ndarray:
+        """Whether the side to move has any legal placement or movement"""
+        idx = player_index(self.current_player)
+        phase = self.player_phase[self._rows, idx]
+        any_empty = (self.board == 0).any(axis=1)
+        has_move = np.where(
+            phase == PHASE_PLACEMENT,
+            any_empty & (self.pieces_in_hand[self._rows, idx] > 0),
+            any_empty
+        )
+        blockable = games & (phase == PHASE_MOVEMENT)
+        if blockable.any():
+            has_move[blockable] = self._move_mask()[blockable].any(axis=(1, 2))
+        return has_move
+
+    def step(self, actions: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Apply one action per game.
+
+        Returns:
+            observations: (N, 7, 24) float32, after auto-reset of finished games
+            action_masks: (N, 624) float32 legal-action masks
+            rewards: (N,) float32 rewards for the acting player
+            dones: (N,) bool, games that ended (and were reset) this step
+            needs_capture: (N,) bool, games whose side to move must now capture
+        """
+        actions = np.asarray(actions, dtype=np.intp)
+        rows = self._rows
+        acting = self.current_player.copy()
+        acting_idx = player_index(acting)
+        opponent_idx = 1 - acting_idx
+
+        is_capture = actions >= ACTION_CAPTURE_START
+        is_place = actions < ACTION_MOVEMENT_START
+        is_move = ~is_capture & ~is_place
+
+        rewards = np.full(self.num_envs, -0.0035, dtype=np.float32)
+        self.final_winner[:] = 0
+
+        # Captures
+        cap_rows = rows[is_capture]
+        self.board[cap_rows, actions[is_capture] - ACTION_CAPTURE_START] = 0
+        self.pieces_on_board[cap_rows, opponent_idx[is_capture]] -= 1
+        rewards[is_capture] += 0.05
+
+        # Placements
+        place_rows = rows[is_place]
+        self.board[place_rows, actions[is_place]] = acting[is_place]
+        self.pieces_in_hand[place_rows, acting_idx[is_place]] -= 1
+        self.pieces_on_board[place_rows, acting_idx[is_place]] += 1
+
+        # Movements (including flying)
+        offset = actions - ACTION_MOVEMENT_START
+        move_rows = rows[is_move]
+        self.board[move_rows, offset[is_move] // BOARD_POSITIONS] = 0
+        self.board[move_rows, offset[is_move] % BOARD_POSITIONS] = acting[is_move]
+
+        self.move_count += 1
+
+        # Mill detection at the destination of placements and movements
+        to_pos = np.where(is_place, actions, offset % BOARD_POSITIONS)
+        to_pos[is_capture] = 0
+        formed_mill = (
+            (self.board[rows[:, None, None], POSITION_MILLS[to_pos]] == acting[:, None, None])
+            .all(axis=2).any(axis=1)
+        ) & ~is_capture
+        rewards[formed_mill] += 0.1
+
+        # A capture is available whenever the opponent has pieces on the board
+        self.needs_capture = formed_mill & (self.pieces_on_board[rows, opponent_idx] > 0)
+        resolved = ~self.needs_capture
+        self.current_player[resolved] = -acting[resolved]
+
+        # Placement -> movement phase transition
+        start_movement = resolved & ~self.movement_started & (self.pieces_in_hand == 0).all(axis=1)
+        self.movement_started |= start_movement
+        self.player_phase[start_movement] = PHASE_MOVEMENT
+
+        # Flying phase per player
+        flying = (resolved & self.movement_started)[:, None] & (self.pieces_on_board == 3)
+        self.player_phase[flying] = PHASE_FLYING
+
+        # Win by reducing opponent to < 3 pieces
+        won = resolved & self.movement_started & (self.pieces_on_board[rows, opponent_idx] < 3)
+
+        # Win by blocking opponent
+        won |= resolved & ~won & ~self._has_move(resolved & ~won)
+        rewards[won] = 1.5
+        self.final_winner[won] = acting[won]
+
+        # Draw by move limit
+        drawn = resolved & (self.move_count > MOVE_LIMIT)
+        rewards[drawn] = 0.0
+        self.final_winner[drawn] = 0
+
+        dones = won | drawn
+        if dones.any():
+            self._reset_games(dones)
+
+        return self.get_state(), self.get_valid_action_mask(), rewards, dones, self.needs_capture.copy()
@@ -0,0 +1,111 @@
+"""
+Flat Weights Module for Nine Men's Morris
+Pickle-free, memory-mappable tensor file for NineMensMorrisNet weights
+
+File layout: 8-byte magic, 8-byte header length, JSON header (name -> dtype,
+shape, offset), then the raw little-endian tensor data, each tensor aligned
+to 64 bytes.
+
+Usage:
+    python weights.py "Model 1.pt" "Model 2.pt"      # writes "Model 1.nmw", "Model 2.nmw"
+"""
+
+import os
+import json
+import argparse
+
+import numpy as np
+import torch
+
+from typing import Dict
+
+FLAT_MAGIC = b'NMMW0001'
+FLAT_SUFFIX = '.nmw'
+_ALIGNMENT = 64
+
+
+def flat_weights_path(checkpoint_path: str) -> str:
+    """Flat weights written next to a checkpoint: 'Model 1.pt' -> 'Model 1.nmw'"""
+    return os.path.splitext(checkpoint_path)[0] + FLAT_SUFFIX
+
+
+def is_flat_weights(path: str) -> bool:
+    with open(path, 'rb') as f:
+        return f.read(len(FLAT_MAGIC)) == FLAT_MAGIC
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // _ALIGNMENT) * _ALIGNMENT
+
+
+def save_flat_weights(state_dict: Dict[str, torch.Tensor], path: str):
+    """Write a state dict as a flat tensor file (atomically, via a temporary file)"""
+    arrays = {name: tensor.detach().cpu().contiguous().numpy() for name, tensor in state_dict.items()}
+    header = {}
+    offset = 0
+    for name, array in arrays.items():
+        offset = _aligned(offset)
+        header[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset += array.nbytes
+    header_bytes = json.dumps(header).encode('utf-8')
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(FLAT_MAGIC)
+        f.write(len(header_bytes).to_bytes(8, 'little'))
+        f.write(header_bytes)
+        data_start = _aligned(f.tell())
+        for name, array in arrays.items():
+            f.write(b'\0' * (data_start + header[name]['offset'] - f.tell()))
+            f.write(array.tobytes())
+    os.replace(tmp_path, path)
+
+
+def load_flat_weights(path: str) -> Dict[str, torch.Tensor]:
+    """
+    State dict backed by a copy-on-write memory map of the file: no
+    unpickling and no copy, pages are read on first use and shared between
+    processes mapping the same file.
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(FLAT_MAGIC)) != FLAT_MAGIC:
+            raise ValueError(f"{path} is not a flat weights file")
+        header_length = int.from_bytes(f.read(8), 'little')
+        header = json.loads(f.read(header_length).decode('utf-8'))
+    data_start = _aligned(len(FLAT_MAGIC) + 8 + header_length)
+    data = np.memmap(path, dtype=np.uint8, mode='c', offset=data_start)
+
+    state_dict = {}
+    for name, info in header.items():
+        dtype = np.dtype(info['dtype'])
+        count = int(np.prod(info['shape'], dtype=np.int64))
+        start = info['offset']
+        array = data[start:start + count * dtype.itemsize].view(dtype).reshape(info['shape'])
+        state_dict[name] = torch.from_numpy(array)
+    return state_dict
+
+
+def convert(checkpoint_path: str, output: str = None) -> str:
+    """Convert any checkpoint load_model accepts into flat weights; returns the output path"""
+    from registry import read_state_dict
+    state_dict = read_state_dict(checkpoint_path, torch.device('cpu'), prefer_flat=False)
+    output = output or flat_weights_path(checkpoint_path)
+    save_flat_weights(state_dict, output)
+    return output
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert checkpoints to flat, memory-mappable weights")
+    parser.add_argument('checkpoints', nargs='+', help='Checkpoint files (.pt)')
+    parser.add_argument('--output', help='Output path (single checkpoint only)')
+    args = parser.parse_args()
+    if args.output and len(args.checkpoints) > 1:
+        parser.error('--output needs a single checkpoint')
+
+    for path in args.checkpoints:
+        output = convert(path, args.output)
+        print(f"{path} -> {output} ({os.path.getsize(output) / 2**20:.1f} MB)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+Position Hashing for Nine Men's Morris
+Symmetry-canonical Zobrist hashes and a bounded transposition table
+"""
+
+import numpy as np
+
+from typing import Any, Dict, NamedTuple, Optional
+
+from game import NineMensMorrisEnv, ZOBRIST_PIECES
+from symmetry import NUM_SYMMETRIES, SYMMETRIES
+
+# _SYMMETRIC_PIECE_KEYS[s, player + 1, pos]: key of a `player` piece on `pos` once symmetry s is applied
+_SYMMETRIC_PIECE_KEYS = np.zeros((NUM_SYMMETRIES, 3, NineMensMorrisEnv.BOARD_POSITIONS), dtype=np.uint64)
+for _player in (1, -1):
+    _keys = np.array(ZOBRIST_PIECES[_player], dtype=np.uint64)
+    _SYMMETRIC_PIECE_KEYS[:, _player + 1] = _keys[SYMMETRIES]
+_POSITIONS = np.arange(NineMensMorrisEnv.BOARD_POSITIONS)
+
+
+def symmetric_board_hashes(board: np.ndarray) -> np.ndarray:
+    """(16,) board hashes of a 24-element board under every symmetry (index 0 = identity)"""
+    keys = _SYMMETRIC_PIECE_KEYS[:, np.asarray(board, dtype=np.intp) + 1, _POSITIONS]
+    return np.bitwise_xor.reduce(keys, axis=1)
+
+
+def canonical_symmetry(env) -> int:
+    """Index of the symmetry that maps the position onto its canonical form"""
+    return int(np.argmin(symmetric_board_hashes(env.board)))
+
+
+def canonical_hash(env) -> int:
+    """Zobrist hash that is identical for all 16 symmetric variants of a position"""
+    return env.zobrist_hash(int(symmetric_board_hashes(env.board).min()))
+
+
+# Bound types for search results
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+
+class TTEntry(NamedTuple):
+    key: int
+    depth: int
+    value: Any
+    flag: int
+    move: Optional[int]
+    generation: int
+
+
+class TranspositionTable:
+    """
+    Fixed-size hash table of position results, indexed by the low bits of a 64-bit key.
+
+    Replacement policies:
+        'depth': keep the deeper entry, unless it comes from an older search (generation)
+        'always': the newest store always wins
+    """
+
+    POLICIES = ('depth', 'always')
+
+    def __init__(self, size: int = 1 << 20, policy: str = 'depth'):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown replacement policy: {policy}")
+        num_slots = 1
+        while num_slots < size:
+            num_slots <<= 1
+        self.num_slots = num_slots
+        self.policy = policy
+        self._mask = num_slots - 1
+        self._entries = [None] * num_slots
+        self.generation = 0
+        self._reset_stats()
+        self.used = 0
+
+    def _reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.replacements = 0
+        self.rejected = 0
+
+    def new_search(self):
+        """Age the stored entries so the next search may replace them freely"""
+        self.generation += 1
+
+    def probe(self, key: int) -> Optional[TTEntry]:
+        entry = self._entries[key & self._mask]
+        if entry is not None and entry.key == key:
+            self.hits += 1
+            return entry
+        self.misses += 1
+        return None
+
+    def store(self, key: int, value: Any, depth: int = 0, flag: int = EXACT,
+              move: Optional[int] = None) -> bool:
+        """Store a result; returns False when the replacement policy keeps the existing entry"""
+        slot = key & self._mask
+        existing = self._entries[slot]
+        if existing is None:
+            self.used += 1
+        elif existing.key != key or existing.depth != depth:
+            if (self.policy == 'depth' and existing.generation == self.generation
+                    and existing.depth > depth):
+                self.rejected += 1
+                return False
+            if existing.key != key:
+                self.replacements += 1
+        self._entries[slot] = TTEntry(key, depth, value, flag, move, self.generation)
+        self.stores += 1
+        return True
+
+    def clear(self):
+        self._entries = [None] * self.num_slots
+        self.used = 0
+        self.generation = 0
+        self._reset_stats()
+
+    def __len__(self) -> int:
+        return self.used
+
+    @property
+    def hit_rate(self) -> float:
+        probes = self.hits + self.misses
+        return self.hits / probes if probes else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'slots': self.num_slots,
+            'used': self.used,
+            'fill': self.used / self.num_slots,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hit_rate,
+            'stores': self.stores,
+            'replacements': self.replacements,
+            'rejected': self.rejected,
+        }